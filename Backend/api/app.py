@@ -3,12 +3,17 @@
 RESTful API for plant disease detection with AI model, RAG, and offline support
 """
 
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, request, jsonify, send_file, g
 from flask_cors import CORS
+from werkzeug.middleware.proxy_fix import ProxyFix
 from werkzeug.utils import secure_filename
 import uuid
+import time
 import base64
+import hmac
 import io
+import json
+import threading
 from datetime import datetime
 from pathlib import Path
 import sys
@@ -17,15 +22,36 @@
 sys.path.insert(0, str(Path(__file__).parent))
 
 # Import services
-from services.model_service import model_service
+from services.model_registry import model_registry
+from services.batch_scheduler import batch_scheduler
+from services.result_cache import result_cache
+from services.tracking_store import tracking_store
 from services.db_service import db_service
 from services.rag_service import rag_service
+from services.diagnosis_jobs import diagnosis_jobs
+from services.blob_store import blob_store
+from services.history_writer import history_writer
+from utils.detection_utils import clamp_tile_overlap
+from utils.motion import frame_signature
+from utils.frame_slot import LatestFrameSlot
 from config import config
 
+# Optional WebSocket support for live streams (pip install flask-sock)
+try:
+    from flask_sock import Sock
+    from simple_websocket import ConnectionClosed
+except ImportError:
+    Sock = None
+
 # Initialize Flask app
 app = Flask(__name__)
-CORS(app, resources={r"/api/*": {"origins": config.CORS_ORIGINS}})
+if config.TRUSTED_PROXIES:
+    # request.remote_addr is the client, not the proxy (tracking sessions fall back to it)
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=config.TRUSTED_PROXIES)
+CORS(app, resources={r"/api/*": {"origins": config.CORS_ORIGINS}}, expose_headers=['X-Session-ID'])
 app.config['MAX_CONTENT_LENGTH'] = config.MAX_CONTENT_LENGTH
+app.config['SOCK_SERVER_OPTIONS'] = {'ping_interval': 25, 'max_message_size': config.MAX_CONTENT_LENGTH}
+sock = Sock(app) if Sock else None
 
 # ============================================================================
 # Health & Info Endpoints
@@ -38,7 +64,7 @@ def health_check():
         'status': 'healthy',
         'timestamp': datetime.now().isoformat(),
         'version': '1.0.0',
-        'model_loaded': model_service.model is not None
+        'model_loaded': model_registry.default.model is not None
     })
 
 @app.route('/api/info', methods=['GET'])
@@ -50,22 +76,161 @@ def get_info():
         'description': 'Plant disease detection API with AI, RAG, and offline support',
         'endpoints': {
             'detection': '/api/detect',
+            'detection_binary': '/api/v2/detect',
+            'detection_stream': '/api/ws/detect' if sock else None,
             'diagnosis': '/api/diagnose/<disease_name>',
             'history': '/api/history/<user_id>',
             'diseases': '/api/diseases'
         },
-        'model_info': model_service.get_model_info()
+        'model_info': model_registry.default.get_model_info()
     })
 
 @app.route('/api/models', methods=['GET'])
 def get_models():
-    """Get model information"""
-    return jsonify(model_service.get_model_info())
+    """Get default model information plus every registered model"""
+    return jsonify(dict(
+        model_registry.default.get_model_info(),
+        models=model_registry.list_models()
+    ))
+
+@app.route('/api/admin/models', methods=['POST'])
+def load_model():
+    """
+    Load a weight file and hot-swap it in under a registry name
+    In-flight requests finish on the model they started with.
+    
+    Headers:
+    X-Admin-Token: must match ADMIN_TOKEN (endpoint is disabled when unset)
+    
+    Request Body:
+    {
+        "name": "rice",
+        "model_path": "models/rice/weights/best.pt",  // under Backend/models
+        "labels_path": "models/rice/labels.txt",  // optional
+        "backend": "ultralytics",  // optional: ultralytics, onnx, onnx-int8
+        "make_default": false  // optional
+    }
+    """
+    token = request.headers.get('X-Admin-Token', '')
+    if not config.ADMIN_TOKEN or not hmac.compare_digest(token, config.ADMIN_TOKEN):
+        return jsonify({
+            'success': False,
+            'error': 'Forbidden'
+        }), 403
+    
+    try:
+        data = request.get_json()
+        
+        if not data or not data.get('name') or not data.get('model_path'):
+            return jsonify({
+                'success': False,
+                'error': 'name and model_path are required'
+            }), 400
+        
+        service = model_registry.load(
+            data['name'],
+            model_path=data['model_path'],
+            labels_path=data.get('labels_path'),
+            backend=data.get('backend'),
+            make_default=data.get('make_default', False)
+        )
+        
+        return jsonify({
+            'success': True,
+            'model': service.get_model_info(),
+            'default_model': model_registry.default_name
+        })
+        
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Get runtime performance metrics"""
+    return jsonify({
+        'success': True,
+        'timestamp': datetime.now().isoformat(),
+        'scheduler': batch_scheduler.get_stats(),
+        'result_cache': result_cache.get_stats(),
+        'tracking': tracking_store.get_stats(),
+        'diagnosis_jobs': diagnosis_jobs.get_stats(),
+        'rag': rag_service.get_stats(),
+        'database': db_service.get_stats(),
+        'blob_store': blob_store.get_stats(),
+        'history_writer': history_writer.get_stats()
+    })
 
 # ============================================================================
 # Detection Endpoints
 # ============================================================================
 
+def get_model_service(name):
+    """Resolve a request's "model" parameter (None for unknown names)"""
+    try:
+        return model_registry.get(name)
+    except KeyError:
+        return None
+
+def unknown_model_response(name):
+    """400 response for an unknown model name"""
+    return jsonify({
+        'success': False,
+        'error': f"Unknown model '{name}'",
+        'available_models': model_registry.names()
+    }), 400
+
+def get_session_id(params):
+    """
+    Tracking session of a request: "session_id" parameter, then the
+    X-Session-ID header, then the client address
+    
+    Clients should send a session ID: address-based sessions are shared by
+    everyone behind the same NAT. The ID used is returned in the X-Session-ID
+    response header (and "session_id" in the body), so a client can keep
+    the one issued with its first detection.
+    """
+    session_id = (
+        params.get('session_id')
+        or request.headers.get('X-Session-ID')
+        or f"addr:{request.remote_addr}"
+    )
+    g.session_id = session_id
+    return session_id
+
+@app.after_request
+def add_session_header(response):
+    """Return the tracking session a request used"""
+    session_id = g.get('session_id')
+    if session_id:
+        response.headers['X-Session-ID'] = session_id
+    return response
+
+def run_detection(service, image_data, confidence_threshold=None, track_primary=True, session_id=None):
+    """Run single-image detection, through the micro-batching scheduler when enabled"""
+    if config.MICRO_BATCHING_ENABLED:
+        return batch_scheduler.detect(
+            image_data=image_data,
+            confidence_threshold=confidence_threshold,
+            track_primary=track_primary,
+            service=service,
+            session_id=session_id
+        )
+    
+    return service.detect(
+        image_data=image_data,
+        confidence_threshold=confidence_threshold,
+        track_primary=track_primary,
+        session_id=session_id
+    )
+
 @app.route('/api/detect', methods=['POST'])
 def detect_disease():
     """
@@ -78,14 +243,20 @@ def detect_disease():
         "save_history": true,  // optional
         "user_id": "user-123",  // optional, required if save_history=true
         "track_primary": true,  // optional, enable primary detection tracking
+        "session_id": "abc",  // tracking session (or X-Session-ID header); send the one returned by the first call
         "auto_diagnose": true,  // optional, automatically get diagnosis for primary detection
-        "language": "en"  // optional, language for diagnosis (en, kn)
+        "language": "en",  // optional, language for diagnosis (en, kn)
+        "model": "combined",  // optional, registered model name (default model if omitted)
+        "tiled": false,  // optional, slice high-resolution images into overlapping tiles
+        "tiles": 3,  // optional, tiles per side in tiled mode (default: tiles of about 640 px)
+        "tile_overlap": 0.2  // optional, overlap between neighbouring tiles in tiled mode
     }
     
     Response:
     {
         "success": true,
         "detection_id": "uuid",
+        "session_id": "abc",  // Tracking session used (also in the X-Session-ID header)
         "detections": [...],
         "primary_detection": {...},  // Most frequently detected disease
         "diagnosis": {...},  // Diagnosis for primary detection (if auto_diagnose=true)
@@ -106,88 +277,109 @@ def detect_disease():
                 'error': 'No image data provided'
             }), 400
         
-        # Get parameters
-        image_data = data['image']
-        confidence_threshold = data.get('confidence_threshold', config.CONFIDENCE_THRESHOLD)
-        save_history = data.get('save_history', False)
-        user_id = data.get('user_id')
-        track_primary = data.get('track_primary', True)
-        auto_diagnose = data.get('auto_diagnose', True)
-        language = data.get('language', 'en')
-        
-        print(f'🟢 [FLASK] Parameters: confidence={confidence_threshold}, save={save_history}, user={user_id}')
-        print(f'🟢 [FLASK] Tracking: primary={track_primary}, auto_diagnose={auto_diagnose}, language={language}')
-        print(f'🟢 [FLASK] Image data size: {len(image_data)} characters')
-        
-        # Run detection with primary tracking
-        print('🟢 [FLASK] Running YOLO model detection with primary tracking...')
-        result = model_service.detect(
-            image_data=image_data,
-            confidence_threshold=confidence_threshold,
-            track_primary=track_primary
+        service = get_model_service(data.get('model'))
+        if service is None:
+            return unknown_model_response(data.get('model'))
+        
+        return process_detection(
+            service=service,
+            image_data=data['image'],
+            confidence_threshold=data.get('confidence_threshold', config.CONFIDENCE_THRESHOLD),
+            save_history=data.get('save_history', False),
+            user_id=data.get('user_id'),
+            track_primary=data.get('track_primary', True),
+            session_id=get_session_id(data),
+            auto_diagnose=data.get('auto_diagnose', True),
+            language=data.get('language', 'en'),
+            tiled=data.get('tiled', False),
+            tiles=data.get('tiles'),
+            tile_overlap=data.get('tile_overlap')
         )
         
-        if not result['success']:
-            print(f'🟢 [FLASK] ❌ Detection failed: {result.get("error")}')
-            return jsonify(result), 500
+    except Exception as e:
+        print(f'🟢 [FLASK] ❌ EXCEPTION: {str(e)}')
+        print('🟢 [FLASK] ================================================')
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/v2/detect', methods=['POST'])
+def detect_disease_v2():
+    """
+    Detect plant diseases from a binary upload (no base64/JSON overhead)
+    
+    Accepts either:
+    - multipart/form-data with the image in the "image" file field and the
+      other parameters as form fields
+    - a raw image body (Content-Type: image/jpeg, image/png, image/webp or
+      application/octet-stream) with the parameters in the query string
+    
+    Parameters (all optional, same meaning as /api/detect):
+    confidence_threshold, save_history, user_id, track_primary, session_id,
+    auto_diagnose, language, model, tiled, tiles, tile_overlap
+    
+    Response: same as /api/detect
+    """
+    try:
+        print('🟢 [FLASK] ========== NEW DETECTION REQUEST (v2) ==========')
+        print(f'🟢 [FLASK] Request from: {request.remote_addr} ({request.mimetype})')
         
-        print(f'🟢 [FLASK] ✅ Detection complete: {len(result["detections"])} detections found')
-        for i, det in enumerate(result['detections']):
-            print(f'🟢 [FLASK]    [{i+1}] {det["class_name"]}: {det["confidence"]:.2%}')
-        
-        # Check for primary detection
-        primary_detection = result.get('primary_detection')
-        if primary_detection:
-            print(f'🟢 [FLASK] 🎯 PRIMARY DETECTION: {primary_detection["class_name"]}')
-            print(f'🟢 [FLASK]    Confidence: {primary_detection["confidence"]:.2%}')
-            stats = primary_detection.get('tracking_stats', {})
-            if stats:
-                print(f'🟢 [FLASK]    Occurrence: {stats["occurrence_count"]}/{stats["total_frames"]} frames ({stats["occurrence_percentage"]}%)')
-                print(f'🟢 [FLASK]    Stable: {stats["is_stable"]}')
-        
-        # Auto-diagnose primary detection if enabled
-        diagnosis = None
-        if auto_diagnose and primary_detection:
-            disease_name = primary_detection['class_name']
-            print(f'🟢 [FLASK] 🔍 Auto-diagnosing primary detection: {disease_name}...')
-            
-            try:
-                diagnosis_result = rag_service.get_diagnosis(
-                    disease_name=disease_name,
-                    language=language,
-                    use_cache=True
-                )
-                
-                if diagnosis_result['success']:
-                    diagnosis = diagnosis_result['disease']
-                    print(f'🟢 [FLASK] ✅ Diagnosis retrieved from {diagnosis_result["source"]}')
-                else:
-                    print(f'🟢 [FLASK] ⚠️  Diagnosis not found: {diagnosis_result.get("error")}')
-            except Exception as e:
-                print(f'🟢 [FLASK] ⚠️  Diagnosis failed: {e}')
+        # Reject oversized bodies before reading anything
+        if request.content_length and request.content_length > config.MAX_CONTENT_LENGTH:
+            return jsonify({
+                'success': False,
+                'error': f'Image exceeds maximum upload size of {config.MAX_CONTENT_LENGTH} bytes'
+            }), 413
         
-        # Generate detection ID
-        detection_id = str(uuid.uuid4())
-        result['detection_id'] = detection_id
-        result['diagnosis'] = diagnosis
+        if request.mimetype == 'multipart/form-data':
+            upload = request.files.get('image')
+            if upload is None:
+                return jsonify({
+                    'success': False,
+                    'error': 'No image file provided (expected form field "image")'
+                }), 400
+            if upload.filename and not config.allowed_file(upload.filename):
+                return jsonify({
+                    'success': False,
+                    'error': f'Unsupported file type: {secure_filename(upload.filename)}'
+                }), 400
+            image_bytes = upload.stream.read()
+            params = request.form
+        elif request.mimetype.startswith('image/') or request.mimetype == 'application/octet-stream':
+            # Werkzeug limits the input stream to MAX_CONTENT_LENGTH
+            image_bytes = request.stream.read()
+            params = request.args
+        else:
+            return jsonify({
+                'success': False,
+                'error': 'Send multipart/form-data or a raw image/* body'
+            }), 415
         
-        # Save to history if requested
-        if save_history and user_id:
-            try:
-                print(f'🟢 [FLASK] Saving to history for user {user_id}...')
-                db_service.save_detection(
-                    user_id=user_id,
-                    detections=result['detections'],
-                    image_base64=image_data,  # Store for offline access
-                    diagnosis=diagnosis  # Store diagnosis too
-                )
-                print('🟢 [FLASK] ✅ Saved to history')
-            except Exception as e:
-                print(f"🟢 [FLASK] ⚠️ Warning: Failed to save detection: {e}")
+        if not image_bytes:
+            return jsonify({
+                'success': False,
+                'error': 'No image data provided'
+            }), 400
         
-        print(f'🟢 [FLASK] Sending response with detection_id: {detection_id}')
-        print('🟢 [FLASK] ================================================')
-        return jsonify(result)
+        service = get_model_service(params.get('model'))
+        if service is None:
+            return unknown_model_response(params.get('model'))
+        
+        return process_detection(
+            service=service,
+            image_data=image_bytes,
+            confidence_threshold=params.get('confidence_threshold', config.CONFIDENCE_THRESHOLD, type=float),
+            save_history=parse_bool(params.get('save_history'), False),
+            user_id=params.get('user_id'),
+            track_primary=parse_bool(params.get('track_primary'), True),
+            session_id=get_session_id(params),
+            auto_diagnose=parse_bool(params.get('auto_diagnose'), True),
+            language=params.get('language', 'en'),
+            tiled=parse_bool(params.get('tiled'), False),
+            tiles=params.get('tiles', type=int),
+            tile_overlap=params.get('tile_overlap', type=float)
+        )
         
     except Exception as e:
         print(f'🟢 [FLASK] ❌ EXCEPTION: {str(e)}')
@@ -197,6 +389,150 @@ def detect_disease():
             'error': str(e)
         }), 500
 
+def parse_bool(value, default):
+    """Parse a boolean form/query parameter"""
+    if value is None:
+        return default
+    return str(value).lower() in ('1', 'true', 'yes', 'on')
+
+def start_diagnosis(disease_name, language):
+    """
+    Queue a background diagnosis for a detected disease
+    Waits up to DIAGNOSIS_INLINE_WAIT_MS so fast (cached) answers can still be
+    returned with the detection; anything slower is delivered via the ticket.
+    Returns:
+        tuple: (DiagnosisJob or None when the queue is full, diagnosis or None)
+    """
+    job = diagnosis_jobs.submit(disease_name, language)
+    if job is None:
+        print(f'⚠️  Diagnosis queue full, skipping {disease_name}')
+        return None, None
+    
+    if config.DIAGNOSIS_INLINE_WAIT_MS > 0:
+        job.wait(config.DIAGNOSIS_INLINE_WAIT_MS / 1000)
+    
+    diagnosis = job.result['disease'] if job.status == 'done' else None
+    return job, diagnosis
+
+def diagnosis_fields(job, diagnosis):
+    """Diagnosis keys shared by detection responses"""
+    return {
+        'diagnosis': diagnosis,
+        'diagnosis_ticket': job.ticket if job else None,
+        'diagnosis_status': job.status if job else None
+    }
+
+def process_detection(service, image_data, confidence_threshold, save_history, user_id,
+                      track_primary, session_id, auto_diagnose, language,
+                      tiled=False, tiles=None, tile_overlap=None):
+    """
+    Shared detection flow for /api/detect and /api/v2/detect
+    Args:
+        service: YOLOModelService resolved from the request's model name
+        image_data: base64 string or raw image bytes
+    Returns:
+        Flask response tuple
+    """
+    print(f'🟢 [FLASK] Parameters: model={service.name}, confidence={confidence_threshold}, save={save_history}, user={user_id}')
+    print(f'🟢 [FLASK] Tracking: primary={track_primary}, session={session_id}, auto_diagnose={auto_diagnose}, language={language}')
+    if tiled:
+        if tile_overlap is not None:
+            try:
+                tile_overlap = clamp_tile_overlap(tile_overlap)
+            except ValueError as e:
+                return jsonify({
+                    'success': False,
+                    'error': str(e)
+                }), 400
+        print(f'🟢 [FLASK] Tiled mode: tiles={tiles or "auto"}, overlap={tile_overlap if tile_overlap is not None else config.TILE_OVERLAP}')
+    print(f'🟢 [FLASK] Image data size: {len(image_data)} {"bytes" if isinstance(image_data, bytes) else "characters"}')
+    
+    # Run detection with primary tracking
+    print('🟢 [FLASK] Running YOLO model detection with primary tracking...')
+    if tiled:
+        # Tile batches are already full forward passes; bypass the micro-batcher
+        result = service.detect_tiled(
+            image_data=image_data,
+            confidence_threshold=confidence_threshold,
+            tiles=tiles,
+            tile_overlap=tile_overlap,
+            track_primary=track_primary,
+            session_id=session_id
+        )
+    else:
+        result = run_detection(
+            service,
+            image_data=image_data,
+            confidence_threshold=confidence_threshold,
+            track_primary=track_primary,
+            session_id=session_id
+        )
+    
+    if not result['success']:
+        print(f'🟢 [FLASK] ❌ Detection failed: {result.get("error")}')
+        return jsonify(result), 500
+    
+    print(f'🟢 [FLASK] ✅ Detection complete: {len(result["detections"])} detections found')
+    for i, det in enumerate(result['detections']):
+        print(f'🟢 [FLASK]    [{i+1}] {det["class_name"]}: {det["confidence"]:.2%}')
+    
+    # Check for primary detection
+    primary_detection = result.get('primary_detection')
+    if primary_detection:
+        print(f'🟢 [FLASK] 🎯 PRIMARY DETECTION: {primary_detection["class_name"]}')
+        print(f'🟢 [FLASK]    Confidence: {primary_detection["confidence"]:.2%}')
+        stats = primary_detection.get('tracking_stats', {})
+        if stats:
+            print(f'🟢 [FLASK]    Occurrence: {stats["occurrence_count"]}/{stats["total_frames"]} frames ({stats["occurrence_percentage"]}%)')
+            print(f'🟢 [FLASK]    Stable: {stats["is_stable"]}')
+    
+    # Auto-diagnose primary detection in the background (never blocks on the LLM)
+    job, diagnosis = None, None
+    if auto_diagnose and primary_detection:
+        disease_name = primary_detection['class_name']
+        print(f'🟢 [FLASK] 🔍 Queueing diagnosis for primary detection: {disease_name}...')
+        job, diagnosis = start_diagnosis(disease_name, language)
+        if job:
+            print(f'🟢 [FLASK]    Diagnosis ticket {job.ticket} ({job.status})')
+    
+    # Generate detection ID
+    detection_id = str(uuid.uuid4())
+    result['detection_id'] = detection_id
+    result['session_id'] = session_id  # Send back on the next request to keep the tracking session
+    result.update(diagnosis_fields(job, diagnosis))
+    
+    # Save to history if requested (queued; stored under the detection_id returned here)
+    if save_history and user_id:
+        try:
+            print(f'🟢 [FLASK] Saving to history for user {user_id}...')
+            record = dict(
+                user_id=user_id,
+                detections=result['detections'],
+                image_base64=image_data,  # Stored once in the blob store for offline access
+                diagnosis=diagnosis,  # Store diagnosis too
+                detection_id=detection_id
+            )
+            if config.HISTORY_WRITE_BEHIND:
+                history_writer.save(**record)
+                save_late_diagnosis = history_writer.update_diagnosis
+            else:
+                db_service.save_detection(**record)
+                save_late_diagnosis = db_service.update_detection_diagnosis
+            print('🟢 [FLASK] ✅ Saved to history')
+            
+            if job and diagnosis is None:
+                # Fill in the history record once the background diagnosis lands
+                def save_diagnosis(finished):
+                    if finished.status == 'done':
+                        save_late_diagnosis(detection_id, finished.result['disease'])
+                job.add_done_callback(save_diagnosis)
+        except Exception as e:
+            print(f"🟢 [FLASK] ⚠️ Warning: Failed to save detection: {e}")
+    
+    print(f'🟢 [FLASK] Sending response with detection_id: {detection_id}')
+    print('🟢 [FLASK] ================================================')
+    return jsonify(result), 200
+
 @app.route('/api/detect/batch', methods=['POST'])
 def detect_batch():
     """
@@ -205,7 +541,9 @@ def detect_batch():
     Request Body:
     {
         "images": ["base64_1", "base64_2", ...],
-        "confidence_threshold": 0.5
+        "confidence_threshold": 0.5,
+        "max_batch_size": 16,  // optional, images per forward pass (capped at MAX_BATCH_SIZE)
+        "model": "combined"  // optional, registered model name
     }
     """
     try:
@@ -217,18 +555,30 @@ def detect_batch():
                 'error': 'No images provided'
             }), 400
         
+        service = get_model_service(data.get('model'))
+        if service is None:
+            return unknown_model_response(data.get('model'))
+        
         images = data['images']
         confidence_threshold = data.get('confidence_threshold', config.CONFIDENCE_THRESHOLD)
+        max_batch_size = data.get('max_batch_size', config.MAX_BATCH_SIZE)
         
-        results = []
-        for i, image_data in enumerate(images):
-            result = model_service.detect(
-                image_data=image_data,
-                confidence_threshold=confidence_threshold,
-                track_primary=False  # Disable tracking for batch
-            )
+        # Client may ask for smaller forward passes, never larger than the server limit
+        if type(max_batch_size) is not int or max_batch_size < 1:
+            return jsonify({
+                'success': False,
+                'error': 'max_batch_size must be a positive integer'
+            }), 400
+        max_batch_size = min(max_batch_size, config.MAX_BATCH_SIZE)
+        
+        # Batched inference (tracking is always disabled for batch)
+        results = service.detect_many(
+            images,
+            confidence_threshold=confidence_threshold,
+            max_batch_size=max_batch_size
+        )
+        for i, result in enumerate(results):
             result['image_index'] = i
-            results.append(result)
         
         return jsonify({
             'success': True,
@@ -245,22 +595,36 @@ def detect_batch():
 @app.route('/api/detect/reset-tracking', methods=['POST'])
 def reset_tracking():
     """
-    Reset primary detection tracking history
+    Reset primary detection tracking history of one session
     Useful when switching to a different plant or starting a new detection session
     
+    Request Body (optional):
+    {
+        "session_id": "abc",  // tracking session (or X-Session-ID header; default: client address)
+        "model": "combined"  // registered model name (default model if omitted)
+    }
+    
     Response:
     {
         "success": true,
-        "message": "Tracking history reset"
+        "message": "Tracking history reset",
+        "session_id": "abc"
     }
     """
     try:
-        model_service.reset_tracking()
-        print('🟢 [FLASK] ✅ Detection tracking history reset')
+        data = request.get_json(silent=True) or {}
+        service = get_model_service(data.get('model'))
+        if service is None:
+            return unknown_model_response(data.get('model'))
+        
+        session_id = get_session_id(data)
+        service.reset_tracking(session_id)
+        print(f'🟢 [FLASK] ✅ Detection tracking history reset for session {session_id}')
         
         return jsonify({
             'success': True,
-            'message': 'Tracking history reset'
+            'message': 'Tracking history reset',
+            'session_id': session_id
         })
         
     except Exception as e:
@@ -269,6 +633,88 @@ def reset_tracking():
             'error': str(e)
         }), 500
 
+def continuous_step(service, image_data, session_id, params):
+    """
+    One frame of continuous detection: motion gate, detection with tracking,
+    stability check and diagnosis once stable. Shared by the HTTP endpoint
+    and the WebSocket stream.
+    Args:
+        service: YOLOModelService resolved from the request's model name
+        image_data: base64 string or raw image bytes
+        session_id: Tracking session
+        params: Mapping with the optional continuous-mode parameters
+    Returns:
+        dict: Response payload ('success' False when detection failed)
+    """
+    confidence_threshold = params.get('confidence_threshold', config.CONFIDENCE_THRESHOLD)
+    language = params.get('language', 'en')
+    min_stability = params.get('min_stability', 5)
+    
+    # Motion gate: a still camera reuses the last detections (re-tracked, so stability still builds up)
+    result, motion_score, signature = None, None, None
+    if params.get('motion_gating', config.MOTION_GATING_ENABLED):
+        gate_start = time.time()
+        try:
+            signature = frame_signature(image_data)
+        except ValueError:
+            signature = None  # Undecodable - let detection report the error
+        
+        if signature is not None:
+            stored, motion_score = service.check_motion(
+                signature,
+                confidence_threshold=confidence_threshold,
+                session_id=session_id,
+                threshold=params.get('motion_threshold')
+            )
+            if stored is not None:
+                gate_time = round(time.time() - gate_start, 3)
+                result = dict(stored, success=True, timing={'motion_check': gate_time, 'total': gate_time})
+    
+    inference_skipped = result is not None
+    if not inference_skipped:
+        # Run detection with tracking
+        result = run_detection(
+            service,
+            image_data=image_data,
+            confidence_threshold=confidence_threshold,
+            track_primary=True,
+            session_id=session_id
+        )
+        
+        if not result['success']:
+            return result
+        
+        if signature is not None:
+            service.remember_motion(signature, result, confidence_threshold, session_id)
+    
+    # Check if primary detection is stable
+    primary_detection = result.get('primary_detection')
+    is_stable = False
+    job, diagnosis = None, None
+    
+    if primary_detection:
+        stats = primary_detection.get('tracking_stats', {})
+        # Stable once the same box has been tracked for min_stability frames
+        is_stable = stats.get('track_hits', 0) >= min_stability
+        
+        # Diagnose only when stable (to avoid unnecessary API calls); repeated
+        # frames join the in-flight job or reuse its finished result
+        if is_stable:
+            job, diagnosis = start_diagnosis(primary_detection['class_name'], language)
+    
+    response = {
+        'success': True,
+        'inference_skipped': inference_skipped,
+        'motion_score': round(motion_score, 2) if motion_score is not None else None,
+        'detections': result['detections'],
+        'primary_detection': primary_detection,
+        'tracks': result.get('tracks', []),
+        'is_stable': is_stable,
+        'timing': result['timing']
+    }
+    response.update(diagnosis_fields(job, diagnosis))
+    return response
+
 @app.route('/api/detect/continuous', methods=['POST'])
 def continuous_detection():
     """
@@ -280,14 +726,22 @@ def continuous_detection():
         "image": "base64_encoded_image",
         "confidence_threshold": 0.5,  // optional
         "language": "en",  // optional
-        "min_stability": 5  // optional, minimum frames for stable detection
+        "min_stability": 5,  // optional, frames the primary lesion's box track must persist
+        "session_id": "abc",  // tracking session (or X-Session-ID header); send the one returned by the first call
+        "model": "combined",  // optional, registered model name
+        "motion_gating": true,  // optional, reuse the last result while the frame is unchanged
+        "motion_threshold": 4.0  // optional, mean pixel change (0-255) treated as unchanged
     }
     
     Response:
     {
         "success": true,
+        "session_id": "abc",  // Tracking session used (also in the X-Session-ID header)
+        "inference_skipped": bool,  // True when the previous tracked result was reused
+        "motion_score": 1.7,  // Change since the last inferred frame (null if not compared)
         "detections": [...],
-        "primary_detection": {...},
+        "primary_detection": {...},  // Includes track_id and smoothed_box
+        "tracks": [...],  // Box tracks matched this frame (track_id, hits, age, smoothed bounding_box)
         "diagnosis": {...},  // Only included when primary detection is stable
         "is_stable": bool,  // Whether primary detection is stable enough for diagnosis
         "timing": {...}
@@ -304,53 +758,17 @@ def continuous_detection():
         
         # Get parameters
         image_data = data['image']
-        confidence_threshold = data.get('confidence_threshold', config.CONFIDENCE_THRESHOLD)
-        language = data.get('language', 'en')
-        min_stability = data.get('min_stability', 5)
+        session_id = get_session_id(data)
         
-        # Run detection with tracking
-        result = model_service.detect(
-            image_data=image_data,
-            confidence_threshold=confidence_threshold,
-            track_primary=True
-        )
+        service = get_model_service(data.get('model'))
+        if service is None:
+            return unknown_model_response(data.get('model'))
         
+        result = continuous_step(service, image_data, session_id, data)
         if not result['success']:
             return jsonify(result), 500
         
-        # Check if primary detection is stable
-        primary_detection = result.get('primary_detection')
-        is_stable = False
-        diagnosis = None
-        
-        if primary_detection:
-            stats = primary_detection.get('tracking_stats', {})
-            is_stable = stats.get('occurrence_count', 0) >= min_stability
-            
-            # Get diagnosis only when stable (to avoid unnecessary API calls)
-            if is_stable:
-                disease_name = primary_detection['class_name']
-                
-                try:
-                    diagnosis_result = rag_service.get_diagnosis(
-                        disease_name=disease_name,
-                        language=language,
-                        use_cache=True
-                    )
-                    
-                    if diagnosis_result['success']:
-                        diagnosis = diagnosis_result['disease']
-                except Exception as e:
-                    print(f'⚠️  Diagnosis failed: {e}')
-        
-        return jsonify({
-            'success': True,
-            'detections': result['detections'],
-            'primary_detection': primary_detection,
-            'diagnosis': diagnosis,
-            'is_stable': is_stable,
-            'timing': result['timing']
-        })
+        return jsonify(dict(result, session_id=session_id))
         
     except Exception as e:
         return jsonify({
@@ -358,6 +776,116 @@ def continuous_detection():
             'error': str(e)
         }), 500
 
+def stream_detection(ws):
+    """
+    WebSocket /api/ws/detect - live detection over one persistent connection
+    
+    Client -> server:
+    - binary message: one encoded frame (JPEG, PNG or WebP)
+    - text message: JSON settings, applied to the following frames
+      {"session_id", "confidence_threshold", "language", "min_stability",
+       "model", "motion_gating", "motion_threshold"}
+      or {"type": "reset"} to reset the session's tracking
+    
+    Server -> client (JSON text):
+    - {"type": "ready", "session_id": "..."}
+    - {"type": "detection", "frame": n, "dropped_frames": k, ...}  // /api/detect/continuous response
+    - {"type": "diagnosis", "ticket": "...", ...}  // once a pending diagnosis_ticket finishes
+    - {"type": "error", "error": "..."}
+    
+    Frames are processed one at a time; a frame that arrives while an older
+    one is still waiting replaces it, so results never lag behind a backlog.
+    """
+    session_id = request.args.get('session_id') or request.headers.get('X-Session-ID') or f"ws:{uuid.uuid4()}"
+    params = {}
+    slot = LatestFrameSlot()
+    send_lock = threading.Lock()
+    
+    def send(message):
+        with send_lock:
+            ws.send(json.dumps(message))
+    
+    subscribed = set()  # Diagnosis tickets that will be pushed when done
+    
+    def push_diagnosis(job):
+        try:
+            send(dict(job.to_dict(), type='diagnosis'))
+        except ConnectionClosed:
+            pass
+    
+    def worker():
+        while True:
+            frame = slot.take()
+            if frame is None:
+                return
+            
+            frame_number, image_data, frame_params, frame_session, service = frame
+            try:
+                result = continuous_step(service, image_data, frame_session, frame_params)
+                send(dict(result, type='detection', frame=frame_number, dropped_frames=slot.dropped))
+                
+                ticket = result.get('diagnosis_ticket')
+                if ticket and result['diagnosis'] is None and ticket not in subscribed:
+                    subscribed.add(ticket)
+                    job = diagnosis_jobs.get(ticket)
+                    if job:
+                        job.add_done_callback(push_diagnosis)
+            except ConnectionClosed:
+                return
+            except Exception as e:
+                try:
+                    send({'type': 'error', 'frame': frame_number, 'error': str(e)})
+                except ConnectionClosed:
+                    return
+    
+    worker_thread = threading.Thread(target=worker, name='ws-detect', daemon=True)
+    worker_thread.start()
+    print(f'🟢 [WS] Stream opened for session {session_id}')
+    
+    try:
+        send({'type': 'ready', 'session_id': session_id})
+        
+        while True:
+            message = ws.receive()
+            image_data = None
+            
+            if isinstance(message, (bytes, bytearray)):
+                image_data = bytes(message)
+            else:
+                try:
+                    update = json.loads(message)
+                except (TypeError, ValueError):
+                    send({'type': 'error', 'error': 'Text messages must be JSON'})
+                    continue
+                
+                if update.get('type') == 'reset':
+                    service = get_model_service(params.get('model'))
+                    if service:
+                        service.reset_tracking(session_id)
+                    send({'type': 'reset', 'session_id': session_id})
+                    continue
+                
+                image_data = update.pop('image', None)  # base64 frames are accepted too
+                session_id = update.pop('session_id', session_id)
+                params.update(update)
+            
+            if image_data:
+                service = get_model_service(params.get('model'))
+                if service is None:
+                    send({'type': 'error', 'error': f"Unknown model '{params.get('model')}'"})
+                    continue
+                slot.put((slot.received + 1, image_data, dict(params), session_id, service))
+                
+    except ConnectionClosed:
+        pass
+    finally:
+        slot.close()
+        print(f'🟢 [WS] Stream closed for session {session_id} '
+              f'({slot.received} frames, {slot.dropped} dropped)')
+
+if sock:
+    sock.route('/api/ws/detect')(stream_detection)
+
 # ============================================================================
 # Diagnosis Endpoints (RAG Layer)
 # ============================================================================
@@ -431,6 +959,45 @@ def diagnose_disease_post():
             'error': str(e)
         }), 500
 
+@app.route('/api/diagnose/tickets/<ticket>', methods=['GET'])
+def diagnosis_ticket(ticket):
+    """
+    Poll (or long-poll) a background diagnosis started by auto_diagnose
+    
+    Query Parameters:
+    - wait: Seconds to block until the diagnosis is done - default: 0 (max 30)
+    
+    Response:
+    {
+        "success": true,
+        "ticket": "...",
+        "status": "pending|running|done|failed",
+        "disease_name": "...",
+        "language": "en",
+        "diagnosis": {...},  // once done
+        "source": "cache|knowledge_base|online_llm"
+    }
+    """
+    job = diagnosis_jobs.get(ticket)
+    if job is None:
+        return jsonify({
+            'success': False,
+            'error': 'Unknown or expired diagnosis ticket'
+        }), 404
+    
+    try:
+        wait = min(max(float(request.args.get('wait', 0)), 0), config.DIAGNOSIS_MAX_POLL_WAIT)
+    except ValueError:
+        return jsonify({
+            'success': False,
+            'error': 'wait must be a number of seconds'
+        }), 400
+    
+    if wait:
+        job.wait(wait)
+    
+    return jsonify(dict(job.to_dict(), success=True))
+
 # ============================================================================
 # History Endpoints
 # ============================================================================
@@ -485,27 +1052,50 @@ def get_user_history(user_id):
     Get user's detection history
     
     Query Parameters:
-    - limit: Number of records (default: 50)
-    - offset: Offset for pagination (default: 0)
+    - limit: Number of records (default: 50, max 200)
+    - cursor: next_cursor from the previous page (keyset pagination)
+    - offset: Offset for pagination (deprecated; slow for deep pages)
+    - fields: Comma-separated fields to return (e.g. id,timestamp,thumbnail_url) - default: all
     """
     try:
-        limit = int(request.args.get('limit', 50))
+        limit = min(max(int(request.args.get('limit', 50)), 1), config.HISTORY_MAX_PAGE_SIZE)
         offset = int(request.args.get('offset', 0))
+        cursor = request.args.get('cursor')
+        
+        # Image URLs are derived from image_hash
+        fields = None
+        if request.args.get('fields'):
+            fields = {field.strip() for field in request.args['fields'].split(',') if field.strip()}
+        db_fields = None
+        if fields is not None:
+            db_fields = fields - IMAGE_URL_FIELDS
+            if fields & IMAGE_URL_FIELDS:
+                db_fields.add('image_hash')
         
-        history = db_service.get_user_history(user_id, limit, offset)
+        next_cursor = None
+        try:
+            if offset and not cursor:
+                history = db_service.get_user_history(user_id, limit, offset, fields=db_fields)
+            else:
+                history, next_cursor = db_service.get_user_history_page(user_id, limit, cursor, fields=db_fields)
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
         
-        # Parse JSON fields
+        # Records come back decoded; only add URLs and drop unrequested keys
         for record in history:
-            if record.get('detections'):
-                record['detections'] = eval(record['detections'])
-            if record.get('diagnosis'):
-                record['diagnosis'] = eval(record['diagnosis'])
+            add_image_urls(record)
+        if fields is not None:
+            history = [{key: value for key, value in record.items() if key in fields} for record in history]
         
         return jsonify({
             'success': True,
             'user_id': user_id,
             'history': history,
-            'count': len(history)
+            'count': len(history),
+            'next_cursor': next_cursor
         })
         
     except Exception as e:
@@ -514,6 +1104,42 @@ def get_user_history(user_id):
             'error': str(e)
         }), 500
 
+IMAGE_URL_FIELDS = {'image_url', 'thumbnail_url'}
+
+def add_image_urls(record):
+    """Add image and thumbnail URLs to a history record that references a stored image"""
+    image_hash = record.get('image_hash')
+    record['image_url'] = f"/api/images/{image_hash}" if image_hash else None
+    record['thumbnail_url'] = f"/api/images/{image_hash}?thumbnail=true" if image_hash else None
+    return record
+
+@app.route('/api/images/<image_hash>', methods=['GET'])
+def get_image(image_hash):
+    """
+    Serve a stored detection image (supports Range and conditional requests)
+    
+    Query Parameters:
+    - thumbnail: Serve the thumbnail instead of the original - default: false
+    """
+    thumbnail = parse_bool(request.args.get('thumbnail'), False)
+    path, mimetype = blob_store.open_info(image_hash, thumbnail=thumbnail)
+    if path is None:
+        return jsonify({
+            'success': False,
+            'error': 'Image not found'
+        }), 404
+    
+    # Content never changes for a hash, so clients may cache it indefinitely
+    response = send_file(
+        path,
+        mimetype=mimetype,
+        conditional=True,
+        etag=f"{image_hash}{'-thumb' if thumbnail else ''}",
+        max_age=config.IMAGE_CACHE_MAX_AGE
+    )
+    response.cache_control.immutable = True
+    return response
+
 @app.route('/api/history/<detection_id>', methods=['DELETE'])
 def delete_detection(detection_id):
     """Delete detection from history"""
@@ -602,6 +1228,13 @@ def not_found(error):
         'error': 'Endpoint not found'
     }), 404
 
+@app.errorhandler(413)
+def payload_too_large(error):
+    return jsonify({
+        'success': False,
+        'error': f'Upload exceeds maximum size of {config.MAX_CONTENT_LENGTH} bytes'
+    }), 413
+
 @app.errorhandler(500)
 def internal_error(error):
     return jsonify({
@@ -623,7 +1256,8 @@ def internal_error(error):
     print("\n" + "=" * 70)
     print("🚀 AgriScan API Server Starting...")
     print("=" * 70)
-    print(f"📊 Model loaded: {model_service.model is not None}")
+    print(f"📊 Model loaded: {model_registry.default.model is not None}")
+    print(f"🗂️  Registered models: {', '.join(model_registry.names())}")
     print(f"🗄️  Database: {config.DATABASE_PATH}")
     print(f"🌐 Server: http://{host}:{port}")
     print(f"🔧 Environment: {'Production' if not config.DEBUG else 'Development'}")
@@ -24,6 +24,9 @@ class Config:
     DATA_DIR = BASE_DIR / 'data'
     MODELS_DIR = BASE_DIR / 'models'
     UPLOADS_DIR = DATA_DIR / 'uploads'
+    BLOB_STORE_DIR = UPLOADS_DIR / 'blobs'  # Content-addressed detection images
+    THUMBNAIL_SIZE = 256  # Longer side of generated thumbnails
+    IMAGE_CACHE_MAX_AGE = 365 * 24 * 3600  # Stored images are immutable (named by content hash)
     
     # Create directories if they don't exist
     DATA_DIR.mkdir(exist_ok=True)
@@ -31,28 +34,118 @@ class Config:
     
     # Model Configuration
     MODEL_PATH = MODELS_DIR / 'agriscan_combined' / 'weights' / 'best.pt'
-    LABELS_PATH = API_DIR / 'labels.txt'
+    ONNX_MODEL_PATH = MODELS_DIR / 'onnx_export' / 'agriscan_model.onnx'  # From export_to_tflite.py
+    ONNX_INT8_MODEL_PATH = MODELS_DIR / 'onnx_export' / 'agriscan_model_int8.onnx'  # From quantize_model.py
+    LABELS_PATH = API_DIR / 'labels.txt'  # Fallback when a model ships no labels.txt
+    DEFAULT_MODEL_NAME = os.getenv('DEFAULT_MODEL_NAME', 'combined')
+    MODEL_REGISTRY_FILE = MODELS_DIR / 'registry.json'  # Optional extra named models
     CONFIDENCE_THRESHOLD = 0.5
     IOU_THRESHOLD = 0.45
     IMG_SIZE = 640
+    MAX_BATCH_SIZE = int(os.getenv('MAX_BATCH_SIZE', 16))  # Images per forward pass for batch detection
+    FAST_IMAGE_DECODE = os.getenv('FAST_IMAGE_DECODE', 'True').lower() == 'true'  # OpenCV decode, no PIL round-trip
+    TILE_OVERLAP = float(os.getenv('TILE_OVERLAP', 0.2))  # Tiled mode: overlap between neighbouring tiles
+    MAX_TILES_PER_SIDE = int(os.getenv('MAX_TILES_PER_SIDE', 8))  # Tiled mode: caps work per image
+    
+    # Inference backend: 'ultralytics' (PyTorch best.pt), 'onnx' (onnxruntime on CPU)
+    # or 'onnx-int8' (statically quantized ONNX model on CPU)
+    INFERENCE_BACKEND = os.getenv('INFERENCE_BACKEND', 'ultralytics').lower()
+    ONNX_INTRA_OP_THREADS = int(os.getenv('ONNX_INTRA_OP_THREADS', 0))  # 0 = onnxruntime default
+    
+    # Micro-batching - coalesce concurrent /api/detect calls into one forward pass
+    # (needs a threaded server, e.g. gunicorn --threads)
+    MICRO_BATCHING_ENABLED = os.getenv('MICRO_BATCHING_ENABLED', 'False').lower() == 'true'
+    MICRO_BATCH_MAX_SIZE = int(os.getenv('MICRO_BATCH_MAX_SIZE', 8))  # N: max requests per batch
+    MICRO_BATCH_MAX_WAIT_MS = float(os.getenv('MICRO_BATCH_MAX_WAIT_MS', 10))  # T: max wait for a batch to fill
+    
+    # Result cache - skip inference for re-submitted images (0 disables)
+    RESULT_CACHE_SIZE = int(os.getenv('RESULT_CACHE_SIZE', 256))  # Max cached results
+    RESULT_CACHE_TTL = int(os.getenv('RESULT_CACHE_TTL', 600))  # Seconds
+    
+    # Primary-detection tracking sessions: 'memory' (per worker process) or
+    # 'sqlite' (shared by every worker on the host)
+    TRACKING_STORE = os.getenv('TRACKING_STORE', 'memory').lower()
+    TRACKING_DB_PATH = DATA_DIR / 'tracking.db'
+    TRACKING_HISTORY_SIZE = 45  # Frames per session
+    TRACKING_CONFIDENCE_WEIGHTED = os.getenv('TRACKING_CONFIDENCE_WEIGHTED', 'False').lower() == 'true'  # Primary = highest summed confidence
+    TRACKING_HALF_LIFE = float(os.getenv('TRACKING_HALF_LIFE', 0))  # Seconds; 0 = no time decay
+    TRACKER_IOU_THRESHOLD = 0.3  # Min IoU to continue a box track
+    TRACKER_MAX_AGE = int(os.getenv('TRACKER_MAX_AGE', 5))  # Frames a track survives without a match
+    TRACKER_MIN_HITS = 3  # Matched frames before a track is confirmed
+    TRACKING_STABLE_HITS = 5  # Primary detection is stable once its track has this many hits
+    
+    # Motion gating - continuous mode reuses the last result while the camera is still
+    MOTION_GATING_ENABLED = os.getenv('MOTION_GATING_ENABLED', 'True').lower() == 'true'
+    MOTION_THRESHOLD = float(os.getenv('MOTION_THRESHOLD', 4.0))  # Mean abs change (0-255) of a 32x32 thumbnail
+    MOTION_MAX_SKIPS = int(os.getenv('MOTION_MAX_SKIPS', 10))  # Force inference after this many skipped frames
+    TRACKING_MAX_SESSIONS = int(os.getenv('TRACKING_MAX_SESSIONS', 1000))
+    TRACKING_IDLE_TIMEOUT = int(os.getenv('TRACKING_IDLE_TIMEOUT', 900))  # Seconds before an idle session is dropped
     
     # Database
     DATABASE_PATH = DATA_DIR / 'agriscan.db'
     DATABASE_URL = f'sqlite:///{DATABASE_PATH}'
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 8))  # Pooled WAL-mode connections per process
+    DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 10))  # Seconds to wait for a free connection
+    DB_BUSY_TIMEOUT_MS = 5000  # SQLite wait on a locked database
+    HISTORY_MAX_PAGE_SIZE = 200  # Max records per /api/history page
+    
+    # History Write-Behind (detections saved by /api/detect)
+    HISTORY_WRITE_BEHIND = os.getenv('HISTORY_WRITE_BEHIND', 'True').lower() == 'true'  # False: save before responding
+    HISTORY_QUEUE_SIZE = int(os.getenv('HISTORY_QUEUE_SIZE', 1000))  # Records buffered before backpressure
+    HISTORY_BATCH_SIZE = int(os.getenv('HISTORY_BATCH_SIZE', 64))  # Records per transaction
+    HISTORY_FLUSH_INTERVAL_MS = float(os.getenv('HISTORY_FLUSH_INTERVAL_MS', 50))  # Max wait for a batch to fill
+    HISTORY_ENQUEUE_TIMEOUT = float(os.getenv('HISTORY_ENQUEUE_TIMEOUT', 1.0))  # Seconds to wait on a full queue before saving inline
+    HISTORY_DURABLE = os.getenv('HISTORY_DURABLE', 'False').lower() == 'true'  # Wait for an fsynced commit before responding
+    HISTORY_SHUTDOWN_TIMEOUT = float(os.getenv('HISTORY_SHUTDOWN_TIMEOUT', 10))  # Seconds to flush the queue at exit
     
     # RAG Configuration
     USE_ONLINE_RAG = os.getenv('USE_ONLINE_RAG', 'False').lower() == 'true'
     GEMINI_API_KEY = os.getenv('GEMINI_API_KEY', '')
     OPENAI_API_KEY = os.getenv('OPENAI_API_KEY', '')
     KNOWLEDGE_BASE_PATH = DATA_DIR / 'disease_knowledge.json'
+    DIAGNOSIS_CACHE_VERSION = int(os.getenv('DIAGNOSIS_CACHE_VERSION', 1))  # Bump when prompts or content format change
+    DIAGNOSIS_CACHE_TTL = int(os.getenv('DIAGNOSIS_CACHE_TTL', 30 * 24 * 3600))  # Seconds for LLM entries (knowledge base entries never expire)
+    # Cache-first diagnosis: entries older than their source's freshness window
+    # are still served but refreshed from the LLM in the background
+    DIAGNOSIS_FRESHNESS = {
+        'online_llm': int(os.getenv('DIAGNOSIS_FRESHNESS_LLM', 7 * 24 * 3600)),
+        'knowledge_base': int(os.getenv('DIAGNOSIS_FRESHNESS_KB', 0)),  # 0 = upgrade to LLM content when online
+        'default': 24 * 3600
+    }
+    DIAGNOSIS_REFRESH_INTERVAL = int(os.getenv('DIAGNOSIS_REFRESH_INTERVAL', 300))  # Min seconds between refreshes of one entry
+    DIAGNOSIS_REFRESH_WORKERS = 2
+    DIAGNOSIS_CACHE_PREWARM = os.getenv('DIAGNOSIS_CACHE_PREWARM', 'True').lower() == 'true'  # Load the knowledge base at startup
+    LLM_TIMEOUT = float(os.getenv('LLM_TIMEOUT', 60))  # Seconds before falling back to offline data (also the client request timeout)
+    LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', 4))  # Shared pool for LLM calls; calls beyond it fall back at once
+    GEMINI_MODELS = os.getenv(
+        'GEMINI_MODELS',
+        'models/gemini-2.5-flash,models/gemini-2.0-flash,models/gemini-flash-latest,models/gemini-2.5-pro'
+    ).split(',')  # In order of preference
+    LLM_MODEL_TTL = int(os.getenv('LLM_MODEL_TTL', 3600))  # Seconds before re-probing for a preferred model
+    LLM_FAILURE_THRESHOLD = 3  # Consecutive failed calls before a model is demoted
+    LLM_CIRCUIT_COOLDOWN = int(os.getenv('LLM_CIRCUIT_COOLDOWN', 300))  # Seconds a demoted model is skipped
+    
+    # Auto-diagnosis runs in the background; detection responses carry a ticket
+    DIAGNOSIS_WORKERS = int(os.getenv('DIAGNOSIS_WORKERS', 4))
+    DIAGNOSIS_MAX_PENDING = int(os.getenv('DIAGNOSIS_MAX_PENDING', 64))  # Distinct jobs queued or running
+    DIAGNOSIS_INLINE_WAIT_MS = float(os.getenv('DIAGNOSIS_INLINE_WAIT_MS', 0))  # Wait this long for fast (cached) answers
+    DIAGNOSIS_TICKET_TTL = int(os.getenv('DIAGNOSIS_TICKET_TTL', 600))  # Seconds a finished ticket stays pollable
+    DIAGNOSIS_MAX_POLL_WAIT = 30  # Seconds a long-poll may block
     
     # API Settings
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max upload
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'webp'}
     
+    # Admin endpoints (model hot-swap) are disabled unless a token is set
+    ADMIN_TOKEN = os.getenv('ADMIN_TOKEN', '')
+    
     # CORS - Allow local and production frontends
     CORS_ORIGINS = os.getenv('CORS_ORIGINS', '*').split(',') if os.getenv('CORS_ORIGINS') else ['*']
     
+    # Reverse proxies in front of the app (Render: 1) whose X-Forwarded-For is trusted;
+    # 0 when clients connect directly, so they cannot spoof their address
+    TRUSTED_PROXIES = int(os.getenv('TRUSTED_PROXIES', 1))
+    
     # Logging
     LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
     LOG_FILE = DATA_DIR / 'api.log'
@@ -0,0 +1,208 @@
+"""
+AgriScan Backend - Micro-Batching Scheduler
+Coalesces concurrent detection requests into batched forward passes
+"""
+
+import time
+import queue
+import threading
+from collections import Counter
+from concurrent.futures import Future
+from pathlib import Path
+import sys
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from config import config
+from services.model_service import model_service
+
+
+class _PendingDetection:
+    """A detect call waiting in the scheduler queue"""
+
+    __slots__ = ('service', 'image_data', 'conf', 'iou', 'track_primary', 'session_id', 'future', 'enqueued_at')
+
+    def __init__(self, service, image_data, conf, iou, track_primary, session_id):
+        self.service = service
+        self.image_data = image_data
+        self.conf = conf
+        self.iou = iou
+        self.track_primary = track_primary
+        self.session_id = session_id
+        self.future = Future()
+        self.enqueued_at = time.time()
+
+
+class MicroBatchScheduler:
+    """
+    In-process request coalescer in front of YOLOModelService
+
+    Callers enqueue detect requests; a single worker thread drains up to
+    max_batch_size requests (or waits at most max_wait_ms after the oldest
+    one arrived), runs them as one batched forward pass and resolves each
+    caller's future with its own result. Only useful when the server handles
+    requests concurrently (threaded gunicorn workers or the Flask dev server).
+    """
+
+    def __init__(self, service, max_batch_size=None, max_wait_ms=None):
+        """
+        Initialize scheduler (the worker thread starts on first submit)
+        Args:
+            service: Default YOLOModelService for requests that do not pick one
+        """
+        self.service = service
+        self.max_batch_size = max(1, max_batch_size or config.MICRO_BATCH_MAX_SIZE)
+        self.max_wait = (max_wait_ms if max_wait_ms is not None else config.MICRO_BATCH_MAX_WAIT_MS) / 1000.0
+
+        self._queue = queue.Queue()
+        self._worker = None
+        self._worker_lock = threading.Lock()
+
+        # Metrics
+        self._stats_lock = threading.Lock()
+        self.batch_size_histogram = Counter()
+        self.total_requests = 0
+        self.total_batches = 0
+        self.total_wait_time = 0.0
+        self.max_wait_time = 0.0
+
+    def _ensure_worker(self):
+        """Start the worker thread lazily (after gunicorn has forked)"""
+        if self._worker is not None and self._worker.is_alive():
+            return
+
+        with self._worker_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(
+                    target=self._run,
+                    name='micro-batch-scheduler',
+                    daemon=True
+                )
+                self._worker.start()
+
+    def submit(self, image_data, confidence_threshold=None, iou_threshold=None, track_primary=True,
+               service=None, session_id=None):
+        """
+        Queue a detect request
+        Args:
+            image_data: Image data (base64, PIL, numpy, bytes)
+            confidence_threshold: Minimum confidence score (default from config)
+            iou_threshold: IoU threshold for NMS (default from config)
+            track_primary: Enable primary detection tracking
+            service: YOLOModelService to run on (default: the scheduler's service)
+            session_id: Client session whose tracking history is updated
+        Returns:
+            Future: Resolves to the same dict YOLOModelService.detect() returns
+        """
+        self._ensure_worker()
+
+        pending = _PendingDetection(
+            service or self.service,
+            image_data,
+            confidence_threshold or config.CONFIDENCE_THRESHOLD,
+            iou_threshold or config.IOU_THRESHOLD,
+            track_primary,
+            session_id
+        )
+        self._queue.put(pending)
+        return pending.future
+
+    def detect(self, image_data, confidence_threshold=None, iou_threshold=None, track_primary=True,
+               service=None, session_id=None):
+        """Blocking drop-in replacement for YOLOModelService.detect()"""
+        return self.submit(
+            image_data,
+            confidence_threshold=confidence_threshold,
+            iou_threshold=iou_threshold,
+            track_primary=track_primary,
+            service=service,
+            session_id=session_id
+        ).result()
+
+    def _collect_batch(self):
+        """Block for the first request, then gather more until the batch is full or the wait expires"""
+        first = self._queue.get()
+        batch = [first]
+        deadline = first.enqueued_at + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.time()
+            try:
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    # Wait expired - still take anything that is already queued
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+
+        return batch
+
+    def _run(self):
+        """Worker loop"""
+        while True:
+            batch = self._collect_batch()
+            try:
+                self._process(batch)
+            except Exception as e:
+                for pending in batch:
+                    if not pending.future.done():
+                        pending.future.set_exception(e)
+
+    def _process(self, batch):
+        """Run one batch and resolve its futures"""
+        started_at = time.time()
+        waits = [started_at - pending.enqueued_at for pending in batch]
+
+        with self._stats_lock:
+            self.batch_size_histogram[len(batch)] += 1
+            self.total_batches += 1
+            self.total_requests += len(batch)
+            self.total_wait_time += sum(waits)
+            self.max_wait_time = max(self.max_wait_time, max(waits))
+
+        # Requests for different models or thresholds cannot share a forward pass
+        groups = {}
+        for pending, wait in zip(batch, waits):
+            groups.setdefault((pending.service, pending.conf, pending.iou), []).append((pending, wait))
+
+        for (service, conf, iou), members in groups.items():
+            results = service.detect_many(
+                [pending.image_data for pending, _ in members],
+                confidence_threshold=conf,
+                iou_threshold=iou,
+                max_batch_size=len(members)
+            )
+
+            for (pending, wait), result in zip(members, results):
+                if result['success']:
+                    if pending.track_primary:
+                        image_size = (result['image_size']['width'], result['image_size']['height'])
+                        result['primary_detection'], result['tracks'] = service.track(
+                            result['detections'], image_size, pending.session_id
+                        )
+                    result['timing']['queue_wait'] = round(wait, 3)
+                pending.future.set_result(result)
+
+    def get_stats(self):
+        """Get queue depth, batch-size histogram and wait-time metrics"""
+        with self._stats_lock:
+            avg_batch = self.total_requests / self.total_batches if self.total_batches else 0
+            avg_wait = self.total_wait_time / self.total_requests if self.total_requests else 0
+
+            return {
+                'enabled': config.MICRO_BATCHING_ENABLED,
+                'queue_depth': self._queue.qsize(),
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': round(self.max_wait * 1000, 2),
+                'total_requests': self.total_requests,
+                'total_batches': self.total_batches,
+                'avg_batch_size': round(avg_batch, 2),
+                'batch_size_histogram': {str(size): count for size, count in sorted(self.batch_size_histogram.items())},
+                'avg_wait_ms': round(avg_wait * 1000, 2),
+                'max_wait_ms_observed': round(self.max_wait_time * 1000, 2)
+            }
+
+
+# Singleton instance
+batch_scheduler = MicroBatchScheduler(model_service)
@@ -0,0 +1,158 @@
+"""
+AgriScan Backend - Image Blob Store
+Content-addressed storage for detection images, kept out of the database
+"""
+
+import hashlib
+import os
+import re
+import threading
+import uuid
+from pathlib import Path
+import sys
+
+import numpy as np
+import cv2
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from config import config
+from utils.image_utils import decode_base64, decode_image
+
+_HASH_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+# Leading bytes -> mimetype of accepted images
+_SIGNATURES = (
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+)
+
+
+def sniff_mimetype(header):
+    """Mimetype of an encoded image from its first bytes"""
+    for signature, mimetype in _SIGNATURES:
+        if header.startswith(signature):
+            return mimetype
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return 'image/webp'
+    return 'application/octet-stream'
+
+
+class BlobStore:
+    """
+    Stores each distinct image once, named by the SHA-256 of its bytes
+
+    Layout: <root>/<first 2 hex chars>/<hash> for the original bytes and
+    <hash>.thumb.jpg next to it for the thumbnail, which is generated when
+    the image is first written. Re-submitting the same image only returns
+    its hash. Files are written to a temporary name and renamed, so readers
+    never see a partial file.
+    """
+
+    def __init__(self, root=None, thumbnail_size=None):
+        self.root = Path(root or config.BLOB_STORE_DIR)
+        self.thumbnail_size = thumbnail_size or config.THUMBNAIL_SIZE
+        self.root.mkdir(parents=True, exist_ok=True)
+
+        # Metrics
+        self._lock = threading.Lock()
+        self.writes = 0
+        self.deduplicated = 0
+
+    @staticmethod
+    def is_valid_hash(image_hash):
+        return bool(image_hash) and bool(_HASH_PATTERN.match(image_hash))
+
+    def path(self, image_hash):
+        """Path of the original image (hash must be valid)"""
+        if not self.is_valid_hash(image_hash):
+            raise ValueError(f"Invalid image hash: {image_hash!r}")
+        return self.root / image_hash[:2] / image_hash
+
+    def thumbnail_path(self, image_hash):
+        return self.path(image_hash).with_name(f"{image_hash}.thumb.jpg")
+
+    def exists(self, image_hash):
+        return self.is_valid_hash(image_hash) and self.path(image_hash).exists()
+
+    def _write(self, path, data):
+        """Atomically write bytes to path"""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def make_thumbnail(self, buffer):
+        """
+        JPEG thumbnail whose longer side is at most thumbnail_size
+        Returns:
+            bytes, or None when the image cannot be decoded
+        """
+        try:
+            image, _ = decode_image(buffer, target_size=self.thumbnail_size)
+        except ValueError:
+            return None
+
+        height, width = image.shape[:2]
+        scale = self.thumbnail_size / max(width, height)
+        if scale < 1:
+            image = cv2.resize(image, (max(1, round(width * scale)), max(1, round(height * scale))),
+                               interpolation=cv2.INTER_AREA)
+        ok, encoded = cv2.imencode('.jpg', np.ascontiguousarray(image), [cv2.IMWRITE_JPEG_QUALITY, 80])
+        return encoded.tobytes() if ok else None
+
+    def put(self, image_data):
+        """
+        Store an image (decoded from base64 once) unless it is already stored
+        Args:
+            image_data: base64 string (data URL allowed) or encoded image bytes
+        Returns:
+            str: SHA-256 hex digest identifying the image
+        """
+        buffer = decode_base64(image_data) if isinstance(image_data, str) else bytes(image_data)
+        image_hash = hashlib.sha256(buffer).hexdigest()
+        path = self.path(image_hash)
+
+        if path.exists():
+            with self._lock:
+                self.deduplicated += 1
+            return image_hash
+
+        self._write(path, buffer)
+        thumbnail = self.make_thumbnail(buffer)
+        if thumbnail:
+            self._write(self.thumbnail_path(image_hash), thumbnail)
+
+        with self._lock:
+            self.writes += 1
+        return image_hash
+
+    def open_info(self, image_hash, thumbnail=False):
+        """
+        Locate a stored image for serving
+        Returns:
+            tuple: (path, mimetype), or (None, None) when not stored
+        """
+        if not self.is_valid_hash(image_hash):
+            return None, None
+        path = self.thumbnail_path(image_hash) if thumbnail else self.path(image_hash)
+        if not path.exists():
+            return None, None
+        if thumbnail:
+            return path, 'image/jpeg'
+        with open(path, 'rb') as f:
+            return path, sniff_mimetype(f.read(12))
+
+    def get_stats(self):
+        """Get write and deduplication counters"""
+        with self._lock:
+            return {
+                'root': str(self.root),
+                'writes': self.writes,
+                'deduplicated': self.deduplicated
+            }
+
+
+# Singleton instance
+blob_store = BlobStore()
@@ -0,0 +1,113 @@
+"""
+AgriScan Backend - Database Schema Migrations
+Versioned schema changes applied in order, tracked with PRAGMA user_version
+"""
+
+
+def _column_names(conn, table):
+    return {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}
+
+
+def create_diagnosis_cache(conn):
+    """Diagnosis cache: one entry per disease, language and content version"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS diagnosis_cache (
+            disease TEXT NOT NULL,
+            language TEXT NOT NULL,
+            version INTEGER NOT NULL,
+            source TEXT,
+            content TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            expires_at REAL,
+            last_hit_at REAL,
+            hits INTEGER DEFAULT 0,
+            PRIMARY KEY (disease, language, version)
+        )
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_diagnosis_cache_expires
+        ON diagnosis_cache(expires_at)
+    ''')
+
+
+def add_image_hash(conn):
+    """Detections reference their image in the blob store"""
+    if 'image_hash' not in _column_names(conn, 'detections'):
+        conn.execute('ALTER TABLE detections ADD COLUMN image_hash TEXT')
+
+
+def add_history_index(conn):
+    """Per-user history in newest-first order (id breaks timestamp ties)"""
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_detections_user_time
+        ON detections(user_id, timestamp DESC, id DESC)
+    ''')
+    conn.execute('ANALYZE detections')
+
+
+def create_detection_boxes(conn):
+    """Detector results stored as typed rows instead of a JSON blob"""
+    # Rows written before this migration keep their JSON detections column;
+    # new rows whose detections are in the detector's format leave it NULL
+    # and store one row per detection here instead.
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS detection_boxes (
+            detection_id TEXT NOT NULL,
+            position INTEGER NOT NULL,
+            class_id INTEGER NOT NULL,
+            class_name TEXT NOT NULL,
+            confidence REAL NOT NULL,
+            x REAL NOT NULL,
+            y REAL NOT NULL,
+            width REAL NOT NULL,
+            height REAL NOT NULL,
+            x1 REAL NOT NULL,
+            y1 REAL NOT NULL,
+            x2 REAL NOT NULL,
+            y2 REAL NOT NULL,
+            PRIMARY KEY (detection_id, position)
+        ) WITHOUT ROWID
+    ''')
+
+
+# (version, migration) - append only; never edit or reorder a released step.
+# Steps are idempotent because databases created before versioning may
+# already contain some of these changes.
+MIGRATIONS = [
+    (1, create_diagnosis_cache),
+    (2, add_image_hash),
+    (3, add_history_index),
+    (4, create_detection_boxes),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def apply_migrations(conn):
+    """
+    Bring a database up to SCHEMA_VERSION
+    Each step runs in its own transaction together with the version bump,
+    under an immediate (write) lock, so concurrent workers starting at the
+    same time apply every step exactly once.
+    Args:
+        conn: sqlite3 connection with no open transaction
+    Returns:
+        int: Schema version after migrating
+    """
+    for version, migrate in MIGRATIONS:
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            current = conn.execute('PRAGMA user_version').fetchone()[0]
+            if version <= current:
+                conn.execute('ROLLBACK')
+                continue
+
+            migrate(conn)
+            conn.execute(f'PRAGMA user_version = {version}')
+            conn.execute('COMMIT')
+            print(f"🗃️  Applied database migration {version}: {migrate.__doc__}")
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+    return conn.execute('PRAGMA user_version').fetchone()[0]
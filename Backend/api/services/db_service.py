@@ -3,31 +3,111 @@
 Handles SQLite database operations for offline support
 """
 
-import sqlite3
+import base64
 import json
+import time
 import uuid
-from datetime import datetime
+from datetime import datetime, timezone
 from pathlib import Path
 import sys
 
 sys.path.append(str(Path(__file__).parent.parent))
 
 from config import config
+from services.blob_store import blob_store
+from services.db_migrations import apply_migrations
+from utils.sqlite_pool import SQLitePool
+
+
+def current_timestamp():
+    """Now, in the format of SQLite's CURRENT_TIMESTAMP (UTC, seconds)"""
+    return datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def encode_cursor(timestamp, detection_id):
+    """Opaque history cursor for the position after a record"""
+    return base64.urlsafe_b64encode(json.dumps([timestamp, detection_id]).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """(timestamp, id) from encode_cursor(); ValueError when malformed"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        timestamp, detection_id = json.loads(base64.urlsafe_b64decode(padded))
+        return timestamp, detection_id
+    except (TypeError, ValueError) as e:  # binascii.Error is a ValueError
+        raise ValueError(f"Invalid history cursor: {e}")
+
+
+# Columns a history record can be projected to (see read_history)
+HISTORY_FIELDS = (
+    'id', 'user_id', 'image_path', 'image_hash', 'detections', 'diagnosis',
+    'timestamp', 'location', 'notes'
+)
+
+_DETECTION_KEYS = {'class_id', 'class_name', 'confidence', 'bounding_box'}
+_BOX_KEYS = ('x', 'y', 'width', 'height', 'x1', 'y1', 'x2', 'y2')
+
+
+def pack_detections(detections):
+    """
+    detection_boxes rows for detections in the detector's format
+    Only exact matches are packed (int class_id, str class_name, float
+    confidence and box values, no extra keys), so unpacking returns the
+    same objects; anything else stays JSON.
+    Returns:
+        list: (position, class_id, class_name, confidence, x, y, width,
+            height, x1, y1, x2, y2) tuples, or None when not packable
+    """
+    if not isinstance(detections, list):
+        return None
+    
+    rows = []
+    for position, det in enumerate(detections):
+        if not isinstance(det, dict) or det.keys() != _DETECTION_KEYS:
+            return None
+        box = det['bounding_box']
+        if not isinstance(box, dict) or box.keys() != set(_BOX_KEYS):
+            return None
+        values = [det['confidence']] + [box[key] for key in _BOX_KEYS]
+        if (type(det['class_id']) is not int or not isinstance(det['class_name'], str)
+                or any(type(value) is not float for value in values)):
+            return None
+        rows.append((position, det['class_id'], det['class_name'], *values))
+    return rows
+
+
+def unpack_detection(row):
+    """Detection object from a detection_boxes row (class_id, class_name, confidence, box...)"""
+    return {
+        'class_id': row[0],
+        'class_name': row[1],
+        'confidence': row[2],
+        'bounding_box': dict(zip(_BOX_KEYS, row[3:]))
+    }
 
 
 class DatabaseService:
     """Service for database operations"""
     
     def __init__(self):
-        """Initialize database connection"""
+        """Initialize database connection pool"""
         self.db_path = config.DATABASE_PATH
+        self.pool = SQLitePool(
+            self.db_path,
+            size=config.DB_POOL_SIZE,
+            timeout=config.DB_POOL_TIMEOUT,
+            busy_timeout_ms=config.DB_BUSY_TIMEOUT_MS
+        )
         self.init_database()
     
     def get_connection(self):
-        """Get database connection"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row  # Return rows as dictionaries
-        return conn
+        """Get a pooled database connection (close() returns it to the pool)"""
+        return self.pool.connection()
+    
+    def get_stats(self):
+        """Get connection pool metrics"""
+        return self.pool.get_stats()
     
     def init_database(self):
         """Initialize database schema"""
@@ -76,7 +156,10 @@ def init_database(self):
             ''')
             
             conn.commit()
-            print(f"✅ Database initialized at {self.db_path}")
+            
+            # Later schema changes (see services/db_migrations.py)
+            version = apply_migrations(conn)
+            print(f"✅ Database initialized at {self.db_path} (schema v{version})")
             
         except Exception as e:
             print(f"❌ Error initializing database: {e}")
@@ -85,85 +168,209 @@ def init_database(self):
             conn.close()
     
     def save_detection(self, user_id, detections, image_base64=None, image_path=None, 
-                      diagnosis=None, location=None, notes=None):
+                      diagnosis=None, location=None, notes=None, detection_id=None, timestamp=None):
         """
         Save detection to history
         Args:
             user_id: User ID
             detections: List of detection objects
-            image_base64: Base64 encoded image (for offline access)
+            image_base64: Image (base64 string or encoded bytes) for offline access;
+                stored in the blob store, the row keeps only its hash
             image_path: Path to saved image
             diagnosis: Diagnosis information
             location: GPS coordinates
             notes: User notes
+            detection_id: ID to store the detection under (default: new UUID)
+            timestamp: When the detection was made (default: now)
         Returns:
             str: Detection ID
         """
+        return self.save_detections([{
+            'timestamp': timestamp,
+            'detection_id': detection_id,
+            'user_id': user_id,
+            'detections': detections,
+            'image_base64': image_base64,
+            'image_path': image_path,
+            'diagnosis': diagnosis,
+            'location': location,
+            'notes': notes
+        }])[0]
+    
+    def save_detections(self, records, durable=False):
+        """
+        Save several detections in one transaction (executemany)
+        Args:
+            records: Dicts with save_detection's arguments as keys (a timestamp
+                taken when the request arrived keeps history in request order
+                however late the record is written)
+            durable: Commit with synchronous=FULL, so the records are fsynced
+                to disk when this returns (default NORMAL: durable at the next
+                WAL checkpoint, safe against application crashes)
+        Returns:
+            list: Detection IDs, in the order of records
+        """
+        # Write the images before taking a connection (deduplicated by content hash)
+        rows = []
+        boxes = []
+        for record in records:
+            detection_id = record.get('detection_id') or str(uuid.uuid4())
+            image = record.get('image_base64')
+            packed = pack_detections(record['detections'])
+            diagnosis = record.get('diagnosis')
+            rows.append((
+                detection_id,
+                record.get('timestamp') or current_timestamp(),
+                record['user_id'],
+                record.get('image_path'),
+                blob_store.put(image) if image else None,
+                json.dumps(record['detections']) if packed is None else None,
+                json.dumps(diagnosis) if diagnosis else None,
+                record.get('location'),
+                record.get('notes')
+            ))
+            boxes.extend((detection_id, *row) for row in packed or ())
+        
         conn = self.get_connection()
         cursor = conn.cursor()
         
         try:
-            detection_id = str(uuid.uuid4())
+            if durable:
+                conn.execute('PRAGMA synchronous=FULL')
             
-            cursor.execute('''
+            cursor.executemany('''
                 INSERT INTO detections 
-                (id, user_id, image_path, image_base64, detections, diagnosis, location, notes)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                detection_id,
-                user_id,
-                image_path,
-                image_base64,
-                json.dumps(detections),
-                json.dumps(diagnosis) if diagnosis else None,
-                location,
-                notes
-            ))
+                (id, timestamp, user_id, image_path, image_hash, detections, diagnosis, location, notes)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', rows)
+            if boxes:
+                cursor.executemany('''
+                    INSERT INTO detection_boxes
+                    (detection_id, position, class_id, class_name, confidence,
+                     x, y, width, height, x1, y1, x2, y2)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', boxes)
             
             conn.commit()
-            return detection_id
+            return [row[0] for row in rows]
             
         except Exception as e:
             conn.rollback()
             raise Exception(f"Error saving detection: {e}")
         finally:
+            if durable:
+                conn.execute('PRAGMA synchronous=NORMAL')
             conn.close()
     
+    def read_history(self, conn, where, params, order='', fields=None):
+        """
+        Select detections and decode them into typed records
+        Args:
+            conn: Open connection
+            where: SQL condition on detections
+            params: Parameters of the condition and order clause
+            order: ORDER BY / LIMIT clause
+            fields: Subset of HISTORY_FIELDS to return (None for all)
+        Returns:
+            list: Records; id and timestamp are always included so callers can
+                build cursors, the rest only when requested
+        Raises:
+            ValueError: Unknown field
+        """
+        fields = HISTORY_FIELDS if fields is None else tuple(fields)
+        unknown = set(fields) - set(HISTORY_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown history fields: {', '.join(sorted(unknown))}")
+        
+        columns = ['id', 'timestamp'] + [f for f in HISTORY_FIELDS if f in fields and f not in ('id', 'timestamp')]
+        rows = conn.execute(
+            f"SELECT {', '.join(columns)} FROM detections WHERE {where} {order}", params
+        ).fetchall()
+        records = [dict(row) for row in rows]
+        
+        if 'diagnosis' in fields:
+            for record in records:
+                if record['diagnosis']:
+                    record['diagnosis'] = json.loads(record['diagnosis'])
+        
+        if 'detections' in fields:
+            # Rows without JSON detections keep them in detection_boxes
+            packed = {record['id']: record for record in records if record['detections'] is None}
+            for record in records:
+                record['detections'] = json.loads(record['detections']) if record['detections'] else []
+            
+            if packed:
+                placeholders = ', '.join('?' * len(packed))
+                boxes = conn.execute(f'''
+                    SELECT detection_id, class_id, class_name, confidence,
+                           x, y, width, height, x1, y1, x2, y2
+                    FROM detection_boxes
+                    WHERE detection_id IN ({placeholders})
+                    ORDER BY detection_id, position
+                ''', list(packed)).fetchall()
+                for row in boxes:
+                    packed[row[0]]['detections'].append(unpack_detection(tuple(row)[1:]))
+        
+        return records
+    
     def get_detection(self, detection_id):
         """Get detection by ID"""
         conn = self.get_connection()
-        cursor = conn.cursor()
         
         try:
-            cursor.execute('''
-                SELECT * FROM detections WHERE id = ?
-            ''', (detection_id,))
+            records = self.read_history(conn, 'id = ?', (detection_id,))
+            return records[0] if records else None
             
-            row = cursor.fetchone()
-            if row:
-                return dict(row)
-            return None
+        finally:
+            conn.close()
+    
+    def get_user_history(self, user_id, limit=50, offset=0, fields=None):
+        """Get user's detection history (offset pagination; prefer get_user_history_page)"""
+        conn = self.get_connection()
+        
+        try:
+            return self.read_history(
+                conn, 'user_id = ?', (user_id, limit, offset),
+                order='ORDER BY timestamp DESC, id DESC LIMIT ? OFFSET ?',
+                fields=fields
+            )
             
         finally:
             conn.close()
     
-    def get_user_history(self, user_id, limit=50, offset=0):
-        """Get user's detection history"""
+    def get_user_history_page(self, user_id, limit=50, cursor=None, fields=None):
+        """
+        Get one page of a user's history, newest first (keyset pagination)
+        Each page is a single index range scan, so deep pages cost the same
+        as the first one.
+        Args:
+            user_id: User ID
+            limit: Records per page
+            cursor: next_cursor of the previous page (None for the first page)
+            fields: Subset of HISTORY_FIELDS to return (None for all)
+        Returns:
+            tuple: (records, next_cursor or None on the last page)
+        Raises:
+            ValueError: Malformed cursor or unknown field
+        """
         conn = self.get_connection()
-        cursor = conn.cursor()
         
         try:
-            cursor.execute('''
-                SELECT id, user_id, image_path, detections, diagnosis, 
-                       timestamp, location, notes
-                FROM detections 
-                WHERE user_id = ?
-                ORDER BY timestamp DESC
-                LIMIT ? OFFSET ?
-            ''', (user_id, limit, offset))
+            order = 'ORDER BY timestamp DESC, id DESC LIMIT ?'
+            if cursor:
+                timestamp, last_id = decode_cursor(cursor)
+                records = self.read_history(
+                    conn, 'user_id = ? AND (timestamp, id) < (?, ?)',
+                    (user_id, timestamp, last_id, limit + 1), order=order, fields=fields
+                )
+            else:
+                records = self.read_history(conn, 'user_id = ?', (user_id, limit + 1), order=order, fields=fields)
             
-            rows = cursor.fetchall()
-            return [dict(row) for row in rows]
+            next_cursor = None
+            if len(records) > limit:
+                records = records[:limit]
+                next_cursor = encode_cursor(records[-1]['timestamp'], records[-1]['id'])
+            return records, next_cursor
             
         finally:
             conn.close()
@@ -177,9 +384,13 @@ def delete_detection(self, detection_id):
             cursor.execute('''
                 DELETE FROM detections WHERE id = ?
             ''', (detection_id,))
+            deleted = cursor.rowcount > 0
+            cursor.execute('''
+                DELETE FROM detection_boxes WHERE detection_id = ?
+            ''', (detection_id,))
             
             conn.commit()
-            return cursor.rowcount > 0
+            return deleted
             
         except Exception as e:
             conn.rollback()
@@ -187,6 +398,80 @@ def delete_detection(self, detection_id):
         finally:
             conn.close()
     
+    def migrate_images_to_blobs(self, batch_size=100):
+        """
+        Move images still stored inline (image_base64) into the blob store
+        Rows are processed in id order, batch_size per transaction, so the
+        migration can be interrupted and resumed.
+        Returns:
+            dict: migrated, failed and bytes_moved counts
+        """
+        stats = {'migrated': 0, 'failed': 0, 'bytes_moved': 0}
+        last_id = ''
+        
+        while True:
+            conn = self.get_connection()
+            try:
+                rows = conn.execute('''
+                    SELECT id, image_base64 FROM detections
+                    WHERE image_base64 IS NOT NULL AND image_base64 != '' AND id > ?
+                    ORDER BY id LIMIT ?
+                ''', (last_id, batch_size)).fetchall()
+                if not rows:
+                    return stats
+                
+                updates = []
+                for row in rows:
+                    last_id = row['id']
+                    try:
+                        updates.append((blob_store.put(row['image_base64']), row['id']))
+                        stats['bytes_moved'] += len(row['image_base64'])
+                    except ValueError as e:
+                        stats['failed'] += 1
+                        print(f"⚠️  Could not migrate image of detection {row['id']}: {e}")
+                
+                conn.executemany('''
+                    UPDATE detections SET image_hash = ?, image_base64 = NULL WHERE id = ?
+                ''', updates)
+                conn.commit()
+                stats['migrated'] += len(updates)
+                
+            except Exception as e:
+                conn.rollback()
+                raise Exception(f"Error migrating images: {e}")
+            finally:
+                conn.close()
+    
+    def update_detection_diagnosis(self, detection_id, diagnosis):
+        """Attach a diagnosis that finished after the detection was saved"""
+        return self.update_detection_diagnoses([(detection_id, diagnosis)]) > 0
+    
+    def update_detection_diagnoses(self, updates):
+        """
+        Attach several late diagnoses in one transaction
+        Args:
+            updates: (detection_id, diagnosis) pairs
+        Returns:
+            int: Number of detections updated
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        try:
+            cursor.executemany('''
+                UPDATE detections SET diagnosis = ? WHERE id = ?
+            ''', [(json.dumps(diagnosis) if diagnosis else None, detection_id)
+                  for detection_id, diagnosis in updates])
+            
+            conn.commit()
+            return cursor.rowcount
+            
+        except Exception as e:
+            conn.rollback()
+            raise Exception(f"Error updating diagnosis: {e}")
+        finally:
+            conn.close()
+    
     def cache_disease(self, name, scientific_name, description, symptoms, 
                      treatment, severity, prevention):
         """
@@ -256,8 +541,18 @@ def get_all_diseases(self):
         cursor = conn.cursor()
         
         try:
+            # Legacy per-name rows plus one row per disease in the diagnosis cache
+            # (English entry preferred; MIN() picks the row's other columns)
             cursor.execute('''
                 SELECT name, scientific_name, severity FROM diseases
+                WHERE name NOT IN (SELECT disease FROM diagnosis_cache)
+                UNION ALL
+                SELECT disease, json_extract(content, '$.scientific_name'),
+                       json_extract(content, '$.severity')
+                FROM (
+                    SELECT disease, content, MIN(language != 'en') FROM diagnosis_cache
+                    GROUP BY disease
+                )
                 ORDER BY name
             ''')
             
@@ -267,6 +562,151 @@ def get_all_diseases(self):
         finally:
             conn.close()
     
+    def cache_diagnosis(self, disease, language, diagnosis, source, ttl=None, version=None):
+        """
+        Store a diagnosis for one disease, language and content version
+        Args:
+            disease: Disease name (as detected)
+            language: Language code of the content
+            diagnosis: Diagnosis dict
+            source: Where the content came from (online_llm, knowledge_base)
+            ttl: Seconds until the entry expires (None = never)
+            version: Content version (default config.DIAGNOSIS_CACHE_VERSION)
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        try:
+            now = time.time()
+            cursor.execute('''
+                INSERT OR REPLACE INTO diagnosis_cache
+                (disease, language, version, source, content, created_at, expires_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (
+                disease,
+                language,
+                version or config.DIAGNOSIS_CACHE_VERSION,
+                source,
+                json.dumps(diagnosis),
+                now,
+                now + ttl if ttl else None
+            ))
+            
+            conn.commit()
+            
+        except Exception as e:
+            conn.rollback()
+            raise Exception(f"Error caching diagnosis: {e}")
+        finally:
+            conn.close()
+    
+    def get_cached_diagnosis(self, disease, language, version=None):
+        """
+        Get an unexpired cached diagnosis and record the hit
+        Returns:
+            dict: diagnosis, source, created_at, expires_at, hits - or None
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        try:
+            now = time.time()
+            key = (disease, language, version or config.DIAGNOSIS_CACHE_VERSION)
+            cursor.execute('''
+                SELECT content, source, created_at, expires_at, hits FROM diagnosis_cache
+                WHERE disease = ? AND language = ? AND version = ?
+            ''', key)
+            
+            row = cursor.fetchone()
+            if not row or (row['expires_at'] is not None and row['expires_at'] <= now):
+                return None
+            
+            cursor.execute('''
+                UPDATE diagnosis_cache SET hits = hits + 1, last_hit_at = ?
+                WHERE disease = ? AND language = ? AND version = ?
+            ''', (now,) + key)
+            conn.commit()
+            
+            return {
+                'diagnosis': json.loads(row['content']),
+                'source': row['source'],
+                'created_at': row['created_at'],
+                'expires_at': row['expires_at'],
+                'hits': row['hits'] + 1
+            }
+            
+        finally:
+            conn.close()
+    
+    def prewarm_diagnosis_cache(self, entries, source='knowledge_base', version=None, overwrite=False):
+        """
+        Bulk-load diagnoses into the cache
+        Args:
+            entries: Iterable of (disease, language, diagnosis dict)
+            source: Source recorded for every entry
+            overwrite: Replace existing entries (default keeps them, e.g. richer LLM content)
+        Returns:
+            int: Entries written
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        try:
+            now = time.time()
+            version = version or config.DIAGNOSIS_CACHE_VERSION
+            cursor.executemany(f'''
+                INSERT OR {'REPLACE' if overwrite else 'IGNORE'} INTO diagnosis_cache
+                (disease, language, version, source, content, created_at, expires_at)
+                VALUES (?, ?, ?, ?, ?, ?, NULL)
+            ''', [
+                (disease, language, version, source, json.dumps(diagnosis), now)
+                for disease, language, diagnosis in entries
+            ])
+            
+            conn.commit()
+            return cursor.rowcount
+            
+        except Exception as e:
+            conn.rollback()
+            raise Exception(f"Error prewarming diagnosis cache: {e}")
+        finally:
+            conn.close()
+    
+    def purge_expired_diagnoses(self):
+        """Delete expired cache entries and entries of other content versions"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute('''
+                DELETE FROM diagnosis_cache
+                WHERE expires_at <= ? OR version != ?
+            ''', (time.time(), config.DIAGNOSIS_CACHE_VERSION))
+            
+            conn.commit()
+            return cursor.rowcount
+            
+        finally:
+            conn.close()
+    
+    def get_diagnosis_cache_stats(self):
+        """Get entry and hit counts per language"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute('''
+                SELECT language, COUNT(*) AS entries, SUM(hits) AS hits
+                FROM diagnosis_cache WHERE version = ?
+                GROUP BY language ORDER BY language
+            ''', (config.DIAGNOSIS_CACHE_VERSION,))
+            
+            return {row['language']: {'entries': row['entries'], 'hits': row['hits'] or 0}
+                    for row in cursor.fetchall()}
+            
+        finally:
+            conn.close()
+    
     def create_or_get_user(self, user_id, name=None, language='en'):
         """Create or get user"""
         conn = self.get_connection()
@@ -0,0 +1,199 @@
+"""
+AgriScan Backend - Asynchronous Diagnosis Jobs
+Runs RAG diagnosis on a bounded worker pool so detection never waits on an LLM
+"""
+
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import sys
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from config import config
+from services.rag_service import rag_service
+
+
+class DiagnosisJob:
+    """One diagnosis computation, identified by its ticket"""
+
+    def __init__(self, disease_name, language):
+        self.ticket = str(uuid.uuid4())
+        self.disease_name = disease_name
+        self.language = language
+        self.status = 'pending'  # pending -> running -> done | failed
+        self.result = None  # rag_service.get_diagnosis() response
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self._done = threading.Event()
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        """Block until the job finishes; returns True when it did"""
+        return self._done.wait(timeout)
+
+    def add_done_callback(self, callback):
+        """Call callback(job) once finished (immediately if it already is)"""
+        with self._lock:
+            if not self.done:
+                self._callbacks.append(callback)
+                return
+        callback(self)
+
+    def finish(self, result=None, error=None):
+        """Record the outcome and run callbacks"""
+        with self._lock:
+            self.result = result
+            self.error = error
+            self.status = 'failed' if error or not (result and result.get('success')) else 'done'
+            self.finished_at = time.time()
+            self._done.set()
+            callbacks, self._callbacks = self._callbacks, []
+
+        for callback in callbacks:
+            try:
+                callback(self)
+            except Exception as e:
+                print(f"⚠️  Diagnosis callback failed: {e}")
+
+    def to_dict(self):
+        """Ticket status for API responses"""
+        response = {
+            'ticket': self.ticket,
+            'status': self.status,
+            'disease_name': self.disease_name,
+            'language': self.language
+        }
+        if self.done:
+            response['diagnosis'] = self.result['disease'] if self.result and self.result.get('success') else None
+            response['source'] = self.result.get('source') if self.result else None
+            response['error'] = self.error or (self.result.get('error') if self.result else None)
+            response['elapsed'] = round(self.finished_at - self.created_at, 3)
+        return response
+
+
+class DiagnosisJobQueue:
+    """
+    Bounded background pool for diagnosis jobs
+
+    Requests for a disease/language pair that is already being diagnosed
+    attach to the in-flight job instead of starting another one, and pairs
+    diagnosed successfully within the last ticket_ttl seconds reuse that
+    finished job. At most max_pending jobs may be queued or running; beyond
+    that submit() returns None and callers respond without a diagnosis.
+    Finished jobs stay retrievable by ticket for ticket_ttl seconds.
+    """
+
+    def __init__(self, max_workers=None, max_pending=None, ticket_ttl=None):
+        self.max_pending = max_pending or config.DIAGNOSIS_MAX_PENDING
+        self.ticket_ttl = ticket_ttl or config.DIAGNOSIS_TICKET_TTL
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers or config.DIAGNOSIS_WORKERS,
+            thread_name_prefix='diagnosis'
+        )
+
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()  # ticket -> job, oldest first
+        self._in_flight = {}  # (disease_name, language) -> job
+        self._recent = {}  # (disease_name, language) -> last successful job
+
+        # Metrics
+        self.submitted = 0
+        self.coalesced = 0
+        self.reused = 0
+        self.rejected = 0
+
+    def submit(self, disease_name, language='en'):
+        """
+        Get a job for a diagnosis, starting one unless an identical job is in flight
+        Returns:
+            DiagnosisJob, or None when the queue is full
+        """
+        key = (disease_name, language)
+        with self._lock:
+            self._prune()
+
+            job = self._in_flight.get(key)
+            if job is not None:
+                self.coalesced += 1
+                return job
+
+            job = self._recent.get(key)
+            if job is not None and job.finished_at > time.time() - self.ticket_ttl:
+                self.reused += 1
+                return job
+
+            if len(self._in_flight) >= self.max_pending:
+                self.rejected += 1
+                return None
+
+            job = DiagnosisJob(disease_name, language)
+            self._jobs[job.ticket] = job
+            self._in_flight[key] = job
+            self.submitted += 1
+
+        self._executor.submit(self._run, job)
+        return job
+
+    def _run(self, job):
+        """Worker: compute one diagnosis"""
+        job.status = 'running'
+        try:
+            result = rag_service.get_diagnosis(
+                disease_name=job.disease_name,
+                language=job.language,
+                use_cache=True
+            )
+            job.finish(result)
+        except Exception as e:
+            job.finish(error=str(e))
+        finally:
+            # Late arrivals until this point attached to the job and see its result
+            with self._lock:
+                key = (job.disease_name, job.language)
+                self._in_flight.pop(key, None)
+                if job.status == 'done':
+                    self._recent[key] = job
+
+    def _prune(self):
+        """Forget finished jobs older than ticket_ttl (caller holds the lock)"""
+        cutoff = time.time() - self.ticket_ttl
+        while self._jobs:
+            job = next(iter(self._jobs.values()))
+            if not job.done or job.finished_at > cutoff:
+                break
+            self._jobs.popitem(last=False)
+            key = (job.disease_name, job.language)
+            if self._recent.get(key) is job:
+                del self._recent[key]
+
+    def get(self, ticket):
+        """Job for a ticket (None if unknown or expired)"""
+        with self._lock:
+            return self._jobs.get(ticket)
+
+    def get_stats(self):
+        """Get queue depth and coalescing counters"""
+        with self._lock:
+            return {
+                'in_flight': len(self._in_flight),
+                'tracked_tickets': len(self._jobs),
+                'max_pending': self.max_pending,
+                'submitted': self.submitted,
+                'coalesced': self.coalesced,
+                'reused': self.reused,
+                'rejected': self.rejected
+            }
+
+
+# Singleton instance
+diagnosis_jobs = DiagnosisJobQueue()
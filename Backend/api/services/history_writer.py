@@ -0,0 +1,325 @@
+"""
+AgriScan Backend - History Write-Behind Queue
+Saves detection history on a background thread in batched transactions,
+so detection responses do not wait for disk commits
+"""
+
+import atexit
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError
+from pathlib import Path
+import sys
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from config import config
+from services.db_service import db_service, current_timestamp
+
+
+class _HistoryWrite:
+    """A queued write: a detection record, a late diagnosis, or a flush/stop marker"""
+
+    __slots__ = ('kind', 'payload', 'future', 'enqueued_at')
+
+    def __init__(self, kind, payload=None):
+        self.kind = kind  # save | diagnosis | flush | stop
+        self.payload = payload
+        self.future = Future()
+        self.enqueued_at = time.time()
+
+
+class HistoryWriter:
+    """
+    Write-behind buffer in front of DatabaseService.save_detections
+
+    Callers enqueue records and return immediately; a single worker thread
+    drains up to batch_size writes (or waits at most flush_interval_ms after
+    the oldest one arrived) and commits them with executemany in one
+    transaction. Records are timestamped when they are queued, so history
+    order (and its keyset cursors) follows request order however long a
+    record waits.
+
+    The queue is bounded and never blocks for long: when it is full, save()
+    waits up to enqueue_timeout and then writes the record itself, which
+    slows callers down to the speed of the disk instead of dropping history.
+    A late diagnosis is merged into its record while that is still queued,
+    applied right after the commit while the record is being written, and
+    otherwise queued like a save - or, with the queue full, written
+    directly (the row already exists by then). In durable
+    mode save() waits until the batch holding its record has been committed
+    with an fsync (group commit: concurrent requests share one fsync).
+    Pending writes are flushed at interpreter exit.
+    """
+
+    def __init__(self, database=None, max_queue=None, batch_size=None, flush_interval_ms=None,
+                 enqueue_timeout=None, durable=None):
+        """
+        Initialize writer (the worker thread starts on first write)
+        Args:
+            database: DatabaseService to write to (default: the shared one)
+        """
+        self.database = database or db_service
+        self.batch_size = max(1, batch_size or config.HISTORY_BATCH_SIZE)
+        self.flush_interval = (flush_interval_ms if flush_interval_ms is not None
+                               else config.HISTORY_FLUSH_INTERVAL_MS) / 1000.0
+        self.enqueue_timeout = enqueue_timeout if enqueue_timeout is not None else config.HISTORY_ENQUEUE_TIMEOUT
+        self.durable = config.HISTORY_DURABLE if durable is None else durable
+
+        self._queue = queue.Queue(maxsize=max_queue or config.HISTORY_QUEUE_SIZE)
+        self._worker = None
+        self._worker_lock = threading.Lock()
+        self._closed = False
+
+        # Records not yet committed, so a late diagnosis can find them
+        self._pending_lock = threading.Lock()
+        self._pending = {}  # detection_id -> queued record
+        self._in_flight = set()  # detection_ids in the batch being committed
+        self._after_commit = {}  # detection_id -> diagnosis for an in-flight record
+
+        # Metrics
+        self._stats_lock = threading.Lock()
+        self.enqueued = 0
+        self.written = 0
+        self.diagnoses_written = 0
+        self.batches = 0
+        self.failed = 0
+        self.inline_writes = 0  # Queue was full (backpressure) or writer closed
+        self.inline_diagnoses = 0  # Late diagnoses written directly for the same reasons
+        self.total_commit_time = 0.0
+        self.max_lag = 0.0  # Longest time a record waited to be committed
+
+    def _ensure_worker(self):
+        """Start the worker thread lazily (after gunicorn has forked)"""
+        if self._worker is not None and self._worker.is_alive():
+            return
+
+        with self._worker_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(
+                    target=self._run,
+                    name='history-writer',
+                    daemon=True
+                )
+                self._worker.start()
+
+    def save(self, detection_id, user_id, detections, **fields):
+        """
+        Queue a detection for saving
+        Args:
+            detection_id: ID to store it under (returned to the client up front)
+            user_id, detections, **fields: DatabaseService.save_detection arguments
+        Returns:
+            str: Detection ID
+        Raises:
+            Exception: Saving failed (only when the write happens before returning:
+                durable mode, or inline under backpressure)
+        """
+        record = dict(fields, detection_id=detection_id, user_id=user_id, detections=detections)
+        record['timestamp'] = record.get('timestamp') or current_timestamp()
+
+        if not self._closed:
+            self._ensure_worker()
+            write = _HistoryWrite('save', record)
+            with self._pending_lock:
+                self._pending[detection_id] = record
+            try:
+                self._queue.put(write, timeout=self.enqueue_timeout)
+            except queue.Full:
+                with self._pending_lock:
+                    self._pending.pop(detection_id, None)
+            else:
+                with self._stats_lock:
+                    self.enqueued += 1
+                if self.durable:
+                    write.future.result()
+                return detection_id
+
+        # Backpressure (or shutting down): write on the caller's thread
+        with self._stats_lock:
+            self.inline_writes += 1
+        return self.database.save_detections([record], durable=self.durable)[0]
+
+    def update_diagnosis(self, detection_id, diagnosis):
+        """
+        Save a diagnosis that finished after its detection was queued
+        Never waits more than enqueue_timeout for queue space.
+        """
+        with self._pending_lock:
+            record = self._pending.get(detection_id)
+            if record is not None:
+                # Still queued: goes out with the record itself
+                record['diagnosis'] = diagnosis
+                return
+            if detection_id in self._in_flight:
+                # Being committed right now: applied once the batch is
+                self._after_commit[detection_id] = diagnosis
+                return
+
+        # The row is committed, so the update may go through the queue or straight to disk
+        if not self._closed:
+            self._ensure_worker()
+            try:
+                self._queue.put(_HistoryWrite('diagnosis', (detection_id, diagnosis)),
+                                timeout=self.enqueue_timeout)
+                return
+            except queue.Full:
+                pass
+
+        with self._stats_lock:
+            self.inline_diagnoses += 1
+        self.database.update_detection_diagnosis(detection_id, diagnosis)
+
+    def flush(self, timeout=None):
+        """Block until everything queued so far is committed; returns True when it was"""
+        if self._closed:
+            return True
+        self._ensure_worker()
+        marker = _HistoryWrite('flush')
+        self._queue.put(marker)
+        try:
+            marker.future.result(timeout)
+            return True
+        except TimeoutError:
+            return False
+
+    def close(self, timeout=None):
+        """Flush pending writes and stop the worker (later writes are saved inline)"""
+        if self._closed:
+            return
+        self._closed = True
+        if self._worker is None or not self._worker.is_alive():
+            return
+
+        timeout = config.HISTORY_SHUTDOWN_TIMEOUT if timeout is None else timeout
+        pending = self._queue.qsize()
+        self._queue.put(_HistoryWrite('stop'))
+        self._worker.join(timeout)
+        if self._worker.is_alive():
+            print(f"⚠️  History writer did not finish within {timeout}s; up to {self._queue.qsize()} records lost")
+        elif pending:
+            print(f"✅ History writer flushed {pending} pending writes")
+
+    def _collect_batch(self):
+        """Block for the first write, then gather more until the batch is full or the wait expires"""
+        first = self._queue.get()
+        batch = [first]
+        deadline = first.enqueued_at + self.flush_interval
+
+        while len(batch) < self.batch_size and batch[-1].kind not in ('flush', 'stop'):
+            remaining = deadline - time.time()
+            try:
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    # Wait expired - still take anything that is already queued
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+
+        return batch
+
+    def _run(self):
+        """Worker loop"""
+        while True:
+            batch = self._collect_batch()
+            self._process(batch)
+            if batch[-1].kind == 'stop':
+                # Anything enqueued while stopping
+                leftovers = []
+                while True:
+                    try:
+                        leftovers.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                if leftovers:
+                    self._process(leftovers)
+                return
+
+    def _process(self, batch):
+        """Commit one batch and resolve its futures"""
+        saves = [write for write in batch if write.kind == 'save']
+        diagnoses = [write for write in batch if write.kind == 'diagnosis']
+        started_at = time.time()
+
+        # Claim the records: late diagnoses now wait for the commit instead of patching them
+        save_ids = [write.payload['detection_id'] for write in saves]
+        with self._pending_lock:
+            for detection_id in save_ids:
+                self._pending.pop(detection_id, None)
+            self._in_flight.update(save_ids)
+
+        if saves:
+            try:
+                self.database.save_detections([write.payload for write in saves], durable=self.durable)
+                for write in saves:
+                    write.future.set_result(write.payload['detection_id'])
+            except Exception as e:
+                # Retry one by one so a single bad record does not lose the batch
+                print(f"⚠️  History batch of {len(saves)} failed ({e}); retrying records individually")
+                for write in saves:
+                    try:
+                        self.database.save_detections([write.payload], durable=self.durable)
+                        write.future.set_result(write.payload['detection_id'])
+                    except Exception as record_error:
+                        print(f"❌ Could not save detection {write.payload['detection_id']}: {record_error}")
+                        write.future.set_exception(record_error)
+
+        # Diagnoses that arrived while the records were being written
+        with self._pending_lock:
+            self._in_flight.difference_update(save_ids)
+            late = [(detection_id, self._after_commit.pop(detection_id))
+                    for detection_id in save_ids if detection_id in self._after_commit]
+
+        updates = [write.payload for write in diagnoses] + late
+        if updates:
+            try:
+                self.database.update_detection_diagnoses(updates)
+            except Exception as e:
+                print(f"❌ Could not save {len(updates)} late diagnoses: {e}")
+            for write in diagnoses:
+                write.future.set_result(write.payload[0])
+
+        finished_at = time.time()
+        with self._stats_lock:
+            if saves or diagnoses:
+                self.batches += 1
+                self.total_commit_time += finished_at - started_at
+            self.written += sum(1 for write in saves if write.future.exception() is None)
+            self.failed += sum(1 for write in saves if write.future.exception() is not None)
+            self.diagnoses_written += len(updates)
+            if saves or diagnoses:
+                self.max_lag = max(self.max_lag, finished_at - min(write.enqueued_at for write in saves + diagnoses))
+
+        for write in batch:
+            if write.kind in ('flush', 'stop'):
+                write.future.set_result(None)
+
+    def get_stats(self):
+        """Get queue depth, batch and lag metrics"""
+        with self._stats_lock:
+            avg_batch = self.written / self.batches if self.batches else 0
+            avg_commit = self.total_commit_time / self.batches if self.batches else 0
+
+            return {
+                'enabled': config.HISTORY_WRITE_BEHIND,
+                'durable': self.durable,
+                'queue_depth': self._queue.qsize(),
+                'max_queue': self._queue.maxsize,
+                'enqueued': self.enqueued,
+                'written': self.written,
+                'diagnoses_written': self.diagnoses_written,
+                'failed': self.failed,
+                'inline_writes': self.inline_writes,
+                'inline_diagnoses': self.inline_diagnoses,
+                'batches': self.batches,
+                'avg_batch_size': round(avg_batch, 2),
+                'avg_commit_ms': round(avg_commit * 1000, 2),
+                'max_lag_ms': round(self.max_lag * 1000, 2)
+            }
+
+
+# Singleton instance
+history_writer = HistoryWriter()
+atexit.register(history_writer.close)
@@ -0,0 +1,210 @@
+"""
+AgriScan Backend - LLM Model Resolution
+Picks a working Gemini model once, reuses it, and demotes models that keep failing
+"""
+
+import threading
+import time
+from pathlib import Path
+import sys
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from config import config
+from utils.single_flight import SingleFlight
+
+PROBE_PROMPT = 'Return token OK'
+
+
+class GeminiClient:
+    """Thin wrapper over google.generativeai (imported and configured on first use)"""
+
+    def __init__(self, api_key, timeout=None):
+        self.api_key = api_key
+        self.timeout = timeout or config.LLM_TIMEOUT  # Per request, so a hung call frees its worker
+        self._genai = None
+        self._models = {}  # model name -> GenerativeModel
+        self._lock = threading.Lock()
+
+    def generate(self, model_name, prompt):
+        """
+        Send one prompt to a model
+        Returns:
+            str: Response text
+        """
+        with self._lock:
+            if self._genai is None:
+                import google.generativeai as genai
+                genai.configure(api_key=self.api_key)
+                self._genai = genai
+            model = self._models.get(model_name)
+            if model is None:
+                model = self._models[model_name] = self._genai.GenerativeModel(model_name)
+        return model.generate_content(prompt, request_options={'timeout': self.timeout}).text
+
+
+class StubLLMClient:
+    """
+    Offline stand-in for GeminiClient
+
+    Answers probes with 'OK' and prompts with a fixed response. Models listed
+    in unavailable fail every call. Every call is recorded in calls.
+    """
+
+    def __init__(self, response='{}', unavailable=()):
+        self.response = response
+        self.unavailable = set(unavailable)
+        self.calls = []  # (model name, prompt)
+
+    def generate(self, model_name, prompt):
+        self.calls.append((model_name, prompt))
+        if model_name in self.unavailable:
+            raise RuntimeError(f"{model_name} unavailable")
+        return 'OK' if prompt == PROBE_PROMPT else self.response
+
+
+class ModelResolver:
+    """
+    Chooses which candidate model to send prompts to
+
+    The first candidate that answers a probe is cached for ttl seconds and
+    used for every request, so a diagnosis costs one round-trip instead of
+    a probe per candidate plus the real call. Real calls feed a circuit
+    breaker: after failure_threshold consecutive failures a model is
+    demoted for cooldown seconds and the next request resolves again.
+    When the TTL expires candidates are re-probed in order, so a preferred
+    model that recovered is picked up again.
+    """
+
+    def __init__(self, client, candidates=None, ttl=None, failure_threshold=None, cooldown=None):
+        """
+        Args:
+            client: Object with generate(model_name, prompt) -> str
+            candidates: Model names in order of preference
+        """
+        self.client = client
+        self.candidates = list(candidates or config.GEMINI_MODELS)
+        self.ttl = ttl or config.LLM_MODEL_TTL
+        self.failure_threshold = failure_threshold or config.LLM_FAILURE_THRESHOLD
+        self.cooldown = cooldown or config.LLM_CIRCUIT_COOLDOWN
+
+        self._lock = threading.Lock()  # Guards state only; never held during a network call
+        self._probe_flight = SingleFlight()  # One probe round at a time
+        self._model = None
+        self._resolved_at = 0.0
+        self._failures = {}  # model name -> consecutive failures
+        self._opened_at = {}  # model name -> time its circuit opened
+
+        # Metrics
+        self.probes = 0
+        self.resolutions = 0
+        self.calls = 0
+        self.failures = 0
+
+    def _available(self, model_name, now):
+        """Whether a model's circuit is closed (or its cooldown has passed)"""
+        opened_at = self._opened_at.get(model_name)
+        return opened_at is None or now - opened_at >= self.cooldown
+
+    def _cached_model(self, now):
+        """The resolved model if it is still valid (caller holds _lock)"""
+        if (self._model and now - self._resolved_at < self.ttl
+                and self._available(self._model, now)):
+            return self._model
+        return None
+
+    def resolve(self):
+        """
+        Get the model to use, probing candidates only when nothing valid is cached
+        Concurrent callers wait for a single probe round. Probes run without
+        the state lock, so stats and call outcomes are never blocked by one.
+        Returns:
+            str: Model name
+        """
+        with self._lock:
+            model_name = self._cached_model(time.time())
+        if model_name:
+            return model_name
+        return self._probe_flight.do('probe', self._probe)[0]
+
+    def _probe(self):
+        """Probe candidates in order and publish the first one that answers"""
+        # Snapshot under the lock (another round may have just finished)
+        with self._lock:
+            now = time.time()
+            model_name = self._cached_model(now)
+            if model_name:
+                return model_name
+            candidates = [name for name in self.candidates if self._available(name, now)]
+
+        last_error = None
+        for model_name in candidates:
+            with self._lock:
+                self.probes += 1
+            try:
+                answered = self.client.generate(model_name, PROBE_PROMPT)
+            except Exception as e:
+                last_error = e
+                print(f"⚠️  {model_name} unavailable: {str(e)[:100]}")
+                continue
+            if answered:
+                with self._lock:
+                    self._model = model_name
+                    self._resolved_at = time.time()
+                    self._failures.pop(model_name, None)
+                    self._opened_at.pop(model_name, None)
+                    self.resolutions += 1
+                print(f"✅ Using Gemini model: {model_name}")
+                return model_name
+
+        with self._lock:
+            self._model = None
+        raise RuntimeError(f"All Gemini models failed: {last_error or 'all circuits open'}")
+
+    def record_success(self, model_name):
+        with self._lock:
+            self._failures.pop(model_name, None)
+
+    def record_failure(self, model_name):
+        """Count a failed call; open the model's circuit after failure_threshold in a row"""
+        with self._lock:
+            self.failures += 1
+            failures = self._failures.get(model_name, 0) + 1
+            self._failures[model_name] = failures
+            if failures >= self.failure_threshold:
+                self._opened_at[model_name] = time.time()
+                self._failures.pop(model_name)
+                if self._model == model_name:
+                    self._model = None
+                print(f"⚠️  {model_name} demoted for {self.cooldown}s after {failures} failures")
+
+    def generate(self, prompt):
+        """
+        Send a prompt to the resolved model
+        Returns:
+            str: Response text
+        """
+        model_name = self.resolve()
+        with self._lock:
+            self.calls += 1
+        try:
+            text = self.client.generate(model_name, prompt)
+        except Exception:
+            self.record_failure(model_name)
+            raise
+        self.record_success(model_name)
+        return text
+
+    def get_stats(self):
+        """Get the resolved model and circuit breaker state"""
+        with self._lock:
+            now = time.time()
+            return {
+                'model': self._model,
+                'model_age': round(now - self._resolved_at, 1) if self._model else None,
+                'demoted': [name for name in self._opened_at if not self._available(name, now)],
+                'probes': self.probes,
+                'resolutions': self.resolutions,
+                'calls': self.calls,
+                'failures': self.failures
+            }
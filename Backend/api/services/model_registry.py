@@ -0,0 +1,142 @@
+"""
+AgriScan Backend - Model Registry
+Holds several named detection models and hot-swaps them without downtime
+"""
+
+import json
+import threading
+from pathlib import Path
+import sys
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from config import config
+from services.model_service import YOLOModelService, model_service
+
+
+class ModelRegistry:
+    """
+    Named YOLOModelService instances (e.g. combined, rice-only, int8)
+
+    Swaps are atomic: a replacement model is fully loaded before it is
+    published, and requests that already resolved the old instance keep
+    using it until they finish.
+    """
+
+    def __init__(self, default_service):
+        """Initialize registry with the default model, then models from registry.json"""
+        self._lock = threading.Lock()
+        self._models = {default_service.name: default_service}
+        self.default_name = default_service.name
+        self.load_registry_file()
+
+    def load_registry_file(self):
+        """
+        Load extra models listed in config.MODEL_REGISTRY_FILE
+
+        Format:
+        {
+            "rice": {"model_path": "models/rice/weights/best.pt", "labels_path": "...", "backend": "ultralytics"},
+            "int8": {"model_path": "models/onnx_export/agriscan_model_int8.onnx", "backend": "onnx-int8"}
+        }
+        """
+        if not config.MODEL_REGISTRY_FILE.exists():
+            return
+
+        try:
+            with open(config.MODEL_REGISTRY_FILE, 'r') as f:
+                entries = json.load(f)
+        except Exception as e:
+            print(f"❌ Error reading model registry: {e}")
+            return
+
+        for name, entry in entries.items():
+            try:
+                self.load(
+                    name,
+                    model_path=entry['model_path'],
+                    labels_path=entry.get('labels_path'),
+                    backend=entry.get('backend')
+                )
+            except Exception as e:
+                print(f"❌ Error registering model '{name}': {e}")
+
+    def resolve_path(self, path):
+        """Resolve a model/labels path relative to Backend/ and keep it inside models/"""
+        resolved = Path(path)
+        if not resolved.is_absolute():
+            resolved = config.BASE_DIR / resolved
+        resolved = resolved.resolve()
+
+        if not resolved.is_relative_to(config.MODELS_DIR.resolve()):
+            raise ValueError(f"Model files must live under {config.MODELS_DIR}")
+        return resolved
+
+    def load(self, name, model_path, labels_path=None, backend=None, make_default=False):
+        """
+        Load a model and publish it under name (replacing any existing one)
+        Args:
+            name: Registry name
+            model_path: Weights file (relative to Backend/ or absolute, under models/)
+            labels_path: Labels file (default: shipped with the model)
+            backend: 'ultralytics', 'onnx' or 'onnx-int8' (default from config)
+            make_default: Serve this model when a request does not pick one
+        Returns:
+            YOLOModelService: The newly published service
+        """
+        service = YOLOModelService(
+            name=name,
+            model_path=self.resolve_path(model_path),
+            labels_path=self.resolve_path(labels_path) if labels_path else None,
+            backend=backend
+        )
+
+        # Load outside the lock; only publish a model that actually works
+        if service.model is None:
+            raise ValueError(f"Model '{name}' failed to load from {service.model_path}")
+
+        with self._lock:
+            previous = self._models.get(name)
+            self._models[name] = service
+            if make_default:
+                self.default_name = name
+
+        print(f"🔄 Model '{name}' {'swapped' if previous else 'registered'}: {service.version}")
+        return service
+
+    def get(self, name=None):
+        """
+        Get the service for a model name (default model when name is empty)
+        Raises:
+            KeyError: Unknown model name
+        """
+        with self._lock:
+            key = name or self.default_name
+            if key not in self._models:
+                raise KeyError(f"Unknown model '{key}'. Available: {', '.join(sorted(self._models))}")
+            return self._models[key]
+
+    @property
+    def default(self):
+        """Service for the default model"""
+        return self.get()
+
+    def names(self):
+        """Registered model names"""
+        with self._lock:
+            return sorted(self._models)
+
+    def list_models(self):
+        """Model info for every registered model"""
+        with self._lock:
+            services = list(self._models.values())
+            default_name = self.default_name
+
+        return [
+            dict(service.get_model_info(), default=service.name == default_name)
+            for service in services
+        ]
+
+
+# Singleton instance
+model_registry = ModelRegistry(model_service)
@@ -10,58 +10,116 @@
 from PIL import Image
 from pathlib import Path
 import sys
-from collections import Counter
 
 # Add parent directory to path
 sys.path.append(str(Path(__file__).parent.parent))
 
 from config import config
+from utils.detection_utils import clamp_tile_overlap, format_detections, non_max_suppression, tile_windows
+from utils.image_utils import decode_base64, decode_image, get_image_size
+from services.result_cache import result_cache
+from services.tracking_store import tracking_store
+
+# Backends served by services.onnx_backend.ONNXDetector
+ONNX_BACKENDS = ('onnx', 'onnx-int8')
+
+
+def default_model_path(backend):
+    """Default weights file for an inference backend"""
+    if backend == 'onnx-int8':
+        return config.ONNX_INT8_MODEL_PATH
+    if backend == 'onnx':
+        return config.ONNX_MODEL_PATH
+    return config.MODEL_PATH
+
+
+def find_labels_path(model_path):
+    """Labels file shipped with a model (next to the weights or one level up), else the global labels.txt"""
+    for directory in (model_path.parent, model_path.parent.parent):
+        candidate = directory / 'labels.txt'
+        if candidate.exists():
+            return candidate
+    return config.LABELS_PATH
 
 
 class YOLOModelService:
     """Service for YOLO model inference with primary detection tracking"""
     
-    def __init__(self):
-        """Initialize YOLO model"""
+    def __init__(self, name=None, model_path=None, labels_path=None, backend=None):
+        """
+        Initialize YOLO model
+        Args:
+            name: Model name in the registry (default from config)
+            model_path: Weights file (default for the backend from config)
+            labels_path: Labels file (default: labels.txt shipped with the model, else api/labels.txt)
+            backend: 'ultralytics', 'onnx' or 'onnx-int8' (default from config)
+        """
+        self.name = name or config.DEFAULT_MODEL_NAME
+        self.backend = (backend or config.INFERENCE_BACKEND).lower()
+        self.model_path = Path(model_path) if model_path else default_model_path(self.backend)
+        self.labels_path = Path(labels_path) if labels_path else find_labels_path(self.model_path)
         self.model = None
+        self.version = None
         self.class_names = []
         self.load_model()
         self.load_labels()
-        
-        # Primary detection tracking (for continuous detection scenarios)
-        self.detection_history = []  # Store recent detection results
-        self.history_size = 45  # Track last 45 frames/images
     
     def load_model(self):
+        """Load detection model for the configured inference backend"""
+        if self.backend in ONNX_BACKENDS:
+            self.load_onnx_model()
+        else:
+            self.load_ultralytics_model()
+        
+        if self.model is not None:
+            # Identifies the exact weights being served (e.g. for result caching)
+            self.version = f"{self.name}:{self.model_path.name}@{int(self.model_path.stat().st_mtime)}"
+    
+    def load_ultralytics_model(self):
         """Load YOLO model"""
         try:
             from ultralytics import YOLO
             from ultralytics.nn.tasks import DetectionModel
             import torch
             
-            if not config.MODEL_PATH.exists():
-                raise FileNotFoundError(f"Model not found at {config.MODEL_PATH}")
+            if not self.model_path.exists():
+                raise FileNotFoundError(f"Model not found at {self.model_path}")
             
             # Fix for PyTorch 2.6 - allow loading ultralytics models
             # IMPORTANT: Pass the actual class object, not a string!
             torch.serialization.add_safe_globals([DetectionModel])
             
-            self.model = YOLO(str(config.MODEL_PATH))
-            print(f"✅ Model loaded from {config.MODEL_PATH}")
+            self.model = YOLO(str(self.model_path))
+            print(f"✅ Model '{self.name}' loaded from {self.model_path}")
             
         except Exception as e:
-            print(f"❌ Error loading model: {e}")
+            print(f"❌ Error loading model '{self.name}': {e}")
+            self.model = None
+    
+    def load_onnx_model(self):
+        """Load exported ONNX model (FP32 or INT8) on onnxruntime (CPU)"""
+        try:
+            from services.onnx_backend import ONNXDetector
+            
+            if not self.model_path.exists():
+                raise FileNotFoundError(f"ONNX model not found at {self.model_path}")
+            
+            self.model = ONNXDetector(self.model_path, img_size=config.IMG_SIZE)
+            print(f"✅ ONNX model '{self.name}' loaded from {self.model_path} (onnxruntime CPU)")
+            
+        except Exception as e:
+            print(f"❌ Error loading ONNX model '{self.name}': {e}")
             self.model = None
     
     def load_labels(self):
         """Load class labels"""
         try:
-            if config.LABELS_PATH.exists():
-                with open(config.LABELS_PATH, 'r') as f:
+            if self.labels_path.exists():
+                with open(self.labels_path, 'r') as f:
                     self.class_names = [line.strip() for line in f.readlines()]
-                print(f"✅ Loaded {len(self.class_names)} class labels")
+                print(f"✅ Loaded {len(self.class_names)} class labels from {self.labels_path}")
             else:
-                print(f"⚠️  Labels file not found at {config.LABELS_PATH}")
+                print(f"⚠️  Labels file not found at {self.labels_path}")
                 
         except Exception as e:
             print(f"❌ Error loading labels: {e}")
@@ -108,7 +166,30 @@ def preprocess_image(self, image_data):
         except Exception as e:
             raise ValueError(f"Error preprocessing image: {e}")
     
-    def detect(self, image_data, confidence_threshold=None, iou_threshold=None, track_primary=True):
+    def load_image(self, image_data):
+        """
+        Decode image data for inference
+        Encoded bytes and base64 strings take the fast path: decoded straight
+        into a BGR uint8 array (downscaled during decode when much larger
+        than IMG_SIZE) with no intermediate PIL objects.
+        Args:
+            image_data: base64 string, bytes, PIL Image or numpy array
+        Returns:
+            tuple: (PIL Image or BGR numpy array, original (width, height))
+        """
+        if config.FAST_IMAGE_DECODE and isinstance(image_data, (str, bytes, bytearray, memoryview)):
+            buffer = decode_base64(image_data) if isinstance(image_data, str) else image_data
+            try:
+                return decode_image(buffer, target_size=config.IMG_SIZE)
+            except ValueError:
+                # Formats OpenCV cannot decode still go through PIL
+                image_data = bytes(buffer)
+        
+        image = self.preprocess_image(image_data)
+        return image, image.size
+    
+    def detect(self, image_data, confidence_threshold=None, iou_threshold=None, track_primary=True,
+               session_id=None):
         """
         Detect plant diseases in image with primary detection tracking
         Args:
@@ -116,125 +197,518 @@ def detect(self, image_data, confidence_threshold=None, iou_threshold=None, trac
             confidence_threshold: Minimum confidence score (default from config)
             iou_threshold: IoU threshold for NMS (default from config)
             track_primary: Enable primary detection tracking (default True)
+            session_id: Client session whose tracking history is updated
         Returns:
             dict: Detection results with primary detection highlighted
         """
         if self.model is None:
-            return {
-                'success': False,
-                'error': 'Model not loaded',
-                'detections': [],
-                'primary_detection': None
-            }
+            return self._error_result('Model not loaded')
         
         try:
+            # Set thresholds
+            conf = confidence_threshold or config.CONFIDENCE_THRESHOLD
+            iou = iou_threshold or config.IOU_THRESHOLD
+            
             # Preprocess image
             start_time = time.time()
-            image = self.preprocess_image(image_data)
+            image, original_size = self.load_image(image_data)
+            cache_key = self.cache_key(image, conf, iou)
             preprocess_time = time.time() - start_time
             
-            # Set thresholds
+            # Re-submitted images skip inference entirely
+            detections = result_cache.get(cache_key) if cache_key else None
+            cached = detections is not None
+            
+            if cached:
+                inference_time = 0.0
+            else:
+                # Run inference
+                inference_start = time.time()
+                outputs = self.predict([image], conf, iou)
+                inference_time = time.time() - inference_start
+                
+                # Format results
+                detections = self.format_output(outputs[0], get_image_size(image), original_size)
+                if cache_key:
+                    result_cache.put(cache_key, detections)
+            
+            # Track primary detection if enabled
+            primary_detection, tracks = None, None
+            if track_primary:
+                primary_detection, tracks = self.track(detections, original_size, session_id)
+            
+            total_time = time.time() - start_time
+            
+            result = self._build_result(
+                detections, primary_detection, original_size,
+                preprocess_time, inference_time, total_time, conf, iou
+            )
+            result['cached'] = cached
+            if tracks is not None:
+                result['tracks'] = tracks
+            return result
+            
+        except Exception as e:
+            return self._error_result(str(e))
+    
+    def detect_many(self, images, confidence_threshold=None, iou_threshold=None, max_batch_size=None):
+        """
+        Detect plant diseases in several images using batched forward passes
+        Args:
+            images: List of image data (base64, PIL, numpy, bytes)
+            confidence_threshold: Minimum confidence score (default from config)
+            iou_threshold: IoU threshold for NMS (default from config)
+            max_batch_size: Maximum images per forward pass (default from config)
+        Returns:
+            list: One result dict per input image, in the same format as detect()
+        """
+        if self.model is None:
+            return [self._error_result('Model not loaded') for _ in images]
+        
+        conf = confidence_threshold or config.CONFIDENCE_THRESHOLD
+        iou = iou_threshold or config.IOU_THRESHOLD
+        batch_size = max(1, int(max_batch_size or config.MAX_BATCH_SIZE))
+        
+        results = [None] * len(images)
+        
+        # Decode all images first; a bad image only fails its own slot and
+        # cached images never reach the model
+        decoded = []
+        for index, image_data in enumerate(images):
+            start_time = time.time()
+            try:
+                image, original_size = self.load_image(image_data)
+            except ValueError as e:
+                results[index] = self._error_result(str(e))
+                continue
+            
+            cache_key = self.cache_key(image, conf, iou)
+            preprocess_time = time.time() - start_time
+            
+            detections = result_cache.get(cache_key) if cache_key else None
+            if detections is not None:
+                results[index] = self._build_result(
+                    detections, None, original_size,
+                    preprocess_time, 0.0, preprocess_time, conf, iou
+                )
+                results[index]['cached'] = True
+                continue
+            
+            decoded.append((index, image, original_size, preprocess_time, cache_key))
+        
+        # Run the decoded images through the model in chunks of batch_size.
+        # Both backends letterbox every image to IMG_SIZE and stack the chunk
+        # into a single tensor, so each chunk is one forward pass.
+        for chunk_start in range(0, len(decoded), batch_size):
+            chunk = decoded[chunk_start:chunk_start + batch_size]
+            
+            inference_start = time.time()
+            try:
+                batch_outputs = self.predict([image for _, image, _, _, _ in chunk], conf, iou)
+            except Exception as e:
+                for index, _, _, _, _ in chunk:
+                    results[index] = self._error_result(str(e))
+                continue
+            
+            # Report each image's share of the batched forward pass
+            inference_time = (time.time() - inference_start) / len(chunk)
+            
+            for (index, image, original_size, preprocess_time, cache_key), output in zip(chunk, batch_outputs):
+                format_start = time.time()
+                detections = self.format_output(output, get_image_size(image), original_size)
+                if cache_key:
+                    result_cache.put(cache_key, detections)
+                total_time = preprocess_time + inference_time + (time.time() - format_start)
+                
+                results[index] = self._build_result(
+                    detections, None, original_size,
+                    preprocess_time, inference_time, total_time, conf, iou
+                )
+                results[index]['timing']['batch_size'] = len(chunk)
+                results[index]['cached'] = False
+        
+        return results
+    
+    def detect_tiled(self, image_data, confidence_threshold=None, iou_threshold=None,
+                     tiles=None, tile_overlap=None, track_primary=True, session_id=None):
+        """
+        Detect small lesions in high-resolution images by slicing them into tiles
+        
+        The image is decoded at full resolution and cut into overlapping tiles
+        of about IMG_SIZE pixels. All tiles (plus a downscaled view of the whole
+        image, for lesions larger than a tile) go through the model in batched
+        forward passes, and the boxes are merged with one global NMS.
+        
+        Args:
+            image_data: Image data (base64, PIL, numpy, bytes)
+            confidence_threshold: Minimum confidence score (default from config)
+            iou_threshold: IoU threshold for NMS (default from config)
+            tiles: Tiles per side (default: enough tiles of about IMG_SIZE)
+            tile_overlap: Fraction of a tile shared with its neighbour (default from config,
+                at most MAX_TILE_OVERLAP; negative values are an error)
+            track_primary: Enable primary detection tracking (default True)
+            session_id: Client session whose tracking history is updated
+        Returns:
+            dict: Same format as detect(), with per-stage timing and the tile grid
+        """
+        if self.model is None:
+            return self._error_result('Model not loaded')
+        
+        try:
             conf = confidence_threshold or config.CONFIDENCE_THRESHOLD
             iou = iou_threshold or config.IOU_THRESHOLD
+            # Clamped once here, so the reported overlap is the one the windows use
+            overlap = clamp_tile_overlap(config.TILE_OVERLAP if tile_overlap is None else tile_overlap)
+            
+            # Decode at full resolution - downscaling is what hides small lesions
+            start_time = time.time()
+            if isinstance(image_data, (str, bytes, bytearray, memoryview)):
+                buffer = decode_base64(image_data) if isinstance(image_data, str) else image_data
+                try:
+                    image, _ = decode_image(buffer)
+                except ValueError:
+                    image_data = bytes(buffer)
+                    image = None
+            else:
+                image = None
+            if image is None:
+                # PIL fallback: RGB -> BGR to match the OpenCV decode path
+                image = np.ascontiguousarray(np.asarray(self.preprocess_image(image_data))[:, :, ::-1])
+            width, height = get_image_size(image)
+            decode_time = time.time() - start_time
             
-            # Run inference
+            # Slice into tiles (crops are views, no copies)
+            tiling_start = time.time()
+            if tiles:
+                tiles = min(max(int(tiles), 1), config.MAX_TILES_PER_SIDE)
+            windows = tile_windows(width, height, config.IMG_SIZE, overlap, tiles)
+            if len(windows) > config.MAX_TILES_PER_SIDE ** 2:
+                windows = tile_windows(width, height, config.IMG_SIZE, overlap, config.MAX_TILES_PER_SIDE)
+            
+            crops = [image[y1:y2, x1:x2] for x1, y1, x2, y2 in windows]
+            tile_count = len(windows)
+            global_pass = tile_count > 1
+            if global_pass:
+                # Whole-image pass keeps lesions that span several tiles intact
+                crops.append(image)
+                windows = np.vstack([windows, [[0, 0, width, height]]])
+            tiling_time = time.time() - tiling_start
+            
+            # Batched forward passes over all tiles
             inference_start = time.time()
-            results = self.model(
-                image,
-                conf=conf,
-                iou=iou,
-                imgsz=config.IMG_SIZE,
-                verbose=False
-            )
+            outputs = []
+            for chunk_start in range(0, len(crops), config.MAX_BATCH_SIZE):
+                outputs.extend(self.predict(crops[chunk_start:chunk_start + config.MAX_BATCH_SIZE], conf, iou))
             inference_time = time.time() - inference_start
             
-            # Format results
-            detections = self.format_results(results[0], image.size)
+            # Shift tile boxes into image coordinates and merge with one global NMS
+            merge_start = time.time()
+            all_boxes, all_scores, all_classes = [], [], []
+            for (x1, y1, _, _), output in zip(windows, outputs):
+                boxes, scores, class_ids = self.output_arrays(output)
+                all_boxes.append(np.asarray(boxes, dtype=np.float32) + np.array([x1, y1, x1, y1], dtype=np.float32))
+                all_scores.append(np.asarray(scores, dtype=np.float32))
+                all_classes.append(np.asarray(class_ids))
             
-            # Track primary detection if enabled
-            primary_detection = None
-            if track_primary and detections:
-                primary_detection = self.update_primary_detection(detections)
+            boxes = np.concatenate(all_boxes)
+            scores = np.concatenate(all_scores)
+            class_ids = np.concatenate(all_classes)
+            keep = non_max_suppression(boxes, scores, class_ids, iou_threshold=iou)
+            merge_time = time.time() - merge_start
+            
+            format_start = time.time()
+            detections = self.format_arrays(boxes[keep], scores[keep], class_ids[keep], (width, height))
+            format_time = time.time() - format_start
+            
+            primary_detection, tracks = None, None
+            if track_primary:
+                primary_detection, tracks = self.track(detections, (width, height), session_id)
             
             total_time = time.time() - start_time
             
-            return {
-                'success': True,
-                'detections': detections,
-                'primary_detection': primary_detection,
-                'image_size': {
-                    'width': image.size[0],
-                    'height': image.size[1]
-                },
-                'timing': {
-                    'preprocess': round(preprocess_time, 3),
-                    'inference': round(inference_time, 3),
-                    'total': round(total_time, 3)
-                },
-                'model_config': {
-                    'confidence_threshold': conf,
-                    'iou_threshold': iou,
-                    'image_size': config.IMG_SIZE
-                }
+            result = self._build_result(
+                detections, primary_detection, (width, height),
+                decode_time + tiling_time, inference_time, total_time, conf, iou
+            )
+            if tracks is not None:
+                result['tracks'] = tracks
+            result['timing'].update({
+                'decode': round(decode_time, 3),
+                'tiling': round(tiling_time, 3),
+                'merge': round(merge_time, 3),
+                'format': round(format_time, 3)
+            })
+            result['tiling'] = {
+                'tiles': tile_count,
+                'tile_overlap': overlap,
+                'global_pass': global_pass,  # Extra whole-image pass (not counted in tiles)
+                'windows': windows[:tile_count].tolist()
             }
+            return result
             
         except Exception as e:
-            return {
-                'success': False,
-                'error': str(e),
-                'detections': [],
-                'primary_detection': None
+            return self._error_result(str(e))
+    
+    def cache_key(self, image, conf, iou):
+        """Result cache key for a decoded image (None when the cache is disabled)"""
+        if not result_cache.enabled:
+            return None
+        return result_cache.make_key(image, conf, iou, self.version)
+    
+    def predict(self, images, conf, iou):
+        """
+        Run one forward pass over a list of preprocessed images
+        Returns:
+            list: Raw backend output per image (ultralytics Results or ONNX arrays)
+        """
+        if self.backend in ONNX_BACKENDS:
+            return self.model.predict(images, conf=conf, iou=iou)
+        
+        return self.model(
+            images,
+            conf=conf,
+            iou=iou,
+            imgsz=config.IMG_SIZE,
+            verbose=False
+        )
+    
+    def output_arrays(self, output):
+        """
+        Extract (boxes xyxy, scores, class_ids) arrays from one raw backend output
+        Boxes are in pixels of the image passed to predict().
+        """
+        if self.backend in ONNX_BACKENDS:
+            return output
+        
+        if output.boxes is None or len(output.boxes) == 0:
+            return np.empty((0, 4), dtype=np.float32), np.empty(0, dtype=np.float32), np.empty(0, dtype=np.float32)
+        
+        data = output.boxes.data.cpu().numpy()
+        return data[:, :4], data[:, 4], data[:, 5]
+    
+    def format_output(self, output, image_size, original_size=None):
+        """
+        Format one image's raw backend output for API response
+        Args:
+            output: ultralytics Results or ONNX (boxes, scores, class_ids)
+            image_size: (width, height) of the image the model saw
+            original_size: (width, height) of the uploaded image, when it was downscaled on decode
+        Returns:
+            list: Formatted detections
+        """
+        boxes, scores, class_ids = self.output_arrays(output)
+        if len(boxes) == 0:
+            return []
+        
+        # Map boxes back to the uploaded image's pixel coordinates
+        if original_size and tuple(original_size) != tuple(image_size):
+            scale_x = original_size[0] / image_size[0]
+            scale_y = original_size[1] / image_size[1]
+            boxes = boxes * np.array([scale_x, scale_y, scale_x, scale_y])
+            image_size = original_size
+        
+        return self.format_arrays(boxes, scores, class_ids, image_size)
+    
+    def _build_result(self, detections, primary_detection, image_size,
+                      preprocess_time, inference_time, total_time, conf, iou):
+        """Build the detection response dict shared by detect() and detect_many()"""
+        return {
+            'success': True,
+            'detections': detections,
+            'primary_detection': primary_detection,
+            'image_size': {
+                'width': image_size[0],
+                'height': image_size[1]
+            },
+            'timing': {
+                'preprocess': round(preprocess_time, 3),
+                'inference': round(inference_time, 3),
+                'total': round(total_time, 3)
+            },
+            'model_config': {
+                'confidence_threshold': conf,
+                'iou_threshold': iou,
+                'image_size': config.IMG_SIZE
             }
+        }
     
-    def update_primary_detection(self, detections):
+    def _error_result(self, error):
+        """Build a failed detection response"""
+        return {
+            'success': False,
+            'error': error,
+            'detections': [],
+            'primary_detection': None
+        }
+    
+    def tracking_key(self, session_id=None):
+        """Tracking store key (class IDs are only comparable within one model)"""
+        return f"{self.name}:{session_id or 'default'}"
+    
+    def track(self, detections, image_size, session_id=None):
         """
-        Track and identify primary detection (most frequently detected disease)
+        Update a session's tracking state with one frame
         Args:
             detections: List of current frame detections
+            image_size: (width, height) the detections refer to
+            session_id: Client session ID (requests without one share 'default')
         Returns:
-            dict: Primary detection with occurrence statistics
+            tuple: (primary detection with occurrence statistics, tracks updated this frame)
         """
-        # Add current detections to history
-        current_classes = [det['class_id'] for det in detections]
-        self.detection_history.append(current_classes)
+        with tracking_store.session(self.tracking_key(session_id)) as state:
+            # Empty frames still age the tracks, but do not enter the class window
+            tracks = self.update_tracks(detections, state, image_size)
+            primary_detection = None
+            if detections:
+                primary_detection = self.update_primary_detection(detections, state, tracks)
+            return primary_detection, tracks
+    
+    def check_motion(self, signature, confidence_threshold=None, session_id=None, threshold=None):
+        """
+        Compare a frame with the session's last inferred frame
+        Args:
+            signature: utils.motion.frame_signature() of the frame
+            confidence_threshold: Request's confidence threshold (stored result must match)
+            session_id: Client session ID
+            threshold: Motion score treated as static (default from config)
+        Returns:
+            tuple: (stored result to reuse or None, motion score or None)
+        """
+        params = (confidence_threshold or config.CONFIDENCE_THRESHOLD, self.version)
+        with tracking_store.session(self.tracking_key(session_id)) as state:
+            stored, score = state.motion_gate.check(
+                signature, params,
+                config.MOTION_THRESHOLD if threshold is None else threshold,
+                config.MOTION_MAX_SKIPS
+            )
+            if stored is None:
+                return None, score
+            
+            # A still frame re-confirms the stored boxes, so skipped frames
+            # count toward stability exactly like inferred ones
+            detections = stored['detections']
+            image_size = (stored['image_size']['width'], stored['image_size']['height'])
+            tracks = self.update_tracks(detections, state, image_size)
+            primary_detection = None
+            if detections:
+                primary_detection = self.update_primary_detection(detections, state, tracks)
+            return dict(stored, primary_detection=primary_detection, tracks=tracks), score
+    
+    def remember_motion(self, signature, result, confidence_threshold=None, session_id=None):
+        """Store an inferred frame and its tracked result for motion gating"""
+        params = (confidence_threshold or config.CONFIDENCE_THRESHOLD, self.version)
+        stored = {
+            'detections': result['detections'],
+            'primary_detection': result.get('primary_detection'),
+            'tracks': result.get('tracks', []),
+            'image_size': result['image_size']
+        }
+        with tracking_store.session(self.tracking_key(session_id)) as state:
+            state.motion_gate.remember(signature, params, stored)
+    
+    def update_tracks(self, detections, state, image_size):
+        """
+        Associate this frame's boxes with the session's object tracks
+        Args:
+            detections: List of current frame detections
+            state: Session TrackingState to update
+            image_size: (width, height) for pixel coordinates of smoothed boxes
+        Returns:
+            list: Tracks matched or started this frame, most persistent first
+        """
+        tracker = state.tracker
+        img_width, img_height = image_size
         
-        # Keep only recent history
-        if len(self.detection_history) > self.history_size:
-            self.detection_history.pop(0)
+        tracks = []
+        for track, det_index in tracker.update(detections):
+            x_center, y_center, width, height = (float(value) for value in track.box)
+            tracks.append({
+                'track_id': track.track_id,
+                'class_id': track.class_id,
+                'class_name': detections[det_index]['class_name'],
+                'confidence': round(float(track.confidence), 4),
+                'hits': track.hits,
+                'age': track.age,
+                'confirmed': tracker.is_confirmed(track),
+                'detection_index': det_index,
+                'bounding_box': {
+                    'x': round(x_center, 4),
+                    'y': round(y_center, 4),
+                    'width': round(width, 4),
+                    'height': round(height, 4),
+                    'x1': round((x_center - width / 2) * img_width, 2),
+                    'y1': round((y_center - height / 2) * img_height, 2),
+                    'x2': round((x_center + width / 2) * img_width, 2),
+                    'y2': round((y_center + height / 2) * img_height, 2)
+                }
+            })
         
-        # Count occurrences of each class
-        class_counter = Counter()
-        for frame_classes in self.detection_history:
-            for cls_id in frame_classes:
-                class_counter[cls_id] += 1
+        tracks.sort(key=lambda item: item['hits'], reverse=True)
+        return tracks
+    
+    def update_primary_detection(self, detections, state, tracks=None):
+        """
+        Track and identify primary detection (most frequently detected disease)
+        Args:
+            detections: List of current frame detections
+            state: Session TrackingState to update
+            tracks: This frame's tracks from update_tracks()
+        Returns:
+            dict: Primary detection with occurrence statistics
+        """
+        # Add current detections to the sliding window (evicts the oldest frame)
+        window = state.window
+        window.add(
+            [det['class_id'] for det in detections],
+            [det['confidence'] for det in detections]
+        )
         
         # Determine primary detection (most frequent)
-        if not class_counter:
+        most_common = window.most_common()
+        if most_common is None:
             return None
         
-        primary_class_id, occurrence_count = class_counter.most_common(1)[0]
+        primary_class_id, occurrence_count = most_common
+        
+        # Prefer the most persistent track of the primary class (tracks are sorted by hits)
+        primary_track = next(
+            (track for track in tracks or [] if track['class_id'] == primary_class_id),
+            None
+        )
         
         # Find the primary detection in current frame
         primary_detection = None
-        for det in detections:
-            if det['class_id'] == primary_class_id:
-                primary_detection = det.copy()
-                break
+        if primary_track:
+            primary_detection = detections[primary_track['detection_index']].copy()
+        else:
+            for det in detections:
+                if det['class_id'] == primary_class_id:
+                    primary_detection = det.copy()
+                    break
         
         if primary_detection:
-            # Add tracking statistics
+            # Stability comes from box persistence only: a flickering false
+            # positive keeps restarting tracks, a real lesion keeps its track.
+            # Class counts are reported but never make a detection stable.
+            track_hits = primary_track['hits'] if primary_track else 0
             primary_detection['tracking_stats'] = {
                 'occurrence_count': occurrence_count,
-                'total_frames': len(self.detection_history),
-                'occurrence_percentage': round((occurrence_count / sum(class_counter.values())) * 100, 2),
-                'is_stable': occurrence_count >= 5  # Stable if detected in 5+ frames
+                'total_frames': len(window),
+                'occurrence_percentage': round(window.share(primary_class_id) * 100, 2),
+                'track_hits': track_hits,
+                'track_age': primary_track['age'] if primary_track else 0,
+                'is_stable': track_hits >= config.TRACKING_STABLE_HITS
             }
+            
+            if primary_track:
+                primary_detection['track_id'] = primary_track['track_id']
+                primary_detection['smoothed_box'] = primary_track['bounding_box']
         
         return primary_detection
     
-    def reset_tracking(self):
-        """Reset primary detection tracking history"""
-        self.detection_history = []
+    def reset_tracking(self, session_id=None):
+        """Reset one session's primary detection tracking history"""
+        tracking_store.reset(self.tracking_key(session_id))
     
     def format_results(self, result, image_size):
         """
@@ -245,64 +719,39 @@ def format_results(self, result, image_size):
         Returns:
             list: Formatted detections
         """
-        detections = []
-        
         if result.boxes is None or len(result.boxes) == 0:
-            return detections
+            return []
         
-        img_width, img_height = image_size
+        # Single device-to-host transfer: (N, 6) rows of x1, y1, x2, y2, conf, cls
+        data = result.boxes.data.cpu().numpy()
         
-        for box in result.boxes:
-            # Get box coordinates (xyxy format)
-            x1, y1, x2, y2 = box.xyxy[0].tolist()
-            
-            # Convert to normalized coordinates (0-1 range)
-            # For AR overlay in Flutter
-            x_center = ((x1 + x2) / 2) / img_width
-            y_center = ((y1 + y2) / 2) / img_height
-            width = (x2 - x1) / img_width
-            height = (y2 - y1) / img_height
-            
-            # Get class and confidence
-            class_id = int(box.cls[0])
-            confidence = float(box.conf[0])
-            
-            # Get class name
-            class_name = self.class_names[class_id] if class_id < len(self.class_names) else f"Class_{class_id}"
-            
-            detection = {
-                'class_id': class_id,
-                'class_name': class_name,
-                'confidence': round(confidence, 4),
-                'bounding_box': {
-                    # Normalized coordinates (0-1) for Flutter AR overlay
-                    'x': round(x_center, 4),
-                    'y': round(y_center, 4),
-                    'width': round(width, 4),
-                    'height': round(height, 4),
-                    # Pixel coordinates (for reference)
-                    'x1': round(x1, 2),
-                    'y1': round(y1, 2),
-                    'x2': round(x2, 2),
-                    'y2': round(y2, 2)
-                }
-            }
-            
-            detections.append(detection)
-        
-        # Sort by confidence (highest first)
-        detections.sort(key=lambda x: x['confidence'], reverse=True)
-        
-        return detections
+        return self.format_arrays(data[:, :4], data[:, 4], data[:, 5], image_size)
+    
+    def format_arrays(self, boxes, scores, class_ids, image_size):
+        """
+        Format raw detection arrays (ultralytics or ONNX backend) for API response
+        Args:
+            boxes: (N, 4) xyxy pixel coordinates
+            scores: (N,) confidence scores
+            class_ids: (N,) class indices
+            image_size: (width, height) tuple
+        Returns:
+            list: Formatted detections sorted by confidence (highest first)
+        """
+        return format_detections(boxes, scores, class_ids, image_size, self.class_names)
     
     def get_model_info(self):
         """Get model information"""
         if self.model is None:
-            return {'loaded': False}
+            return {'loaded': False, 'name': self.name}
         
         return {
             'loaded': True,
-            'model_path': str(config.MODEL_PATH),
+            'name': self.name,
+            'version': self.version,
+            'backend': self.backend,
+            'model_path': str(self.model_path),
+            'labels_path': str(self.labels_path),
             'num_classes': len(self.class_names),
             'class_names': self.class_names,
             'image_size': config.IMG_SIZE,
@@ -0,0 +1,132 @@
+"""
+AgriScan Backend - ONNX Runtime Inference Backend
+Serves the exported YOLOv8 ONNX model on CPU without torch/ultralytics
+"""
+
+import numpy as np
+from PIL import Image
+from pathlib import Path
+import sys
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from config import config
+from utils.detection_utils import letterbox, xywh_to_xyxy, non_max_suppression
+from utils.image_utils import get_image_size
+
+
+class ONNXDetector:
+    """YOLOv8 detector running on onnxruntime (CPUExecutionProvider)"""
+
+    def __init__(self, model_path, img_size=None):
+        """
+        Create an inference session for an exported YOLOv8 model
+        Args:
+            model_path: Path to the .onnx file
+            img_size: Input size (default taken from the model, then config)
+        """
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if config.ONNX_INTRA_OP_THREADS > 0:
+            options.intra_op_num_threads = config.ONNX_INTRA_OP_THREADS
+
+        self.model_path = Path(model_path)
+        self.session = ort.InferenceSession(
+            str(self.model_path),
+            sess_options=options,
+            providers=['CPUExecutionProvider']
+        )
+
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        self.input_type = np.float16 if 'float16' in model_input.type else np.float32
+
+        # Exported models have a static batch of 1 unless exported with dynamic=True
+        batch_dim, _, height_dim, _ = model_input.shape
+        self.dynamic_batch = not isinstance(batch_dim, int)
+        self.img_size = img_size or (height_dim if isinstance(height_dim, int) else config.IMG_SIZE)
+        if not self.dynamic_batch:
+            # detect_many, tiling and micro-batching then cost one forward pass per image
+            print(f"⚠️  {self.model_path.name} has a static batch size of {batch_dim}; "
+                  f"batches run one image at a time. Re-export with export_to_tflite.py "
+                  f"(dynamic=True) and re-quantize to batch on CPU")
+
+    def preprocess(self, image):
+        """
+        Letterbox an image into a normalized CHW float tensor
+        Args:
+            image: PIL Image (RGB) or BGR numpy array (OpenCV / ultralytics convention)
+        Returns:
+            tuple: (CHW tensor, scale ratio, (pad_x, pad_y))
+        """
+        if isinstance(image, Image.Image):
+            rgb = np.asarray(image.convert('RGB'))
+        else:
+            rgb = np.ascontiguousarray(image[:, :, ::-1])
+
+        padded, ratio, pad = letterbox(rgb, self.img_size)
+
+        # HWC uint8 -> CHW float in [0, 1]
+        tensor = padded.transpose(2, 0, 1).astype(self.input_type) / 255.0
+        return tensor, ratio, pad
+
+    def predict(self, images, conf=None, iou=None, max_detections=300):
+        """
+        Run detection on a list of images
+        Args:
+            images: List of PIL Images or BGR numpy arrays
+            conf: Minimum confidence score (default from config)
+            iou: IoU threshold for NMS (default from config)
+            max_detections: Maximum boxes per image
+        Returns:
+            list: (boxes xyxy in original pixels, scores, class_ids) per image
+        """
+        conf = conf or config.CONFIDENCE_THRESHOLD
+        iou = iou or config.IOU_THRESHOLD
+
+        prepared = [self.preprocess(image) for image in images]
+        sizes = [get_image_size(image) for image in images]
+
+        # Forward pass - one batch when the model allows it, otherwise image by image
+        if self.dynamic_batch and prepared:
+            batch = np.stack([tensor for tensor, _, _ in prepared])
+            raw_outputs = list(self.session.run(None, {self.input_name: batch})[0])
+        else:
+            raw_outputs = [
+                self.session.run(None, {self.input_name: tensor[None]})[0][0]
+                for tensor, _, _ in prepared
+            ]
+
+        return [
+            self.postprocess(raw, ratio, pad, size, conf, iou, max_detections)
+            for raw, (_, ratio, pad), size in zip(raw_outputs, prepared, sizes)
+        ]
+
+    def postprocess(self, raw, ratio, pad, image_size, conf, iou, max_detections=300):
+        """
+        Decode a raw YOLOv8 output of shape (4 + num_classes, num_anchors)
+        Returns:
+            tuple: (boxes xyxy in original pixels, scores, class_ids)
+        """
+        predictions = raw.T.astype(np.float32)  # (num_anchors, 4 + num_classes)
+        class_scores = predictions[:, 4:]
+
+        class_ids = class_scores.argmax(axis=1)
+        scores = class_scores[np.arange(len(class_ids)), class_ids]
+
+        mask = scores >= conf
+        boxes = xywh_to_xyxy(predictions[mask, :4])
+        scores = scores[mask]
+        class_ids = class_ids[mask]
+
+        keep = non_max_suppression(boxes, scores, class_ids, iou_threshold=iou, max_detections=max_detections)
+        boxes, scores, class_ids = boxes[keep], scores[keep], class_ids[keep]
+
+        # Undo letterbox: remove padding, rescale, clip to the original image
+        width, height = image_size
+        boxes[:, [0, 2]] = ((boxes[:, [0, 2]] - pad[0]) / ratio).clip(0, width)
+        boxes[:, [1, 3]] = ((boxes[:, [1, 3]] - pad[1]) / ratio).clip(0, height)
+
+        return boxes, scores, class_ids
@@ -6,6 +6,9 @@
 
 import json
 import os
+import threading
+import time
+import concurrent.futures
 from pathlib import Path
 import sys
 
@@ -13,6 +16,8 @@
 
 from config import config
 from services.db_service import db_service
+from services.llm_models import GeminiClient, ModelResolver
+from utils.single_flight import SingleFlight
 
 
 class RAGService:
@@ -22,6 +27,45 @@ def __init__(self):
         """Initialize RAG service"""
         self.knowledge_base = self.load_knowledge_base()
         self.use_online = config.USE_ONLINE_RAG
+        
+        # One shared, bounded pool for LLM calls, and one in-flight call per
+        # (disease, language) however many requests ask for it at once
+        self.llm_executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=config.LLM_MAX_CONCURRENCY,
+            thread_name_prefix='llm'
+        )
+        self._llm_busy = 0  # Workers running (or stuck in) an LLM call
+        self.online_flight = SingleFlight()
+        self.gemini = self.create_gemini_resolver()
+        
+        # Stale cache entries are refreshed off the request path
+        self.refresh_executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=config.DIAGNOSIS_REFRESH_WORKERS,
+            thread_name_prefix='rag-refresh'
+        )
+        self._refreshing = set()  # (disease, language) being refreshed
+        self._refreshed_at = {}  # (disease, language) -> last refresh attempt
+        self._stats_lock = threading.Lock()
+        self.stats = {
+            'fresh_hits': 0,
+            'stale_hits': 0,
+            'misses': 0,
+            'refreshes': 0,
+            'refresh_failures': 0,
+            'llm_timeouts': 0,
+            'llm_rejected': 0
+        }
+        
+        if config.DIAGNOSIS_CACHE_PREWARM:
+            self.prewarm_cache()
+    
+    def create_gemini_resolver(self):
+        """Gemini model resolver, or None without a Gemini key"""
+        # Configure Gemini - use config value (from .env file)
+        gemini_key = config.GEMINI_API_KEY or config.OPENAI_API_KEY
+        if gemini_key and not gemini_key.startswith('sk-'):  # Not OpenAI key
+            return ModelResolver(GeminiClient(gemini_key))
+        return None
     
     def load_knowledge_base(self):
         """Load local disease knowledge base"""
@@ -37,97 +81,119 @@ def load_knowledge_base(self):
             print(f"❌ Error loading knowledge base: {e}")
             return {}
     
+    def localize(self, diagnosis, language):
+        """
+        Apply a knowledge base entry's translation for a language
+        Translations cover the name and description; other fields stay as they are.
+        """
+        translation = diagnosis.get('translations', {}).get(language)
+        if not translation:
+            return diagnosis
+        
+        localized = dict(diagnosis)
+        if translation.get('description'):
+            localized['description'] = translation['description']
+        if translation.get('name'):
+            localized['local_name'] = translation['name']
+        return localized
+    
+    def prewarm_cache(self, overwrite=False):
+        """
+        Load every knowledge base entry into the diagnosis cache, once per
+        language it has content for (English plus its translations)
+        Existing entries (e.g. richer LLM diagnoses) are kept unless overwrite is set.
+        Returns:
+            int: Entries written
+        """
+        entries = []
+        for disease_name, diagnosis in self.knowledge_base.items():
+            entries.append((disease_name, 'en', diagnosis))
+            for language in diagnosis.get('translations', {}):
+                entries.append((disease_name, language, self.localize(diagnosis, language)))
+        
+        try:
+            written = db_service.prewarm_diagnosis_cache(entries, overwrite=overwrite)
+            if written:
+                print(f"📦 [RAG] Prewarmed diagnosis cache with {written} entries")
+            return written
+        except Exception as e:
+            print(f"⚠️  [RAG] Cache prewarm failed: {e}")
+            return 0
+    
     def get_diagnosis(self, disease_name, language='en', use_cache=True):
         """
-        Get disease diagnosis and treatment
+        Get disease diagnosis and treatment (cache first)
+        
+        A fresh cache entry is returned as is. A stale one (older than the
+        freshness window of its source) is returned too, and an LLM refresh
+        is scheduled in the background. Without online RAG nothing can
+        refresh an entry, so none is reported stale. The LLM is only called
+        on the request path when nothing is stored for the disease at all.
         Args:
             disease_name: Name of the disease
             language: Language code (en, hi, kn)
-            use_cache: Use cached data if available
+            use_cache: Use cached data if available (False asks the LLM first)
         Returns:
             dict: Diagnosis information
         """
-        # PRIORITY 1: Try online RAG FIRST for rich AI-generated content (with 10s timeout)
-        if self.use_online and (config.GEMINI_API_KEY or config.OPENAI_API_KEY):
-            try:
-                print(f"🌐 [RAG] Trying Gemini/OpenAI first for rich AI diagnosis (10s timeout)...")
-                import concurrent.futures
-                
-                # Use ThreadPoolExecutor with 10 second timeout
-                with concurrent.futures.ThreadPoolExecutor() as executor:
-                    future = executor.submit(self.get_online_diagnosis, disease_name, language)
-                    try:
-                        diagnosis = future.result(timeout=60.0)  # 10 second timeout
-                        
-                        # Cache for offline use
-                        db_service.cache_disease(
-                            name=disease_name,
-                            scientific_name=diagnosis.get('scientific_name', ''),
-                            description=diagnosis.get('description', ''),
-                            symptoms=diagnosis.get('symptoms', []),
-                            treatment=diagnosis.get('treatment', {}),
-                            severity=diagnosis.get('severity', 'medium'),
-                            prevention=diagnosis.get('prevention', [])
-                        )
-                        
-                        print(f"✅ [RAG] Got rich AI diagnosis from Gemini/OpenAI!")
-                        return {
-                            'success': True,
-                            'disease': diagnosis,
-                            'source': 'online_llm',
-                            'language': language
-                        }
-                    except concurrent.futures.TimeoutError:
-                        print(f"⏱️  [RAG] Gemini/OpenAI timeout after 10s, falling back to knowledge base...")
-                    
-            except Exception as e:
-                print(f"❌ [RAG] Online diagnosis failed: {e}, falling back to knowledge base...")
-        
-        # PRIORITY 2: Try cache (fast offline support)
+        # PRIORITY 1: Cache (fresh, or stale with a background refresh)
         if use_cache:
-            cached = db_service.get_disease(disease_name)
+            cached = db_service.get_cached_diagnosis(disease_name, language)
             if cached:
-                print(f"📦 [RAG] Using cached diagnosis")
+                # Only stale if it can be revalidated; offline, every entry is current
+                stale = (self.online_available()
+                         and time.time() - cached['created_at'] >= self.freshness(cached['source']))
+                with self._stats_lock:
+                    self.stats['stale_hits' if stale else 'fresh_hits'] += 1
+                if stale:
+                    self.schedule_refresh(disease_name, language)
+                
+                print(f"📦 [RAG] Using {'stale' if stale else 'fresh'} cached diagnosis ({language}, from {cached['source']})")
                 return {
                     'success': True,
-                    'disease': {
-                        'name': cached['name'],
-                        'scientific_name': cached['scientific_name'],
-                        'description': cached['description'],
-                        'symptoms': cached['symptoms'],
-                        'treatment': cached['treatment'],
-                        'prevention': cached['prevention'],
-                        'severity': cached['severity']
-                    },
+                    'disease': cached['diagnosis'],
                     'source': 'cache',
+                    'cache_source': cached['source'],
+                    'stale': stale,
                     'language': language
                 }
+            
+            with self._stats_lock:
+                self.stats['misses'] += 1
+        
+        # PRIORITY 2: Local knowledge base - served now, upgraded by a background refresh
+        if use_cache and disease_name in self.knowledge_base:
+            return self.get_knowledge_base_diagnosis(disease_name, language, refresh=True)
         
-        # PRIORITY 3: Try local knowledge base (offline fallback)
+        # PRIORITY 3: Online RAG for rich AI-generated content (nothing stored yet)
+        if self.online_available():
+            try:
+                print(f"🌐 [RAG] Asking Gemini/OpenAI for rich AI diagnosis ({config.LLM_TIMEOUT:.0f}s timeout)...")
+                diagnosis, shared = self.online_flight.do(
+                    (disease_name, language),
+                    lambda: self.fetch_online_diagnosis(disease_name, language)
+                )
+                
+                if shared:
+                    print(f"✅ [RAG] Shared in-flight AI diagnosis for {disease_name}")
+                else:
+                    print(f"✅ [RAG] Got rich AI diagnosis from Gemini/OpenAI!")
+                return {
+                    'success': True,
+                    'disease': diagnosis,
+                    'source': 'online_llm',
+                    'language': language
+                }
+            except concurrent.futures.TimeoutError:
+                print(f"⏱️  [RAG] Gemini/OpenAI timeout after {config.LLM_TIMEOUT:.0f}s, falling back to knowledge base...")
+            except Exception as e:
+                print(f"❌ [RAG] Online diagnosis failed: {e}, falling back to knowledge base...")
+        
+        # PRIORITY 4: Local knowledge base (offline fallback when the cache was bypassed)
         if disease_name in self.knowledge_base:
-            diagnosis = self.knowledge_base[disease_name]
-            
-            print(f"📚 [RAG] Using local knowledge base")
-            
-            # Cache for offline use
-            db_service.cache_disease(
-                name=disease_name,
-                scientific_name=diagnosis.get('scientific_name', ''),
-                description=diagnosis.get('description', ''),
-                symptoms=diagnosis.get('symptoms', []),
-                treatment=diagnosis.get('treatment', {}),
-                severity=diagnosis.get('severity', 'medium'),
-                prevention=diagnosis.get('prevention', [])
-            )
-            
-            return {
-                'success': True,
-                'disease': diagnosis,
-                'source': 'knowledge_base',
-                'language': language
-            }
+            return self.get_knowledge_base_diagnosis(disease_name, language)
         
-        # PRIORITY 4: No information found anywhere
+        # PRIORITY 5: No information found anywhere
         print(f"❌ [RAG] No information found for: {disease_name}")
         return {
             'success': False,
@@ -136,6 +202,128 @@ def get_diagnosis(self, disease_name, language='en', use_cache=True):
             'source': 'none'
         }
     
+    def get_knowledge_base_diagnosis(self, disease_name, language, refresh=False):
+        """Serve (and cache) the local knowledge base entry, optionally scheduling an LLM refresh"""
+        diagnosis = self.localize(self.knowledge_base[disease_name], language)
+        
+        print(f"📚 [RAG] Using local knowledge base")
+        
+        # Cache for offline use
+        db_service.cache_diagnosis(disease_name, language, diagnosis, source='knowledge_base')
+        if refresh and self.freshness('knowledge_base') <= 0:
+            self.schedule_refresh(disease_name, language)
+        
+        return {
+            'success': True,
+            'disease': diagnosis,
+            'source': 'knowledge_base',
+            'language': language
+        }
+    
+    def online_available(self):
+        """Whether online (LLM) diagnosis is enabled and configured"""
+        return bool(self.use_online and (config.GEMINI_API_KEY or config.OPENAI_API_KEY))
+    
+    def freshness(self, source):
+        """Seconds a cache entry from this source is served without a refresh"""
+        return config.DIAGNOSIS_FRESHNESS.get(source, config.DIAGNOSIS_FRESHNESS['default'])
+    
+    def schedule_refresh(self, disease_name, language):
+        """
+        Refresh a cache entry from the LLM in the background
+        At most one refresh per entry runs at a time, and a failed entry is
+        not retried for DIAGNOSIS_REFRESH_INTERVAL seconds.
+        Returns:
+            bool: True if a refresh was scheduled
+        """
+        if not self.online_available():
+            return False
+        
+        key = (disease_name, language)
+        now = time.time()
+        with self._stats_lock:
+            if key in self._refreshing or now - self._refreshed_at.get(key, 0) < config.DIAGNOSIS_REFRESH_INTERVAL:
+                return False
+            self._refreshing.add(key)
+            self._refreshed_at[key] = now
+            self.stats['refreshes'] += 1
+        
+        self.refresh_executor.submit(self._refresh, disease_name, language)
+        return True
+    
+    def _refresh(self, disease_name, language):
+        """Background worker for schedule_refresh"""
+        key = (disease_name, language)
+        try:
+            self.online_flight.do(key, lambda: self.fetch_online_diagnosis(disease_name, language))
+            print(f"🔄 [RAG] Refreshed cached diagnosis for {disease_name} ({language})")
+        except Exception as e:
+            with self._stats_lock:
+                self.stats['refresh_failures'] += 1
+            print(f"⚠️  [RAG] Background refresh failed for {disease_name} ({language}): {e}")
+        finally:
+            with self._stats_lock:
+                self._refreshing.discard(key)
+    
+    def fetch_online_diagnosis(self, disease_name, language='en'):
+        """
+        Run one LLM diagnosis on the shared pool and cache it for offline use
+        Called through online_flight, so concurrent requests for the same
+        disease and language share a single call.
+        
+        The caller stops waiting after LLM_TIMEOUT, but a worker is only freed
+        when its client call returns; the clients carry the same timeout, so
+        that is bounded too. While every worker is still busy, new calls are
+        rejected at once instead of queueing behind the slow ones.
+        Raises:
+            concurrent.futures.TimeoutError: No answer within LLM_TIMEOUT seconds
+            RuntimeError: All LLM_MAX_CONCURRENCY workers are busy
+        """
+        with self._stats_lock:
+            if self._llm_busy >= config.LLM_MAX_CONCURRENCY:
+                self.stats['llm_rejected'] += 1
+                raise RuntimeError(f"All {config.LLM_MAX_CONCURRENCY} LLM workers are busy")
+            self._llm_busy += 1
+        try:
+            future = self.llm_executor.submit(self.get_online_diagnosis, disease_name, language)
+        except BaseException:
+            self._release_llm_worker()
+            raise
+        future.add_done_callback(self._release_llm_worker)
+        
+        try:
+            diagnosis = future.result(timeout=config.LLM_TIMEOUT)
+        except concurrent.futures.TimeoutError:
+            with self._stats_lock:
+                self.stats['llm_timeouts'] += 1
+            raise
+        
+        # Cache for offline use, under the language it was generated in
+        db_service.cache_diagnosis(
+            disease_name,
+            language,
+            diagnosis,
+            source='online_llm',
+            ttl=config.DIAGNOSIS_CACHE_TTL
+        )
+        return diagnosis
+    
+    def _release_llm_worker(self, future=None):
+        with self._stats_lock:
+            self._llm_busy -= 1
+    
+    def get_stats(self):
+        """Get online diagnosis and cache counters"""
+        with self._stats_lock:
+            stats = dict(self.stats, refreshing=len(self._refreshing), llm_busy=self._llm_busy)
+        return {
+            'online_enabled': bool(self.use_online),
+            'cache': stats,
+            'single_flight': self.online_flight.get_stats(),
+            'gemini': self.gemini.get_stats() if self.gemini else None,
+            'diagnosis_cache': db_service.get_diagnosis_cache_stats()
+        }
+    
     def get_online_diagnosis(self, disease_name, language='en'):
         """
         Get diagnosis from Gemini or OpenAI API
@@ -155,44 +343,9 @@ def get_online_diagnosis(self, disease_name, language='en'):
         
         print(f"🌐 [RAG] Getting diagnosis in {language_name} (code: {language})")
         
-        # Try Gemini first (Google) with model fallback
+        # Try Gemini first (Google) - model resolved once and reused across requests
         try:
-            import google.generativeai as genai
-            
-            # Configure Gemini - use config value (from .env file)
-            gemini_key = config.GEMINI_API_KEY or config.OPENAI_API_KEY
-            
-            if gemini_key and not gemini_key.startswith('sk-'):  # Not OpenAI key
-                genai.configure(api_key=gemini_key)
-                
-                # Try multiple models in order of preference (current available models)
-                primary_models = [
-                    'models/gemini-2.5-flash',
-                    'models/gemini-2.0-flash',
-                    'models/gemini-flash-latest',
-                    'models/gemini-2.5-pro'
-                ]
-                
-                model = None
-                last_error = None
-                
-                # Test each model with a simple prompt
-                for model_name in primary_models:
-                    try:
-                        test_model = genai.GenerativeModel(model_name)
-                        # Quick validation test
-                        test_response = test_model.generate_content('Return token OK').text
-                        if test_response:
-                            model = test_model
-                            print(f"✅ Using Gemini model: {model_name}")
-                            break
-                    except Exception as e:
-                        last_error = e
-                        continue
-                
-                if not model:
-                    raise Exception(f"All Gemini models failed: {last_error}")
-                
+            if self.gemini is not None:
                 prompt = f"""You are a plant pathology expert. Provide detailed information about the plant disease: {disease_name}
 
 🌐 CRITICAL LANGUAGE REQUIREMENT:
@@ -230,8 +383,7 @@ def get_online_diagnosis(self, disease_name, language='en'):
 Example for Hindi: symptoms should be ["पत्तियों पर भूरे धब्बे", "तने में सड़न", ...] not ["symptoms 1", "symptoms 2"]
 Example for Kannada: symptoms should be ["ಎಲೆಗಳ ಮೇಲೆ ಕಂದು ಬಣ್ಣದ ಕಲೆಗಳು", "ಕಾಂಡದಲ್ಲಿ ಕೊಳೆತ", ...] not ["symptoms 1", "symptoms 2"]"""
 
-                response = model.generate_content(prompt)
-                diagnosis_text = response.text
+                diagnosis_text = self.gemini.generate(prompt)
                 
                 # Extract JSON from response (Gemini sometimes adds markdown)
                 if '```json' in diagnosis_text:
@@ -288,7 +440,8 @@ def get_online_diagnosis(self, disease_name, language='en'):
                     {"role": "user", "content": prompt}
                 ],
                 temperature=0.7,
-                max_tokens=1500
+                max_tokens=1500,
+                request_timeout=config.LLM_TIMEOUT
             )
             
             diagnosis_text = response.choices[0].message.content
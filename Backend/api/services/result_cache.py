@@ -0,0 +1,136 @@
+"""
+AgriScan Backend - Detection Result Cache
+LRU + TTL cache of detection results keyed by decoded image content
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+import sys
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from config import config
+
+
+class ResultCache:
+    """
+    Thread-safe LRU cache with per-entry expiry
+
+    Keys hash the decoded pixels, so the same photo re-sent as base64,
+    multipart or raw bytes hits the same entry. Thresholds and the model
+    version are part of the key, so a hot-swapped model never serves
+    results computed by its predecessor.
+    """
+
+    def __init__(self, max_size=None, ttl=None):
+        """
+        Initialize cache
+        Args:
+            max_size: Maximum entries (0 disables the cache, default from config)
+            ttl: Entry lifetime in seconds (default from config)
+        """
+        self.max_size = config.RESULT_CACHE_SIZE if max_size is None else max_size
+        self.ttl = config.RESULT_CACHE_TTL if ttl is None else ttl
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Metrics
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @property
+    def enabled(self):
+        return self.max_size > 0
+
+    @staticmethod
+    def make_key(image, conf, iou, model_version):
+        """
+        Build a cache key from decoded image content and inference settings
+        Args:
+            image: Decoded image (BGR numpy array or PIL Image)
+            conf: Confidence threshold
+            iou: IoU threshold
+            model_version: YOLOModelService.version
+        Returns:
+            str: Hex digest
+        """
+        digest = hashlib.blake2b(digest_size=16)
+
+        if isinstance(image, np.ndarray):
+            pixels = np.ascontiguousarray(image)
+            digest.update(repr(pixels.shape).encode())
+            digest.update(memoryview(pixels).cast('B'))
+        else:
+            digest.update(repr((image.mode, image.size)).encode())
+            digest.update(image.tobytes())
+
+        digest.update(f"|{conf}|{iou}|{model_version}".encode())
+        return digest.hexdigest()
+
+    def get(self, key):
+        """Get a cached value (None on miss or expiry)"""
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, value = entry
+            if expires_at < time.time():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """Store a value, evicting the least recently used entries when full"""
+        if not self.enabled:
+            return
+
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl, value)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Drop all entries"""
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self):
+        """Get size and hit/miss counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0,
+                'evictions': self.evictions,
+                'expirations': self.expirations
+            }
+
+
+# Singleton instance
+result_cache = ResultCache()
@@ -0,0 +1,213 @@
+"""
+AgriScan Backend - Tracking Session Store
+Per-client primary-detection tracking state with bounded, idle-evicting backends
+"""
+
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+import sys
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from config import config
+from utils.motion import MotionGate
+from utils.object_tracker import MultiObjectTracker
+from utils.sliding_window import SlidingWindowCounter
+
+
+class TrackingState:
+    """Tracking state of one client session"""
+
+    def __init__(self):
+        # Class frequencies over the last TRACKING_HISTORY_SIZE frames
+        self.window = SlidingWindowCounter(
+            config.TRACKING_HISTORY_SIZE,
+            confidence_weighted=config.TRACKING_CONFIDENCE_WEIGHTED,
+            half_life=config.TRACKING_HALF_LIFE
+        )
+        # Box tracks (IoU/Kalman) across frames
+        self.tracker = MultiObjectTracker(
+            iou_threshold=config.TRACKER_IOU_THRESHOLD,
+            max_age=config.TRACKER_MAX_AGE,
+            min_hits=config.TRACKER_MIN_HITS
+        )
+        # Last inferred frame, for skipping inference on static frames
+        self.motion_gate = MotionGate()
+
+    def reset(self):
+        """Forget all tracked frames"""
+        self.__init__()
+
+    def __setstate__(self, state):
+        # States pickled by an older TrackingState get defaults for newer fields
+        self.__init__()
+        self.__dict__.update(state)
+
+
+class MemoryTrackingStore:
+    """
+    In-process store (one copy per worker process)
+
+    Holds at most max_sessions sessions in LRU order and drops sessions that
+    have been idle for longer than idle_timeout seconds.
+    """
+
+    def __init__(self, max_sessions=None, idle_timeout=None):
+        self.max_sessions = max_sessions or config.TRACKING_MAX_SESSIONS
+        self.idle_timeout = idle_timeout or config.TRACKING_IDLE_TIMEOUT
+
+        self._sessions = OrderedDict()  # session_id -> (last_seen, lock, state)
+        self._lock = threading.Lock()
+
+    def _evict(self, now):
+        """Drop idle sessions, then the least recently used ones over the limit"""
+        while self._sessions:
+            session_id, (last_seen, _, _) = next(iter(self._sessions.items()))
+            if now - last_seen <= self.idle_timeout and len(self._sessions) <= self.max_sessions:
+                break
+            del self._sessions[session_id]
+
+    @contextmanager
+    def session(self, session_id):
+        """
+        Lock and yield the state of one session (created on first use)
+        Concurrent requests of the same session are serialized.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._sessions.pop(session_id, None)
+            if entry is None:
+                entry = (now, threading.Lock(), TrackingState())
+            _, session_lock, state = entry
+            self._sessions[session_id] = (now, session_lock, state)
+            self._evict(now)
+
+        with session_lock:
+            yield state
+
+    def reset(self, session_id):
+        """Drop one session's state"""
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def get_stats(self):
+        """Get session counts"""
+        with self._lock:
+            return {
+                'backend': 'memory',
+                'sessions': len(self._sessions),
+                'max_sessions': self.max_sessions,
+                'idle_timeout': self.idle_timeout
+            }
+
+
+class SQLiteTrackingStore:
+    """
+    Store shared by every worker process on the host
+
+    Each session is a pickled TrackingState row. A session is read and
+    written back inside one BEGIN IMMEDIATE transaction, so concurrent
+    requests from different workers are serialized on the write lock.
+    A networked key-value store can replace this class by implementing the
+    same session / reset / get_stats interface.
+    """
+
+    def __init__(self, db_path=None, max_sessions=None, idle_timeout=None):
+        self.db_path = Path(db_path or config.TRACKING_DB_PATH)
+        self.max_sessions = max_sessions or config.TRACKING_MAX_SESSIONS
+        self.idle_timeout = idle_timeout or config.TRACKING_IDLE_TIMEOUT
+        self._local = threading.local()
+        self.init_database()
+
+    def get_connection(self):
+        """Get this thread's connection (autocommit; transactions are explicit)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def init_database(self):
+        """Initialize schema"""
+        conn = self.get_connection()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS tracking_sessions (
+                session_id TEXT PRIMARY KEY,
+                state BLOB,
+                last_seen REAL
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_tracking_last_seen ON tracking_sessions(last_seen)')
+        print(f"✅ Tracking store initialized at {self.db_path}")
+
+    def _evict(self, conn, now):
+        """Drop idle sessions and the least recently used ones over the limit"""
+        conn.execute('DELETE FROM tracking_sessions WHERE last_seen < ?', (now - self.idle_timeout,))
+        conn.execute('''
+            DELETE FROM tracking_sessions WHERE session_id IN (
+                SELECT session_id FROM tracking_sessions
+                ORDER BY last_seen DESC LIMIT -1 OFFSET ?
+            )
+        ''', (self.max_sessions,))
+
+    @contextmanager
+    def session(self, session_id):
+        """Load, lock and yield the state of one session; saved when the block exits"""
+        conn = self.get_connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute(
+                'SELECT state FROM tracking_sessions WHERE session_id = ?',
+                (session_id,)
+            ).fetchone()
+            state = pickle.loads(row[0]) if row else TrackingState()
+
+            yield state
+
+            now = time.time()
+            conn.execute(
+                'INSERT OR REPLACE INTO tracking_sessions (session_id, state, last_seen) VALUES (?, ?, ?)',
+                (session_id, pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL), now)
+            )
+            if not row:
+                # Only new sessions can push the table over its limit
+                self._evict(conn, now)
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+    def reset(self, session_id):
+        """Drop one session's state"""
+        self.get_connection().execute('DELETE FROM tracking_sessions WHERE session_id = ?', (session_id,))
+
+    def get_stats(self):
+        """Get session counts"""
+        count = self.get_connection().execute('SELECT COUNT(*) FROM tracking_sessions').fetchone()[0]
+        return {
+            'backend': 'sqlite',
+            'sessions': count,
+            'max_sessions': self.max_sessions,
+            'idle_timeout': self.idle_timeout
+        }
+
+
+def create_tracking_store(backend=None):
+    """Create the tracking store selected by config.TRACKING_STORE"""
+    backend = (backend or config.TRACKING_STORE).lower()
+    if backend == 'sqlite':
+        return SQLiteTrackingStore()
+    if backend != 'memory':
+        print(f"⚠️  Unknown tracking store '{backend}', using memory")
+    return MemoryTrackingStore()
+
+
+# Singleton instance
+tracking_store = create_tracking_store()
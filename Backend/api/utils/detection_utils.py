@@ -0,0 +1,219 @@
+"""
+AgriScan Backend - Detection Utilities
+NumPy helpers for letterbox preprocessing, tiling, box conversion and NMS
+"""
+
+import math
+
+import numpy as np
+import cv2
+
+
+def letterbox(image, new_size=640, color=(114, 114, 114)):
+    """
+    Resize image keeping aspect ratio and pad it to a square (YOLO style)
+    Args:
+        image: HxWx3 uint8 numpy array
+        new_size: Target side length in pixels
+        color: Padding color
+    Returns:
+        tuple: (padded image, scale ratio, (pad_x, pad_y))
+    """
+    height, width = image.shape[:2]
+    ratio = min(new_size / height, new_size / width)
+
+    resized_w = int(round(width * ratio))
+    resized_h = int(round(height * ratio))
+
+    if (resized_w, resized_h) != (width, height):
+        image = cv2.resize(image, (resized_w, resized_h), interpolation=cv2.INTER_LINEAR)
+
+    # Split padding between both sides so the image stays centered
+    pad_x = (new_size - resized_w) / 2
+    pad_y = (new_size - resized_h) / 2
+    top, bottom = int(round(pad_y - 0.1)), int(round(pad_y + 0.1))
+    left, right = int(round(pad_x - 0.1)), int(round(pad_x + 0.1))
+
+    padded = cv2.copyMakeBorder(image, top, bottom, left, right, cv2.BORDER_CONSTANT, value=color)
+    return padded, ratio, (left, top)
+
+
+def xywh_to_xyxy(boxes):
+    """Convert (center x, center y, width, height) boxes to (x1, y1, x2, y2)"""
+    xyxy = np.empty_like(boxes)
+    half_w = boxes[:, 2] / 2
+    half_h = boxes[:, 3] / 2
+    xyxy[:, 0] = boxes[:, 0] - half_w
+    xyxy[:, 1] = boxes[:, 1] - half_h
+    xyxy[:, 2] = boxes[:, 0] + half_w
+    xyxy[:, 3] = boxes[:, 1] + half_h
+    return xyxy
+
+
+def box_iou(boxes_a, boxes_b):
+    """
+    Pairwise IoU between two sets of xyxy boxes
+    Args:
+        boxes_a: (N, 4) array
+        boxes_b: (M, 4) array
+    Returns:
+        (N, M) IoU matrix
+    """
+    area_a = (boxes_a[:, 2] - boxes_a[:, 0]) * (boxes_a[:, 3] - boxes_a[:, 1])
+    area_b = (boxes_b[:, 2] - boxes_b[:, 0]) * (boxes_b[:, 3] - boxes_b[:, 1])
+
+    top_left = np.maximum(boxes_a[:, None, :2], boxes_b[None, :, :2])
+    bottom_right = np.minimum(boxes_a[:, None, 2:], boxes_b[None, :, 2:])
+    wh = np.clip(bottom_right - top_left, 0, None)
+    intersection = wh[..., 0] * wh[..., 1]
+
+    return intersection / np.maximum(area_a[:, None] + area_b[None, :] - intersection, 1e-9)
+
+
+def non_max_suppression(boxes, scores, class_ids=None, iou_threshold=0.45, max_detections=300):
+    """
+    Greedy NMS with a vectorized IoU step
+    Args:
+        boxes: (N, 4) xyxy array
+        scores: (N,) confidence array
+        class_ids: (N,) class array - when given, boxes only suppress boxes of the same class
+        iou_threshold: Overlap above which the lower-scored box is dropped
+        max_detections: Maximum boxes to keep
+    Returns:
+        numpy array: Indices of kept boxes, highest score first
+    """
+    if len(boxes) == 0:
+        return np.empty(0, dtype=np.int64)
+
+    # Offset boxes per class so that different classes never overlap
+    if class_ids is not None:
+        offset = class_ids.astype(boxes.dtype)[:, None] * (boxes.max() + 1)
+        boxes = boxes + offset
+
+    x1, y1, x2, y2 = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+    areas = (x2 - x1) * (y2 - y1)
+    order = scores.argsort()[::-1]
+
+    keep = []
+    while order.size > 0 and len(keep) < max_detections:
+        best = order[0]
+        keep.append(best)
+        rest = order[1:]
+
+        inter_w = np.clip(np.minimum(x2[best], x2[rest]) - np.maximum(x1[best], x1[rest]), 0, None)
+        inter_h = np.clip(np.minimum(y2[best], y2[rest]) - np.maximum(y1[best], y1[rest]), 0, None)
+        intersection = inter_w * inter_h
+        iou = intersection / np.maximum(areas[best] + areas[rest] - intersection, 1e-9)
+
+        order = rest[iou <= iou_threshold]
+
+    return np.array(keep, dtype=np.int64)
+
+
+MAX_TILE_OVERLAP = 0.9
+
+
+def clamp_tile_overlap(overlap):
+    """
+    Tile overlap as actually used for tiling (clamped to MAX_TILE_OVERLAP)
+    Raises:
+        ValueError: Negative or not a number
+    """
+    try:
+        overlap = float(overlap)
+    except (TypeError, ValueError):
+        raise ValueError(f"tile_overlap must be a number, got {overlap!r}")
+    if not overlap >= 0:  # Also rejects NaN
+        raise ValueError(f"tile_overlap must not be negative, got {overlap}")
+    return min(overlap, MAX_TILE_OVERLAP)
+
+
+def _tile_spans(length, tile_size, overlap, count=None):
+    """(start, end) spans of count overlapping tiles covering [0, length)"""
+    if count is None:
+        stride = tile_size * (1 - overlap)
+        count = 1 if length <= tile_size else math.ceil((length - tile_size) / stride) + 1
+    count = max(1, min(int(count), length))
+
+    if count == 1:
+        return np.array([[0, length]])
+
+    size = min(length, math.ceil(length / (count - (count - 1) * overlap)))
+    starts = np.round(np.linspace(0, length - size, count)).astype(int)
+    return np.stack([starts, starts + size], axis=1)
+
+
+def tile_windows(width, height, tile_size=640, overlap=0.2, tiles=None):
+    """
+    Overlapping tile windows covering an image
+    Args:
+        width: Image width in pixels
+        height: Image height in pixels
+        tile_size: Preferred tile side when tiles is None
+        overlap: Fraction of a tile shared with its neighbour (see clamp_tile_overlap)
+        tiles: Tiles per side (None picks enough tiles of about tile_size)
+    Returns:
+        (N, 4) int array of x1, y1, x2, y2 windows, row by row
+    """
+    overlap = clamp_tile_overlap(overlap)
+    x_spans = _tile_spans(width, tile_size, overlap, tiles)
+    y_spans = _tile_spans(height, tile_size, overlap, tiles)
+
+    windows = np.empty((len(y_spans), len(x_spans), 4), dtype=int)
+    windows[..., 0] = x_spans[None, :, 0]
+    windows[..., 2] = x_spans[None, :, 1]
+    windows[..., 1] = y_spans[:, None, 0]
+    windows[..., 3] = y_spans[:, None, 1]
+    return windows.reshape(-1, 4)
+
+
+def format_detections(boxes, scores, class_ids, image_size, class_names):
+    """
+    Build API detection dicts from raw arrays with whole-array operations
+    Args:
+        boxes: (N, 4) xyxy pixel coordinates
+        scores: (N,) confidence scores
+        class_ids: (N,) class indices
+        image_size: (width, height) tuple
+        class_names: List of class names
+    Returns:
+        list: Detections sorted by confidence (highest first)
+    """
+    if len(boxes) == 0:
+        return []
+
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    confidences = np.round(np.asarray(scores, dtype=np.float64), 4)
+    class_ids = np.asarray(class_ids).astype(np.int64)
+
+    # Highest confidence first; stable so ties keep model order
+    order = np.argsort(-confidences, kind='stable')
+    boxes, confidences, class_ids = boxes[order], confidences[order], class_ids[order]
+
+    # Normalized center/size coordinates (0-1) for the Flutter AR overlay
+    img_width, img_height = image_size
+    normalized = np.empty_like(boxes)
+    normalized[:, 0] = (boxes[:, 0] + boxes[:, 2]) / 2 / img_width
+    normalized[:, 1] = (boxes[:, 1] + boxes[:, 3]) / 2 / img_height
+    normalized[:, 2] = (boxes[:, 2] - boxes[:, 0]) / img_width
+    normalized[:, 3] = (boxes[:, 3] - boxes[:, 1]) / img_height
+
+    normalized = np.round(normalized, 4).tolist()
+    pixels = np.round(boxes, 2).tolist()
+    confidences = confidences.tolist()
+    class_ids = class_ids.tolist()
+    num_names = len(class_names)
+
+    return [
+        {
+            'class_id': class_id,
+            'class_name': class_names[class_id] if class_id < num_names else f"Class_{class_id}",
+            'confidence': confidence,
+            'bounding_box': {
+                'x': x, 'y': y, 'width': width, 'height': height,
+                'x1': x1, 'y1': y1, 'x2': x2, 'y2': y2
+            }
+        }
+        for class_id, confidence, (x, y, width, height), (x1, y1, x2, y2)
+        in zip(class_ids, confidences, normalized, pixels)
+    ]
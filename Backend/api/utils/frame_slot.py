@@ -0,0 +1,48 @@
+"""
+AgriScan Backend - Latest-Frame Slot
+Single-slot mailbox for live streams: a new frame replaces the unprocessed one
+"""
+
+import threading
+
+
+class LatestFrameSlot:
+    """
+    Holds at most one pending frame
+
+    The receiver puts every incoming frame; the worker takes the newest one.
+    A frame that arrives while the previous one is still waiting replaces it
+    (and is counted as dropped), so a slow consumer never builds a backlog
+    and end-to-end latency stays bounded to about one inference.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._frame = None
+        self._closed = False
+        self.received = 0
+        self.dropped = 0
+
+    def put(self, frame):
+        """Offer a frame, replacing any frame that has not been taken yet"""
+        with self._condition:
+            if self._frame is not None:
+                self.dropped += 1
+            self._frame = frame
+            self.received += 1
+            self._condition.notify()
+
+    def take(self):
+        """Block until a frame is available; None once the slot is closed"""
+        with self._condition:
+            while self._frame is None and not self._closed:
+                self._condition.wait()
+            frame, self._frame = self._frame, None
+            return frame
+
+    def close(self):
+        """Wake the worker and stop handing out frames"""
+        with self._condition:
+            self._closed = True
+            self._frame = None
+            self._condition.notify_all()
@@ -0,0 +1,134 @@
+"""
+AgriScan Backend - Image Utilities
+Fast image ingestion: decode JPEG/PNG bytes straight into uint8 NumPy buffers
+"""
+
+import binascii
+import struct
+
+import numpy as np
+import cv2
+
+# OpenCV decode flags that downscale by 2/4/8 during decoding (DCT scaling for JPEG)
+_REDUCED_DECODE_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+)
+
+# JPEG start-of-frame markers (carry the image dimensions)
+_JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def decode_base64(image_data):
+    """
+    Decode a base64 string (optionally a data URL) to raw bytes
+    Args:
+        image_data: base64 string, e.g. "data:image/jpeg;base64,/9j/..."
+    Returns:
+        bytes: Encoded image bytes
+    """
+    if image_data.startswith('data:'):
+        image_data = image_data[image_data.find(',') + 1:]
+
+    try:
+        return binascii.a2b_base64(image_data)
+    except (binascii.Error, ValueError) as e:
+        raise ValueError(f"Invalid base64 image data: {e}")
+
+
+def read_image_size(buffer):
+    """
+    Read (width, height) from a JPEG or PNG header without decoding pixels
+    Args:
+        buffer: Encoded image bytes
+    Returns:
+        tuple: (width, height), or None for unsupported/corrupt headers
+    """
+    view = memoryview(buffer)
+
+    # PNG: 8-byte signature, then the IHDR chunk
+    if view[:8] == b'\x89PNG\r\n\x1a\n' and len(view) >= 24:
+        width, height = struct.unpack('>II', view[16:24])
+        return width, height
+
+    # JPEG: walk the marker segments until a start-of-frame
+    if view[:2] != b'\xff\xd8':
+        return None
+
+    offset = 2
+    length = len(view)
+    while offset + 9 < length:
+        if view[offset] != 0xFF:
+            offset += 1
+            continue
+
+        marker = view[offset + 1]
+        if marker in _JPEG_SOF_MARKERS:
+            height, width = struct.unpack('>HH', view[offset + 5:offset + 9])
+            return width, height
+        if marker == 0xFF or 0xD0 <= marker <= 0xD9 or marker == 0x01:
+            # Fill byte or standalone marker (no length field)
+            offset += 1 if marker == 0xFF else 2
+            continue
+
+        segment_length = struct.unpack('>H', view[offset + 2:offset + 4])[0]
+        offset += 2 + segment_length
+
+    return None
+
+
+def reduction_factor(width, height, target_size):
+    """
+    Largest decode-time downscale (1, 2, 4 or 8) that keeps the longest side >= target_size
+    """
+    longest = max(width, height)
+    for factor, _ in _REDUCED_DECODE_FLAGS:
+        if longest // factor >= target_size:
+            return factor
+    return 1
+
+
+def decode_image(buffer, target_size=None):
+    """
+    Decode JPEG/PNG/WebP bytes into a contiguous BGR uint8 array
+
+    When target_size is given and the source is at least twice as large, the
+    image is downscaled while decoding (JPEG is decoded at 1/2, 1/4 or 1/8
+    scale directly), so a 12 MP photo never materializes at full resolution.
+
+    Args:
+        buffer: Encoded image bytes (bytes, bytearray or memoryview)
+        target_size: Model input size; None decodes at full resolution
+    Returns:
+        tuple: (HxWx3 BGR uint8 array, original (width, height))
+    """
+    encoded = np.frombuffer(buffer, dtype=np.uint8)
+    if encoded.size == 0:
+        raise ValueError("Empty image data")
+
+    header_size = read_image_size(buffer)
+
+    flags = cv2.IMREAD_COLOR
+    if target_size and header_size:
+        factor = reduction_factor(header_size[0], header_size[1], target_size)
+        flags = dict(_REDUCED_DECODE_FLAGS).get(factor, cv2.IMREAD_COLOR)
+
+    # Pixels as stored, like the PIL path: box coordinates must not depend on
+    # the EXIF orientation tag (OpenCV would rotate the image by default)
+    image = cv2.imdecode(encoded, flags | cv2.IMREAD_IGNORE_ORIENTATION)
+    if image is None:
+        raise ValueError("Could not decode image bytes")
+
+    if header_size is None:
+        decoded_height, decoded_width = image.shape[:2]
+        return image, (decoded_width, decoded_height)
+
+    return image, header_size
+
+
+def get_image_size(image):
+    """(width, height) of a PIL Image or numpy array"""
+    if isinstance(image, np.ndarray):
+        return image.shape[1], image.shape[0]
+    return image.size
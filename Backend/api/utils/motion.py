@@ -0,0 +1,88 @@
+"""
+AgriScan Backend - Motion Gating
+Cheap frame-difference check that lets continuous mode skip inference on static frames
+"""
+
+import numpy as np
+import cv2
+from PIL import Image
+
+from utils.image_utils import decode_base64
+
+SIGNATURE_SIZE = 32  # Frames are compared as 32x32 grayscale thumbnails
+
+
+def frame_signature(image_data):
+    """
+    Tiny grayscale thumbnail of a frame for motion comparison
+    JPEG frames are decoded at 1/8 scale, so this costs a fraction of a full decode.
+    Args:
+        image_data: base64 string, encoded bytes, PIL Image or BGR numpy array
+    Returns:
+        SIGNATURE_SIZE x SIGNATURE_SIZE float32 array
+    """
+    if isinstance(image_data, (str, bytes, bytearray, memoryview)):
+        buffer = decode_base64(image_data) if isinstance(image_data, str) else image_data
+        gray = cv2.imdecode(np.frombuffer(buffer, dtype=np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_8)
+        if gray is None:
+            raise ValueError("Could not decode image bytes")
+    elif isinstance(image_data, Image.Image):
+        gray = np.asarray(image_data.convert('L'))
+    else:
+        gray = image_data if image_data.ndim == 2 else cv2.cvtColor(image_data, cv2.COLOR_BGR2GRAY)
+
+    thumbnail = cv2.resize(gray, (SIGNATURE_SIZE, SIGNATURE_SIZE), interpolation=cv2.INTER_AREA)
+    return thumbnail.astype(np.float32)
+
+
+def motion_score(previous, current):
+    """
+    Mean absolute pixel change (0 - 255) between two signatures
+    Mean brightness is removed first so auto-exposure drift does not count as motion.
+    """
+    return float(np.abs((current - current.mean()) - (previous - previous.mean())).mean())
+
+
+class MotionGate:
+    """
+    Per-session gate: remembers the last frame that went through the model
+    and its result, and reuses that result while the scene stays still
+
+    Frames are compared with the last inferred frame (not the previous
+    frame), so slow drift still triggers inference once it adds up. After
+    max_skips consecutive skips a frame is inferred anyway.
+    """
+
+    def __init__(self):
+        self.reference = None  # Signature of the last inferred frame
+        self.params = None  # Inference settings the stored result was computed with
+        self.result = None  # Stored result (detections, primary detection, tracks)
+        self.skipped = 0  # Consecutive skipped frames
+
+    def check(self, signature, params, threshold, max_skips):
+        """
+        Decide whether a frame can reuse the stored result
+        Args:
+            signature: frame_signature() of the new frame
+            params: Inference settings of the request (result must match)
+            threshold: Motion score at or below which the frame counts as static
+            max_skips: Consecutive skips allowed before forcing inference
+        Returns:
+            tuple: (stored result or None, motion score or None)
+        """
+        if self.reference is None or self.result is None or params != self.params:
+            return None, None
+
+        score = motion_score(self.reference, signature)
+        if score > threshold or self.skipped >= max_skips:
+            return None, score
+
+        self.skipped += 1
+        return self.result, score
+
+    def remember(self, signature, params, result):
+        """Store an inferred frame as the new reference"""
+        self.reference = signature
+        self.params = params
+        self.result = result
+        self.skipped = 0
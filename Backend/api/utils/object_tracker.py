@@ -0,0 +1,178 @@
+"""
+AgriScan Backend - Multi-Object Tracker
+SORT-style tracking: constant-velocity Kalman filter per box, IoU association
+"""
+
+import numpy as np
+
+from utils.detection_utils import box_iou
+
+# Constant-velocity model over state [cx, cy, w, h, vx, vy, vw, vh] (one step per frame)
+_TRANSITION = np.eye(8)
+_TRANSITION[:4, 4:] = np.eye(4)
+_MEASUREMENT = np.eye(4, 8)
+
+# Noise in normalized image units (boxes are tracked as fractions of the frame)
+_MEASUREMENT_NOISE = np.diag([1e-4, 1e-4, 4e-4, 4e-4])
+_PROCESS_NOISE = np.diag([1e-4, 1e-4, 1e-4, 1e-4, 1e-5, 1e-5, 1e-5, 1e-5])
+_INITIAL_COVARIANCE = np.diag([1e-3, 1e-3, 4e-3, 4e-3, 1e-2, 1e-2, 1e-2, 1e-2])
+
+
+def cxcywh_to_xyxy(boxes):
+    """Convert (center x, center y, width, height) boxes to (x1, y1, x2, y2)"""
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    half = boxes[:, 2:] / 2
+    return np.concatenate([boxes[:, :2] - half, boxes[:, :2] + half], axis=1)
+
+
+class Track:
+    """One tracked object with its Kalman state"""
+
+    def __init__(self, track_id, box, class_id, confidence):
+        """
+        Args:
+            track_id: Persistent ID
+            box: Normalized (cx, cy, w, h) measurement
+            class_id: Detected class
+            confidence: Detection confidence
+        """
+        self.track_id = track_id
+        self.class_id = class_id
+        self.confidence = confidence
+
+        self.state = np.zeros(8)
+        self.state[:4] = box
+        self.covariance = _INITIAL_COVARIANCE.copy()
+
+        self.hits = 1  # Frames with a matched detection
+        self.age = 1  # Frames since the track started
+        self.time_since_update = 0  # Frames since the last matched detection
+
+    @property
+    def box(self):
+        """Smoothed normalized (cx, cy, w, h)"""
+        return self.state[:4]
+
+    def predict(self):
+        """Advance the state by one frame"""
+        self.state = _TRANSITION @ self.state
+        self.state[2:4] = np.maximum(self.state[2:4], 1e-6)
+        self.covariance = _TRANSITION @ self.covariance @ _TRANSITION.T + _PROCESS_NOISE
+        self.age += 1
+        self.time_since_update += 1
+
+    def update(self, box, confidence):
+        """Correct the state with a matched detection"""
+        innovation = box - _MEASUREMENT @ self.state
+        innovation_cov = _MEASUREMENT @ self.covariance @ _MEASUREMENT.T + _MEASUREMENT_NOISE
+        gain = self.covariance @ _MEASUREMENT.T @ np.linalg.inv(innovation_cov)
+
+        self.state = self.state + gain @ innovation
+        self.covariance = (np.eye(8) - gain @ _MEASUREMENT) @ self.covariance
+
+        # Smooth the reported confidence as well
+        self.confidence = 0.7 * self.confidence + 0.3 * confidence
+        self.hits += 1
+        self.time_since_update = 0
+
+
+class MultiObjectTracker:
+    """
+    SORT-style tracker for one client session
+
+    Each frame, every track is advanced by its Kalman filter, detections are
+    matched to predicted boxes of the same class by IoU (one vectorized IoU
+    matrix plus greedy highest-IoU-first assignment), matched tracks are
+    corrected, unmatched detections start new tracks, and tracks unseen for
+    more than max_age frames are dropped.
+    """
+
+    def __init__(self, iou_threshold=0.3, max_age=5, min_hits=3):
+        """
+        Args:
+            iou_threshold: Minimum IoU between a predicted box and a detection to match
+            max_age: Frames a track survives without a matched detection
+            min_hits: Matched frames before a track is reported as confirmed
+        """
+        self.iou_threshold = iou_threshold
+        self.max_age = max_age
+        self.min_hits = min_hits
+        self.tracks = []
+        self._next_id = 1
+
+    def reset(self):
+        """Drop all tracks"""
+        self.tracks = []
+        self._next_id = 1
+
+    def associate(self, detection_boxes, detection_classes):
+        """
+        Match detections to current tracks
+        Args:
+            detection_boxes: (N, 4) normalized cxcywh array
+            detection_classes: (N,) class IDs
+        Returns:
+            list: (track index, detection index) pairs
+        """
+        if not self.tracks or len(detection_boxes) == 0:
+            return []
+
+        track_boxes = np.array([track.box for track in self.tracks])
+        track_classes = np.array([track.class_id for track in self.tracks])
+
+        iou = box_iou(cxcywh_to_xyxy(track_boxes), cxcywh_to_xyxy(detection_boxes))
+        iou[track_classes[:, None] != detection_classes[None, :]] = 0
+
+        # Greedy assignment, highest IoU first
+        rows, cols = np.nonzero(iou >= self.iou_threshold)
+        order = np.argsort(-iou[rows, cols], kind='stable')
+
+        matches = []
+        used_tracks, used_detections = set(), set()
+        for row, col in zip(rows[order], cols[order]):
+            if row in used_tracks or col in used_detections:
+                continue
+            used_tracks.add(row)
+            used_detections.add(col)
+            matches.append((int(row), int(col)))
+        return matches
+
+    def update(self, detections):
+        """
+        Advance all tracks by one frame using this frame's detections
+        Args:
+            detections: Formatted detections (class_id, confidence, normalized bounding_box)
+        Returns:
+            list: (Track, detection index) for tracks matched or started this frame
+        """
+        for track in self.tracks:
+            track.predict()
+
+        boxes = np.array(
+            [[det['bounding_box']['x'], det['bounding_box']['y'],
+              det['bounding_box']['width'], det['bounding_box']['height']] for det in detections],
+            dtype=np.float64
+        ).reshape(-1, 4)
+        classes = np.array([det['class_id'] for det in detections], dtype=np.int64)
+
+        updated = []
+        matched_detections = set()
+        for track_index, det_index in self.associate(boxes, classes):
+            track = self.tracks[track_index]
+            track.update(boxes[det_index], detections[det_index]['confidence'])
+            matched_detections.add(det_index)
+            updated.append((track, det_index))
+
+        for det_index, det in enumerate(detections):
+            if det_index not in matched_detections:
+                track = Track(self._next_id, boxes[det_index], det['class_id'], det['confidence'])
+                self._next_id += 1
+                self.tracks.append(track)
+                updated.append((track, det_index))
+
+        self.tracks = [track for track in self.tracks if track.time_since_update <= self.max_age]
+        return updated
+
+    def is_confirmed(self, track):
+        """Whether a track has been matched often enough to report"""
+        return track.hits >= self.min_hits
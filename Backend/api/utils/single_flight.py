@@ -0,0 +1,88 @@
+"""
+AgriScan Backend - Single-Flight Calls
+Concurrent callers asking for the same key share one in-flight computation
+"""
+
+import threading
+
+
+class _Call:
+    """One in-flight computation and the callers waiting on it"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Duplicate-call suppression
+
+    The first caller for a key (the leader) runs the function; callers that
+    arrive while it is running block until it finishes and receive the same
+    result, or the same exception. Nothing is cached: once the call returns,
+    the next caller for the key starts a fresh one.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}  # key -> _Call
+
+        # Metrics
+        self.executions = 0  # Calls that ran the function
+        self.coalesced = 0  # Calls that waited on another caller's result
+        self.max_waiters = 0  # Most callers ever sharing one execution
+
+    def do(self, key, fn):
+        """
+        Run fn() once for all concurrent callers of key
+        Args:
+            key: Hashable call identity
+            fn: Zero-argument function
+        Returns:
+            tuple: (result, shared) - shared is True for callers that did not run fn
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.coalesced += 1
+                self.max_waiters = max(self.max_waiters, call.waiters)
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self.executions += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+    def get_stats(self):
+        """Get coalescing counters"""
+        with self._lock:
+            in_flight = len(self._calls)
+            waiting = sum(call.waiters for call in self._calls.values())
+        return {
+            'in_flight': in_flight,
+            'waiting': waiting,
+            'executions': self.executions,
+            'coalesced': self.coalesced,
+            'max_waiters': self.max_waiters
+        }
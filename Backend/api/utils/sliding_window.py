@@ -0,0 +1,134 @@
+"""
+AgriScan Backend - Sliding Window Counter
+Incremental class-frequency tracking over the last N frames
+"""
+
+import time
+from collections import Counter, deque
+
+# Rebase decayed weights before 2 ** exponent can overflow a float
+_MAX_DECAY_EXPONENT = 60
+
+
+class SlidingWindowCounter:
+    """
+    Class frequencies over the last window_size frames
+
+    Each add() counts the new frame and subtracts the frame that falls out
+    of the window, so an update costs O(detections per frame) regardless of
+    the window size. Running totals make shares O(1).
+
+    Besides raw occurrence counts the window keeps a weighted score per class:
+    - default: every detection weighs 1 (score == count)
+    - confidence_weighted: a detection weighs its confidence
+    - half_life: weights halve every half_life seconds, so recent frames
+      dominate when frames arrive at an irregular rate
+    """
+
+    def __init__(self, window_size=45, confidence_weighted=False, half_life=None):
+        """
+        Args:
+            window_size: Frames kept in the window
+            confidence_weighted: Weigh detections by their confidence
+            half_life: Seconds for a detection's weight to halve (None disables decay)
+        """
+        self.window_size = window_size
+        self.confidence_weighted = confidence_weighted
+        self.half_life = half_life or None
+        self.reset()
+
+    def reset(self):
+        """Empty the window"""
+        self._frames = deque()  # (class_ids, stored weights) per frame
+        self.counts = Counter()  # Raw occurrences per class
+        self._scores = {}  # Stored (undecayed) weight per class
+        self.total = 0  # Raw occurrences in the window
+        self._total_score = 0.0
+        self._epoch = time.time()  # Reference time of stored decayed weights
+
+    def __len__(self):
+        """Frames currently in the window"""
+        return len(self._frames)
+
+    def _scale(self, timestamp):
+        """Stored-weight multiplier for a detection seen at timestamp"""
+        if not self.half_life:
+            return 1.0
+
+        exponent = (timestamp - self._epoch) / self.half_life
+        if exponent > _MAX_DECAY_EXPONENT:
+            self._rebase(timestamp)
+            exponent = 0.0
+        return 2.0 ** exponent
+
+    def _rebase(self, timestamp):
+        """Move the decay reference time forward, rescaling every stored weight"""
+        factor = 2.0 ** (-(timestamp - self._epoch) / self.half_life)
+        self._frames = deque(
+            (class_ids, tuple(weight * factor for weight in weights))
+            for class_ids, weights in self._frames
+        )
+        self._scores = {class_id: score * factor for class_id, score in self._scores.items()}
+        self._total_score *= factor
+        self._epoch = timestamp
+
+    def add(self, class_ids, confidences=None, timestamp=None):
+        """
+        Add one frame's detections, evicting the oldest frame when the window is full
+        Args:
+            class_ids: Detected class IDs in this frame (may be empty)
+            confidences: Matching confidence scores (used when confidence_weighted)
+            timestamp: Frame time in seconds (default: now; used with half_life)
+        """
+        class_ids = tuple(class_ids)
+        scale = self._scale(time.time() if timestamp is None else timestamp)
+
+        if self.confidence_weighted and confidences is not None:
+            weights = tuple(float(confidence) * scale for confidence in confidences)
+        else:
+            weights = (scale,) * len(class_ids)
+
+        self._frames.append((class_ids, weights))
+        for class_id, weight in zip(class_ids, weights):
+            self.counts[class_id] += 1
+            self._scores[class_id] = self._scores.get(class_id, 0.0) + weight
+        self.total += len(class_ids)
+        self._total_score += sum(weights)
+
+        while len(self._frames) > self.window_size:
+            self._evict()
+
+    def _evict(self):
+        """Subtract the oldest frame"""
+        class_ids, weights = self._frames.popleft()
+        for class_id, weight in zip(class_ids, weights):
+            self.counts[class_id] -= 1
+            if self.counts[class_id] == 0:
+                # Drop the class entirely so float residue cannot linger
+                del self.counts[class_id]
+                del self._scores[class_id]
+            else:
+                self._scores[class_id] -= weight
+        self.total -= len(class_ids)
+        self._total_score = self._total_score - sum(weights) if self.total else 0.0
+
+    def score(self, class_id):
+        """Weighted score of a class, relative to the decay reference time"""
+        return self._scores.get(class_id, 0.0)
+
+    def share(self, class_id):
+        """Fraction (0 - 1) of the window's total weight held by a class"""
+        if self._total_score <= 0:
+            return 0.0
+        return self.score(class_id) / self._total_score
+
+    def most_common(self):
+        """
+        Highest-scoring class in the window
+        Returns:
+            tuple: (class_id, raw occurrence count), or None for an empty window
+        """
+        if not self._scores:
+            return None
+        class_id = max(self._scores, key=self._scores.get)
+        return class_id, self.counts[class_id]
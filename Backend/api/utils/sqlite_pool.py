@@ -0,0 +1,286 @@
+"""
+AgriScan Backend - SQLite Connection Pool
+Reusable WAL-mode connections for the database service
+"""
+
+import queue
+import sqlite3
+import threading
+import time
+
+# Applied to every new connection
+DEFAULT_PRAGMAS = (
+    ('journal_mode', 'WAL'),  # Readers no longer block on writers
+    ('synchronous', 'NORMAL'),  # Durable at checkpoints; no fsync per commit in WAL mode
+    ('cache_size', -16000),  # 16 MB page cache per connection
+    ('temp_store', 'MEMORY'),
+)
+
+# Statements that never take the write lock (WAL readers do not wait on writers)
+_READ_PREFIXES = ('SELECT', 'PRAGMA')
+
+
+def _is_read(sql):
+    return sql.lstrip()[:6].upper() in _READ_PREFIXES
+
+
+def _is_busy(error):
+    """Whether an OperationalError is SQLITE_BUSY (busy_timeout ran out)"""
+    return 'database is locked' in str(error)
+
+
+class TimedCursor(sqlite3.Cursor):
+    """Cursor that reports how long each statement took to its pool"""
+
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        except sqlite3.OperationalError as e:
+            self.connection.pool.record_busy(e)
+            raise
+        finally:
+            self.connection.pool.record_statement(_is_read(sql), time.perf_counter() - start)
+
+    def executemany(self, sql, seq_of_parameters):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        except sqlite3.OperationalError as e:
+            self.connection.pool.record_busy(e)
+            raise
+        finally:
+            self.connection.pool.record_statement(_is_read(sql), time.perf_counter() - start)
+
+
+class TimedConnection(sqlite3.Connection):
+    """
+    sqlite3.Connection whose statements and commits are timed
+
+    A write waits inside busy_timeout until it gets the write lock, so write
+    and commit times include lock waits that the pool's acquire metrics
+    cannot see.
+    """
+
+    pool = None  # Set by SQLitePool._open
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def commit(self):
+        start = time.perf_counter()
+        try:
+            super().commit()
+        except sqlite3.OperationalError as e:
+            self.pool.record_busy(e)
+            raise
+        finally:
+            self.pool.record_statement(False, time.perf_counter() - start)
+
+
+class PooledConnection:
+    """
+    sqlite3.Connection handed out by SQLitePool
+
+    Behaves like the connection it wraps; close() rolls back any unfinished
+    transaction and returns the connection to the pool instead of closing it.
+    """
+
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+
+    def __getattr__(self, name):
+        conn = self.__dict__.get('_conn')
+        if conn is None:
+            raise sqlite3.ProgrammingError('Cannot operate on a closed database.')
+        return getattr(conn, name)
+
+    def close(self):
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            self._pool.release(conn)
+
+    def __enter__(self):
+        return self._conn.__enter__()
+
+    def __exit__(self, *exc):
+        return self._conn.__exit__(*exc)
+
+
+class SQLitePool:
+    """
+    Fixed-size pool of SQLite connections to one database file
+
+    Connections are opened lazily up to size and kept for the life of the
+    process, so pragmas are applied once and each connection's prepared
+    statement cache (cached_statements) is reused across requests. A caller
+    that finds every connection busy waits up to timeout seconds.
+
+    Statements are timed too: reads separately from writes and commits,
+    whose times include waiting for SQLite's write lock, and statements
+    that gave up with "database is locked" are counted.
+    """
+
+    def __init__(self, db_path, size=8, timeout=10.0, busy_timeout_ms=5000,
+                 cached_statements=256, pragmas=DEFAULT_PRAGMAS):
+        """
+        Args:
+            db_path: SQLite database file
+            size: Max open connections
+            timeout: Seconds to wait for a free connection
+            busy_timeout_ms: How long SQLite waits on a locked database
+            cached_statements: Prepared statements kept per connection
+        """
+        self.db_path = db_path
+        self.size = size
+        self.timeout = timeout
+        self.busy_timeout_ms = busy_timeout_ms
+        self.cached_statements = cached_statements
+        self.pragmas = pragmas
+
+        self._idle = queue.LifoQueue()  # Most recently used first (warm caches)
+        self._lock = threading.Lock()
+        self._opened = 0
+
+        # Metrics
+        self.acquisitions = 0
+        self.waits = 0  # Acquisitions that found no idle connection
+        self.wait_time = 0.0
+        self.max_wait = 0.0
+        self._statement_lock = threading.Lock()
+        self.reads = 0
+        self.read_time = 0.0
+        self.writes = 0  # Write statements and commits
+        self.write_time = 0.0
+        self.max_write = 0.0
+        self.busy_errors = 0
+
+    def _open(self):
+        """Open and configure a new connection"""
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.busy_timeout_ms / 1000,
+            check_same_thread=False,  # Used by one thread at a time, but not always the same one
+            cached_statements=self.cached_statements,
+            factory=TimedConnection
+        )
+        conn.pool = self
+        conn.row_factory = sqlite3.Row  # Return rows as dictionaries
+        for name, value in self.pragmas:
+            conn.execute(f'PRAGMA {name}={value}')
+        return conn
+
+    def connection(self):
+        """
+        Get a connection; call close() on it to give it back
+        Returns:
+            PooledConnection
+        """
+        start = time.perf_counter()
+        waited = False
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = None
+            with self._lock:
+                if self._opened < self.size:
+                    self._opened += 1
+                    create = True
+                else:
+                    create = False
+            if create:
+                try:
+                    conn = self._open()
+                except Exception:
+                    with self._lock:
+                        self._opened -= 1
+                    raise
+            else:
+                waited = True
+                try:
+                    conn = self._idle.get(timeout=self.timeout)
+                except queue.Empty:
+                    raise sqlite3.OperationalError(
+                        f'No database connection free after {self.timeout}s (pool size {self.size})'
+                    )
+
+        wait = time.perf_counter() - start
+        with self._lock:
+            self.acquisitions += 1
+            if waited:
+                self.waits += 1
+                self.wait_time += wait
+                self.max_wait = max(self.max_wait, wait)
+        return PooledConnection(self, conn)
+
+    def record_statement(self, read, elapsed):
+        """Add one statement's duration to the metrics"""
+        with self._statement_lock:
+            if read:
+                self.reads += 1
+                self.read_time += elapsed
+            else:
+                self.writes += 1
+                self.write_time += elapsed
+                self.max_write = max(self.max_write, elapsed)
+
+    def record_busy(self, error):
+        """Count a statement that failed because the database stayed locked"""
+        if _is_busy(error):
+            with self._statement_lock:
+                self.busy_errors += 1
+
+    def release(self, conn):
+        """Return a connection to the pool"""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            # Broken connection - drop it so a fresh one is opened next time
+            conn.close()
+            with self._lock:
+                self._opened -= 1
+            return
+        self._idle.put(conn)
+
+    def close_all(self):
+        """Close idle connections (at shutdown)"""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._opened -= 1
+
+    def get_stats(self):
+        """Get pool usage, wait and statement timing metrics"""
+        with self._statement_lock:
+            statements = {
+                'reads': self.reads,
+                'avg_read_ms': round(self.read_time / self.reads * 1000, 3) if self.reads else 0.0,
+                'writes': self.writes,
+                'avg_write_ms': round(self.write_time / self.writes * 1000, 3) if self.writes else 0.0,
+                'max_write_ms': round(self.max_write * 1000, 3),
+                'busy_errors': self.busy_errors
+            }
+        with self._lock:
+            idle = self._idle.qsize()
+            return {
+                'size': self.size,
+                'open': self._opened,
+                'in_use': self._opened - idle,
+                'acquisitions': self.acquisitions,
+                'waits': self.waits,
+                'avg_wait_ms': round(self.wait_time / self.waits * 1000, 3) if self.waits else 0.0,
+                'max_wait_ms': round(self.max_wait * 1000, 3),
+                'statements': statements
+            }
@@ -0,0 +1,118 @@
+"""
+AgriScan - Database Connection Pool Benchmark
+Compares history write throughput of the old connect-per-call,
+rollback-journal database access with the pooled WAL-mode layer
+at 8, 16, 32 and 64 concurrent writers
+
+Each writer saves detections (as /api/detect does with save_history)
+and reads its user's history back every few writes. Runs against
+throwaway database files; the real database is not touched.
+"""
+
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).parent
+sys.path.insert(0, str(BASE_DIR / 'api'))
+
+from config import config
+
+WRITER_COUNTS = [8, 16, 32, 64]
+OPS_PER_WRITER = 100
+READ_EVERY = 5  # One history read per this many writes
+
+DETECTIONS = [{
+    'class_id': 3,
+    'class_name': 'Tomato leaf late blight',
+    'confidence': 0.91,
+    'bounding_box': {'x': 0.5, 'y': 0.5, 'width': 0.2, 'height': 0.3}
+}]
+
+
+def make_service(db_path, pooled):
+    """DatabaseService on a scratch file, pooled or with the old per-call connections"""
+    config.DATABASE_PATH = db_path
+    config.DIAGNOSIS_CACHE_PREWARM = False
+    from services.db_service import DatabaseService
+
+    if pooled:
+        return DatabaseService()
+
+    class LegacyDatabaseService(DatabaseService):
+        """Previous get_connection: new connection per call, default journal mode"""
+
+        def get_connection(self):
+            conn = sqlite3.connect(self.db_path)
+            conn.row_factory = sqlite3.Row
+            return conn
+
+    return LegacyDatabaseService()
+
+
+def run_writers(service, num_writers):
+    """Run num_writers threads to completion; returns (ops/sec, errors)"""
+    errors = []
+    barrier = threading.Barrier(num_writers + 1)
+
+    def writer(index):
+        user_id = f'bench-user-{index}'
+        barrier.wait()
+        for op in range(OPS_PER_WRITER):
+            try:
+                service.save_detection(user_id=user_id, detections=DETECTIONS)
+                if op % READ_EVERY == 0:
+                    service.get_user_history(user_id, limit=20)
+            except Exception as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(num_writers)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    return num_writers * OPS_PER_WRITER / elapsed, len(errors)
+
+
+def run_benchmark():
+    """Run the benchmark and print a comparison table"""
+    print("\n" + "="*70)
+    print("⚡ DATABASE CONNECTION POOL BENCHMARK")
+    print("="*70)
+    print(f"{OPS_PER_WRITER} writes per writer, one history read every {READ_EVERY} writes")
+    print("Write times include waits for SQLite's write lock; Busy = statements that hit busy_timeout\n")
+
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for num_writers in WRITER_COUNTS:
+            legacy = make_service(Path(tmp) / f'legacy_{num_writers}.db', pooled=False)
+            legacy_ops, legacy_errors = run_writers(legacy, num_writers)
+
+            pooled = make_service(Path(tmp) / f'pooled_{num_writers}.db', pooled=True)
+            pooled_ops, pooled_errors = run_writers(pooled, num_writers)
+            stats = pooled.get_stats()
+            pooled.pool.close_all()
+
+            rows.append((num_writers, legacy_ops, legacy_errors, pooled_ops, pooled_errors, stats))
+
+    print(f"{'Writers':<9} {'Legacy (ops/s)':<16} {'Pooled (ops/s)':<16} {'Speedup':<9} "
+          f"{'Errors':<9} {'Pool waits':<11} {'Max wait (ms)':<14} {'Avg write (ms)':<15} "
+          f"{'Max write (ms)':<15} {'Busy':<5}")
+    print("-"*122)
+    for num_writers, legacy_ops, legacy_errors, pooled_ops, pooled_errors, stats in rows:
+        speedup = pooled_ops / legacy_ops if legacy_ops > 0 else float('inf')
+        statements = stats['statements']
+        print(f"{num_writers:<9} {legacy_ops:<16.0f} {pooled_ops:<16.0f} {speedup:<9.1f} "
+              f"{f'{legacy_errors}/{pooled_errors}':<9} {stats['waits']:<11} {stats['max_wait_ms']:<14.1f} "
+              f"{statements['avg_write_ms']:<15.2f} {statements['max_write_ms']:<15.1f} {statements['busy_errors']:<5}")
+
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,169 @@
+"""
+AgriScan - Result Formatting Micro-Benchmark
+Compares the old per-box format_results loop with the vectorized
+formatter at 10, 100 and 1000 boxes
+
+Uses real ultralytics Boxes (torch tensors) when torch/ultralytics are
+installed, otherwise a NumPy stand-in with the same per-box access pattern.
+"""
+
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+BASE_DIR = Path(__file__).parent
+sys.path.insert(0, str(BASE_DIR / 'api'))
+
+from utils.detection_utils import format_detections
+
+LABELS_PATH = BASE_DIR / "api" / "labels.txt"
+IMAGE_SIZE = (1280, 960)
+BOX_COUNTS = [10, 100, 1000]
+REPEATS = 50
+
+
+def load_class_names():
+    """Load class names from labels file"""
+    with open(LABELS_PATH, 'r') as f:
+        return [line.strip() for line in f.readlines()]
+
+
+class _NumpyBox:
+    """Single-box view with the ultralytics per-box attribute layout"""
+
+    def __init__(self, row):
+        self.xyxy = row[None, :4]
+        self.conf = row[None, 4]
+        self.cls = row[None, 5]
+
+
+class _NumpyTensor:
+    """Array wrapper with the torch .cpu().numpy() transfer calls"""
+
+    def __init__(self, array):
+        self.array = array
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self.array
+
+
+class _NumpyBoxes:
+    """Minimal stand-in for ultralytics Boxes"""
+
+    def __init__(self, data):
+        self.rows = data
+        self.data = _NumpyTensor(data)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __iter__(self):
+        return (_NumpyBox(row) for row in self.rows)
+
+
+def make_boxes(num_boxes, num_classes, seed=0):
+    """Random (N, 6) detections: x1, y1, x2, y2, conf, cls"""
+    rng = np.random.default_rng(seed)
+    width, height = IMAGE_SIZE
+    x1 = rng.uniform(0, width * 0.8, num_boxes)
+    y1 = rng.uniform(0, height * 0.8, num_boxes)
+    x2 = x1 + rng.uniform(10, width * 0.2, num_boxes)
+    y2 = y1 + rng.uniform(10, height * 0.2, num_boxes)
+    conf = rng.uniform(0.05, 1.0, num_boxes)
+    cls = rng.integers(0, num_classes, num_boxes)
+    data = np.stack([x1, y1, x2, y2, conf, cls], axis=1).astype(np.float32)
+
+    try:
+        import torch
+        from ultralytics.engine.results import Boxes
+        return Boxes(torch.from_numpy(data), (height, width)), 'ultralytics'
+    except ImportError:
+        return _NumpyBoxes(data), 'numpy'
+
+
+def legacy_format(boxes, image_size, class_names):
+    """Previous YOLOModelService.format_results loop (one box at a time)"""
+    detections = []
+    img_width, img_height = image_size
+
+    for box in boxes:
+        x1, y1, x2, y2 = box.xyxy[0].tolist()
+        x_center = ((x1 + x2) / 2) / img_width
+        y_center = ((y1 + y2) / 2) / img_height
+        width = (x2 - x1) / img_width
+        height = (y2 - y1) / img_height
+        class_id = int(box.cls[0])
+        confidence = float(box.conf[0])
+        class_name = class_names[class_id] if class_id < len(class_names) else f"Class_{class_id}"
+
+        detections.append({
+            'class_id': class_id,
+            'class_name': class_name,
+            'confidence': round(confidence, 4),
+            'bounding_box': {
+                'x': round(x_center, 4),
+                'y': round(y_center, 4),
+                'width': round(width, 4),
+                'height': round(height, 4),
+                'x1': round(x1, 2),
+                'y1': round(y1, 2),
+                'x2': round(x2, 2),
+                'y2': round(y2, 2)
+            }
+        })
+
+    detections.sort(key=lambda x: x['confidence'], reverse=True)
+    return detections
+
+
+def vectorized_format(boxes, image_size, class_names):
+    """Current YOLOModelService.format_results path"""
+    data = boxes.data.cpu().numpy()
+    return format_detections(data[:, :4], data[:, 4], data[:, 5], image_size, class_names)
+
+
+def time_it(fn, *args):
+    """Best-of-REPEATS wall time in milliseconds"""
+    best = float('inf')
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def run_benchmark():
+    """Run the benchmark and print a comparison table"""
+    class_names = load_class_names()
+
+    print("\n" + "="*70)
+    print("⚡ FORMAT_RESULTS MICRO-BENCHMARK")
+    print("="*70)
+
+    rows = []
+    for num_boxes in BOX_COUNTS:
+        boxes, source = make_boxes(num_boxes, len(class_names))
+
+        legacy = legacy_format(boxes, IMAGE_SIZE, class_names)
+        vectorized = vectorized_format(boxes, IMAGE_SIZE, class_names)
+        mismatches = sum(a != b for a, b in zip(legacy, vectorized))
+
+        legacy_ms = time_it(legacy_format, boxes, IMAGE_SIZE, class_names)
+        vectorized_ms = time_it(vectorized_format, boxes, IMAGE_SIZE, class_names)
+        rows.append((num_boxes, legacy_ms, vectorized_ms, mismatches))
+
+    print(f"Boxes source: {source} | best of {REPEATS} runs\n")
+    print(f"{'Boxes':<8} {'Per-box (ms)':<15} {'Vectorized (ms)':<18} {'Speedup':<10} {'Mismatches':<10}")
+    print("-"*65)
+    for num_boxes, legacy_ms, vectorized_ms, mismatches in rows:
+        speedup = legacy_ms / vectorized_ms if vectorized_ms > 0 else float('inf')
+        print(f"{num_boxes:<8} {legacy_ms:<15.3f} {vectorized_ms:<18.3f} {speedup:<10.1f} {mismatches:<10}")
+
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,111 @@
+"""
+AgriScan - History Decode Benchmark
+Time to turn one page of stored history into response records: the old
+eval() of the JSON columns against json.loads and the detection_boxes
+child table that DatabaseService now uses
+
+Runs against a throwaway database file; the real database is not touched.
+"""
+
+import json
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).parent
+sys.path.insert(0, str(BASE_DIR / 'api'))
+
+from config import config
+
+USER_ID = 'bench-user'
+RECORDS = 2_000
+PAGE_SIZE = 50
+DETECTIONS_PER_RECORD = 5
+REPEATS = 20
+
+# Plain JSON diagnosis, as cached by the RAG service
+DIAGNOSIS = {
+    'disease': 'Tomato leaf late blight',
+    'symptoms': ['Dark lesions on leaves', 'White mould on the underside'],
+    'treatment': {'organic': ['Remove infected leaves'], 'chemical': ['Copper fungicide']},
+    'prevention': ['Rotate crops', 'Avoid overhead watering'],
+    'severity': 'high'
+}
+
+
+def make_detections(rng):
+    """Detections in the detector's output format"""
+    detections = []
+    for _ in range(DETECTIONS_PER_RECORD):
+        x1, y1 = rng.uniform(0, 500), rng.uniform(0, 500)
+        x2, y2 = x1 + rng.uniform(10, 100), y1 + rng.uniform(10, 100)
+        detections.append({
+            'class_id': rng.randrange(34),
+            'class_name': 'Tomato leaf late blight',
+            'confidence': round(rng.random(), 4),
+            'bounding_box': {
+                'x': round((x1 + x2) / 1280, 4), 'y': round((y1 + y2) / 1280, 4),
+                'width': round((x2 - x1) / 640, 4), 'height': round((y2 - y1) / 640, 4),
+                'x1': round(x1, 2), 'y1': round(y1, 2), 'x2': round(x2, 2), 'y2': round(y2, 2)
+            }
+        })
+    return detections
+
+
+def time_call(fn):
+    """Best-of-REPEATS wall time in milliseconds"""
+    best = float('inf')
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def run_benchmark():
+    """Run the benchmark and print a comparison table"""
+    print("\n" + "="*70)
+    print("⚡ HISTORY DECODE BENCHMARK")
+    print("="*70)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        config.DATABASE_PATH = Path(tmp) / 'history.db'
+        config.BLOB_STORE_DIR = Path(tmp) / 'blobs'
+        config.DIAGNOSIS_CACHE_PREWARM = False
+        from services.db_service import db_service as service
+
+        rng = random.Random(0)
+        for _ in range(RECORDS):
+            service.save_detection(USER_ID, make_detections(rng), diagnosis=DIAGNOSIS)
+
+        # The same page as the old endpoint saw it: JSON text columns
+        records = service.get_user_history(USER_ID, PAGE_SIZE)
+        stored = [dict(r, detections=json.dumps(r['detections']), diagnosis=json.dumps(r['diagnosis']))
+                  for r in records]
+
+        def decode(parse):
+            for record in stored:
+                parse(record['detections'])
+                parse(record['diagnosis'])
+
+        # eval() cannot even read every record json.dumps writes (true/false/null)
+        results = {
+            'eval() of JSON columns': time_call(lambda: decode(eval)),
+            'json.loads of JSON columns': time_call(lambda: decode(json.loads)),
+            'read_history (query + decode)': time_call(lambda: service.get_user_history(USER_ID, PAGE_SIZE)),
+            'read_history, fields=id,timestamp': time_call(
+                lambda: service.get_user_history(USER_ID, PAGE_SIZE, fields=['id', 'timestamp'])),
+        }
+        service.pool.close_all()
+
+    print(f"Page size {PAGE_SIZE} | {DETECTIONS_PER_RECORD} detections per record | best of {REPEATS} runs\n")
+    print(f"{'Method':<40} {'Page (ms)':<10}")
+    print("-"*52)
+    for name, elapsed in results.items():
+        print(f"{name:<40} {elapsed:<10.2f}")
+
+
+if __name__ == "__main__":
+    run_benchmark()
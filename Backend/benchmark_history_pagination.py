@@ -0,0 +1,138 @@
+"""
+AgriScan - History Pagination Benchmark
+Per-page latency of /api/history queries on 1M synthetic detections,
+comparing the old OFFSET query (without and with the history index)
+against keyset pagination at increasing page depths
+
+Runs against a throwaway database file; the real database is not touched.
+"""
+
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+BASE_DIR = Path(__file__).parent
+sys.path.insert(0, str(BASE_DIR / 'api'))
+
+from config import config
+
+TOTAL_ROWS = 1_000_000
+HEAVY_USER = 'bench-heavy-user'
+HEAVY_USER_ROWS = 200_000  # The rest is spread over other users
+OTHER_USERS = 5_000
+PAGE_SIZE = 50
+DEPTHS = [0, 1_000, 10_000, 50_000, 100_000, 199_000]  # Rows skipped before the page
+REPEATS = 5
+
+OFFSET_QUERY = '''
+    SELECT id, user_id, image_path, detections, diagnosis, timestamp, location, notes
+    FROM detections WHERE user_id = ?
+    ORDER BY timestamp DESC LIMIT ? OFFSET ?
+'''
+
+
+def populate(db_path):
+    """Create the baseline detections table and fill it with synthetic rows"""
+    conn = sqlite3.connect(db_path)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=OFF')
+    conn.execute('''
+        CREATE TABLE detections (
+            id TEXT PRIMARY KEY,
+            user_id TEXT,
+            image_path TEXT,
+            image_base64 TEXT,
+            detections TEXT,
+            diagnosis TEXT,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            location TEXT,
+            notes TEXT
+        )
+    ''')
+
+    rng = random.Random(0)
+    start = datetime(2025, 1, 1)
+    detections = '[{"class_id": 3, "class_name": "Tomato leaf late blight", "confidence": 0.91}]'
+
+    def rows():
+        for i in range(TOTAL_ROWS):
+            user_id = HEAVY_USER if i % (TOTAL_ROWS // HEAVY_USER_ROWS) == 0 else f'user-{rng.randrange(OTHER_USERS)}'
+            # Second-resolution timestamps, so ties between rows are common
+            timestamp = (start + timedelta(seconds=i // 3)).strftime('%Y-%m-%d %H:%M:%S')
+            yield (f'{i:08d}-{rng.getrandbits(32):08x}', user_id, detections, timestamp)
+
+    conn.executemany(
+        'INSERT INTO detections (id, user_id, detections, timestamp) VALUES (?, ?, ?, ?)',
+        rows()
+    )
+    conn.commit()
+    conn.close()
+
+
+def time_query(fn):
+    """Best-of-REPEATS wall time in milliseconds"""
+    best = float('inf')
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def offset_page(conn, depth):
+    return conn.execute(OFFSET_QUERY, (HEAVY_USER, PAGE_SIZE, depth)).fetchall()
+
+
+def run_benchmark():
+    """Run the benchmark and print a comparison table"""
+    print("\n" + "="*70)
+    print("⚡ HISTORY PAGINATION BENCHMARK")
+    print("="*70)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / 'history.db'
+        print(f"Creating {TOTAL_ROWS:,} detections ({HEAVY_USER_ROWS:,} for one user)...")
+        start = time.time()
+        populate(db_path)
+        print(f"  done in {time.time() - start:.1f}s\n")
+
+        # Old schema: no index on user_id / timestamp
+        conn = sqlite3.connect(db_path)
+        no_index = {depth: time_query(lambda: offset_page(conn, depth)) for depth in DEPTHS}
+        conn.close()
+
+        # Current schema: DatabaseService applies the migrations (history index)
+        config.DATABASE_PATH = db_path
+        config.DIAGNOSIS_CACHE_PREWARM = False
+        from services.db_service import db_service as service
+
+        conn = sqlite3.connect(db_path)
+        with_index = {depth: time_query(lambda: offset_page(conn, depth)) for depth in DEPTHS}
+
+        # Cursor positioned after `depth` rows (found outside the timed section)
+        keyset = {}
+        for depth in DEPTHS:
+            cursor = None
+            if depth:
+                _, cursor = service.get_user_history_page(HEAVY_USER, limit=depth)
+            records = service.get_user_history_page(HEAVY_USER, PAGE_SIZE, cursor)[0]
+            assert [r['id'] for r in records] == [r[0] for r in conn.execute(
+                'SELECT id FROM detections WHERE user_id = ? ORDER BY timestamp DESC, id DESC LIMIT ? OFFSET ?',
+                (HEAVY_USER, PAGE_SIZE, depth))], "keyset page differs from OFFSET page"
+            keyset[depth] = time_query(lambda: service.get_user_history_page(HEAVY_USER, PAGE_SIZE, cursor))
+        conn.close()
+        service.pool.close_all()
+
+    print(f"Page size {PAGE_SIZE} | best of {REPEATS} runs\n")
+    print(f"{'Depth':<10} {'OFFSET, no index (ms)':<23} {'OFFSET, index (ms)':<20} {'Keyset (ms)':<12}")
+    print("-"*67)
+    for depth in DEPTHS:
+        print(f"{depth:<10,} {no_index[depth]:<23.2f} {with_index[depth]:<20.2f} {keyset[depth]:<12.2f}")
+
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,123 @@
+"""
+AgriScan - History Write Benchmark
+Time a /api/detect request spends saving history: synchronous
+save_detection (one commit per request) against the write-behind
+HistoryWriter, with and without durable (fsync) mode, from concurrent
+request threads
+
+Runs against a throwaway database file; the real database is not touched.
+"""
+
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+BASE_DIR = Path(__file__).parent
+sys.path.insert(0, str(BASE_DIR / 'api'))
+
+from config import config
+
+THREADS = 8
+REQUESTS_PER_THREAD = 100
+
+DETECTIONS = [{
+    'class_id': 3,
+    'class_name': 'Tomato leaf late blight',
+    'confidence': 0.91,
+    'bounding_box': {'x': 0.5, 'y': 0.5, 'width': 0.2, 'height': 0.3,
+                     'x1': 256.0, 'y1': 160.0, 'x2': 384.0, 'y2': 256.0}
+}]
+
+
+def make_images(count):
+    """Distinct small JPEGs, so every save writes a new blob"""
+    rng = np.random.default_rng(0)
+    base = rng.integers(0, 255, (240, 320, 3), dtype=np.uint8)
+    images = []
+    for i in range(count):
+        base[0, 0, 0] = i % 256
+        base[0, 1, 0] = i // 256
+        images.append(cv2.imencode('.jpg', base)[1].tobytes())
+    return images
+
+
+def run_clients(save, images):
+    """Call save() from THREADS threads; returns per-call latencies (ms)"""
+    latencies = []
+    lock = threading.Lock()
+
+    def client(offset):
+        mine = []
+        for i in range(REQUESTS_PER_THREAD):
+            start = time.perf_counter()
+            save(str(uuid.uuid4()), images[offset + i])
+            mine.append((time.perf_counter() - start) * 1000)
+        with lock:
+            latencies.extend(mine)
+
+    threads = [threading.Thread(target=client, args=(t * REQUESTS_PER_THREAD,)) for t in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies
+
+
+def run_benchmark():
+    """Run the benchmark and print a comparison table"""
+    print("\n" + "="*70)
+    print("⚡ HISTORY WRITE BENCHMARK")
+    print("="*70)
+
+    total = THREADS * REQUESTS_PER_THREAD
+    with tempfile.TemporaryDirectory() as tmp:
+        config.DATABASE_PATH = Path(tmp) / 'history.db'
+        config.BLOB_STORE_DIR = Path(tmp) / 'blobs'
+        config.DIAGNOSIS_CACHE_PREWARM = False
+        from services.db_service import db_service
+        from services.history_writer import HistoryWriter
+
+        def synchronous(detection_id, image):
+            db_service.save_detection('bench-user', DETECTIONS, image_base64=image, detection_id=detection_id)
+
+        modes = {'Synchronous save_detection': (synchronous, None)}
+        for name, durable in (('Write-behind', False), ('Write-behind, durable (fsync)', True)):
+            writer = HistoryWriter(durable=durable)
+            modes[name] = (lambda detection_id, image, writer=writer: writer.save(
+                detection_id, 'bench-user', DETECTIONS, image_base64=image), writer)
+
+        results = {}
+        for name, (save, writer) in modes.items():
+            images = make_images(total)
+            start = time.perf_counter()
+            latencies = run_clients(save, images)
+            if writer:
+                writer.flush()  # Throughput counts the time until everything is committed
+            wall = time.perf_counter() - start
+            if writer:
+                writer.close()
+            results[name] = (latencies, wall, writer.get_stats()['avg_batch_size'] if writer else 1)
+
+        saved = db_service.get_connection()
+        count = saved.execute('SELECT COUNT(*) FROM detections').fetchone()[0]
+        saved.close()
+        db_service.pool.close_all()
+
+    print(f"{THREADS} threads x {REQUESTS_PER_THREAD} saves | {count:,} rows written\n")
+    print(f"{'Mode':<32} {'p50 (ms)':<10} {'p99 (ms)':<10} {'Saves/s':<10} {'Avg batch':<10}")
+    print("-"*74)
+    for name, (latencies, wall, avg_batch) in results.items():
+        p99 = statistics.quantiles(latencies, n=100)[98]
+        print(f"{name:<32} {statistics.median(latencies):<10.2f} {p99:<10.2f} "
+              f"{total / wall:<10.0f} {avg_batch:<10.1f}")
+
+
+if __name__ == "__main__":
+    run_benchmark()
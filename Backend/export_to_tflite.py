@@ -39,7 +39,8 @@ def export_model_to_onnx():
             format='onnx',
             imgsz=640,
             simplify=True,  # Simplify for better mobile performance
-            opset=12  # ONNX opset version (12 is widely supported)
+            opset=12,  # ONNX opset version (12 is widely supported)
+            dynamic=True  # Dynamic batch axis, so the server's ONNX backend runs real batches
         )
         
         print(f"\n✅ ONNX export successful!")
@@ -0,0 +1,65 @@
+"""
+AgriScan - Migrate History Images to the Blob Store
+Moves images stored inline in detections.image_base64 into the
+content-addressed blob store (data/uploads/blobs) and keeps only their hash
+
+Safe to re-run: migrated rows no longer carry image_base64, and identical
+images are stored once.
+
+Usage:
+    python migrate_images_to_blobs.py [--batch-size 100] [--vacuum]
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).parent
+sys.path.insert(0, str(BASE_DIR / 'api'))
+
+from config import config
+
+# Migration only needs the database, not the knowledge base import
+config.DIAGNOSIS_CACHE_PREWARM = False
+
+from services.db_service import db_service
+
+
+def migrate(batch_size, vacuum):
+    """Run the migration and print a summary"""
+    print("\n" + "="*60)
+    print("MIGRATING HISTORY IMAGES TO THE BLOB STORE")
+    print("="*60)
+    print(f"📁 Database:   {config.DATABASE_PATH}")
+    print(f"📁 Blob store: {config.BLOB_STORE_DIR}")
+
+    size_before = Path(config.DATABASE_PATH).stat().st_size
+    start = time.time()
+    stats = db_service.migrate_images_to_blobs(batch_size=batch_size)
+    elapsed = time.time() - start
+
+    print(f"\n✅ Migrated {stats['migrated']} images in {elapsed:.1f}s "
+          f"({stats['bytes_moved'] / 1e6:.1f} MB of base64 moved out of the database)")
+    if stats['failed']:
+        print(f"⚠️  {stats['failed']} rows had undecodable images and were left as they are")
+
+    if vacuum:
+        # Reclaim the freed pages; needs exclusive access to the database
+        print("\n🧹 Running VACUUM...")
+        conn = db_service.get_connection()
+        try:
+            conn.execute('VACUUM')
+        finally:
+            conn.close()
+        size_after = Path(config.DATABASE_PATH).stat().st_size
+        print(f"  ✅ Database size: {size_before / 1e6:.1f} MB -> {size_after / 1e6:.1f} MB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move inline history images into the blob store")
+    parser.add_argument('--batch-size', type=int, default=100, help="Rows per transaction")
+    parser.add_argument('--vacuum', action='store_true', help="VACUUM the database afterwards")
+    args = parser.parse_args()
+
+    migrate(args.batch_size, args.vacuum)
@@ -0,0 +1,376 @@
+"""
+AgriScan - INT8 Quantization for CPU Serving
+Calibrates the exported ONNX detector, produces a static INT8 model and
+reports the accuracy delta (mAP50, per-class AP50) against the FP32 model
+
+Run export_to_tflite.py first to create models/onnx_export/agriscan_model.onnx
+(quantization also needs the onnx package). Serve the result with
+INFERENCE_BACKEND=onnx-int8. The INT8 model keeps the FP32 model's batch
+axis: quantize a dynamic-batch export, or the server runs batches image by
+image.
+"""
+
+import json
+import sys
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+from PIL import Image
+
+# Make the API services importable (shared preprocessing/NMS with the server)
+BASE_DIR = Path(__file__).parent
+sys.path.insert(0, str(BASE_DIR / 'api'))
+
+from services.onnx_backend import ONNXDetector
+from utils.detection_utils import box_iou
+
+# Paths
+FP32_MODEL_PATH = BASE_DIR / "models" / "onnx_export" / "agriscan_model.onnx"
+INT8_MODEL_PATH = BASE_DIR / "models" / "onnx_export" / "agriscan_model_int8.onnx"
+CALIBRATION_NPY = BASE_DIR.parent / "calibration_image_sample_data_20x128x128x3_float32.npy"
+VAL_DIR = BASE_DIR / "unified_dataset" / "val"
+LABELS_PATH = BASE_DIR / "api" / "labels.txt"
+OUTPUT_DIR = BASE_DIR / "model_metrics"
+
+# Calibration: 'npy' (shipped sample data) or 'dataset' (unified_dataset/val images)
+CALIBRATION_SOURCE = 'npy'
+CALIBRATION_MAX_IMAGES = 200
+
+# Evaluation settings (low confidence threshold, as for mAP computation in ultralytics val)
+EVAL_CONFIDENCE = 0.001
+EVAL_IOU = 0.6
+MATCH_IOU = 0.5
+EVAL_MAX_IMAGES = None  # None = whole validation split
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp', '.bmp'}
+
+
+def load_class_names():
+    """Load class names from labels file"""
+    with open(LABELS_PATH, 'r') as f:
+        return [line.strip() for line in f.readlines()]
+
+
+def list_val_images(max_images=None):
+    """List validation images that have a label file"""
+    images_dir = VAL_DIR / "images"
+    if not images_dir.exists():
+        return []
+
+    images = sorted(p for p in images_dir.iterdir() if p.suffix.lower() in IMAGE_EXTENSIONS)
+    return images[:max_images] if max_images else images
+
+
+def load_calibration_images():
+    """
+    Load calibration images
+    Returns:
+        list: PIL Images (npy source) or BGR arrays (dataset source)
+    """
+    if CALIBRATION_SOURCE == 'dataset':
+        paths = list_val_images(CALIBRATION_MAX_IMAGES)
+        if not paths:
+            raise FileNotFoundError(f"No calibration images found in {VAL_DIR / 'images'}")
+        return [cv2.imread(str(p)) for p in paths]
+
+    if not CALIBRATION_NPY.exists():
+        raise FileNotFoundError(f"Calibration data not found: {CALIBRATION_NPY}")
+
+    # N x H x W x 3 float32 RGB in [0, 1]
+    samples = np.load(CALIBRATION_NPY)
+    return [Image.fromarray((sample * 255).clip(0, 255).astype(np.uint8)) for sample in samples]
+
+
+def make_calibration_reader(detector, images):
+    """Build an onnxruntime CalibrationDataReader using the serving letterbox"""
+    from onnxruntime.quantization import CalibrationDataReader
+
+    class LetterboxCalibrationReader(CalibrationDataReader):
+        def __init__(self):
+            self.tensors = iter([detector.preprocess(image)[0][None] for image in images])
+
+        def get_next(self):
+            tensor = next(self.tensors, None)
+            return None if tensor is None else {detector.input_name: tensor}
+
+    return LetterboxCalibrationReader()
+
+
+def detect_head_nodes(model_path):
+    """
+    Names of the detection-head nodes to keep in FP32
+
+    The YOLOv8 output concatenates box coordinates (0-640) and class scores
+    (0-1) in one tensor, so quantizing the head with a single scale wipes out
+    the scores. Everything under the module that produces the output
+    (e.g. '/model.22/') is excluded from quantization.
+    """
+    import onnx
+
+    graph = onnx.load(str(model_path)).graph
+    output_names = {output.name for output in graph.output}
+    output_nodes = [node for node in graph.node if output_names & set(node.output)]
+    if not output_nodes:
+        return []
+
+    head_name = output_nodes[0].name
+    parts = head_name.split('/')
+    if len(parts) < 3:
+        return [node.name for node in output_nodes if node.name]
+
+    prefix = '/'.join(parts[:2]) + '/'
+    return [node.name for node in graph.node if node.name.startswith(prefix)]
+
+
+def quantize_model():
+    """Produce the static INT8 model"""
+    from onnxruntime.quantization import (
+        CalibrationMethod, QuantFormat, QuantType, quantize_static
+    )
+
+    print("\n" + "="*70)
+    print("⚙️  STATIC INT8 QUANTIZATION")
+    print("="*70)
+
+    if not FP32_MODEL_PATH.exists():
+        print(f"❌ FP32 model not found: {FP32_MODEL_PATH}")
+        print("   Run export_to_tflite.py first")
+        return False
+
+    detector = ONNXDetector(FP32_MODEL_PATH)
+    if not detector.dynamic_batch:
+        print("⚠️  The FP32 model has a static batch axis, so the INT8 model will too")
+        print("   Re-run export_to_tflite.py (exports with dynamic=True) before quantizing")
+    images = load_calibration_images()
+    print(f"📥 Calibration source: {CALIBRATION_SOURCE} ({len(images)} images)")
+
+    # Shape inference + graph cleanup recommended before static quantization
+    model_input = FP32_MODEL_PATH
+    preprocessed_path = FP32_MODEL_PATH.with_name("agriscan_model_preprocessed.onnx")
+    try:
+        from onnxruntime.quantization.shape_inference import quant_pre_process
+        quant_pre_process(str(FP32_MODEL_PATH), str(preprocessed_path))
+        model_input = preprocessed_path
+    except Exception as e:
+        print(f"⚠️  Pre-processing skipped: {e}")
+
+    excluded = detect_head_nodes(model_input)
+    print(f"🔒 Keeping {len(excluded)} detection-head nodes in FP32")
+
+    print("🔄 Calibrating and quantizing (QDQ, per-channel weights)...")
+    quantize_static(
+        str(model_input),
+        str(INT8_MODEL_PATH),
+        make_calibration_reader(detector, images),
+        quant_format=QuantFormat.QDQ,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+        per_channel=True,
+        calibrate_method=CalibrationMethod.MinMax,
+        nodes_to_exclude=excluded
+    )
+
+    if preprocessed_path.exists():
+        preprocessed_path.unlink()
+
+    fp32_mb = FP32_MODEL_PATH.stat().st_size / (1024 * 1024)
+    int8_mb = INT8_MODEL_PATH.stat().st_size / (1024 * 1024)
+    print(f"✅ INT8 model saved: {INT8_MODEL_PATH}")
+    print(f"   Size: {fp32_mb:.2f} MB -> {int8_mb:.2f} MB")
+    return True
+
+
+def load_ground_truth(image_path, width, height):
+    """
+    Load YOLO-format labels for an image
+    Returns:
+        tuple: (boxes xyxy in pixels, class_ids)
+    """
+    label_path = VAL_DIR / "labels" / f"{image_path.stem}.txt"
+    if not label_path.exists():
+        return np.zeros((0, 4)), np.zeros(0, dtype=int)
+
+    rows = np.loadtxt(label_path, ndmin=2)
+    if rows.size == 0:
+        return np.zeros((0, 4)), np.zeros(0, dtype=int)
+
+    class_ids = rows[:, 0].astype(int)
+    cx, cy, w, h = rows[:, 1] * width, rows[:, 2] * height, rows[:, 3] * width, rows[:, 4] * height
+    boxes = np.stack([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], axis=1)
+    return boxes, class_ids
+
+
+def compute_ap(recall, precision):
+    """Average precision from a PR curve (101-point interpolation, COCO style)"""
+    mrec = np.concatenate(([0.0], recall, [1.0]))
+    mpre = np.concatenate(([1.0], precision, [0.0]))
+    mpre = np.flip(np.maximum.accumulate(np.flip(mpre)))
+
+    x = np.linspace(0, 1, 101)
+    return float(np.trapz(np.interp(x, mrec, mpre), x))
+
+
+def evaluate(model_path, images, num_classes):
+    """
+    Evaluate an ONNX model on the validation images
+    Returns:
+        dict: mAP50, per-class AP50 and mean latency
+    """
+    detector = ONNXDetector(model_path)
+
+    # Per class: list of (score, is_true_positive) and number of GT boxes
+    predictions = {cls: [] for cls in range(num_classes)}
+    gt_counts = np.zeros(num_classes, dtype=int)
+    latencies = []
+
+    for image_path in images:
+        image = cv2.imread(str(image_path))
+        if image is None:
+            continue
+        height, width = image.shape[:2]
+        gt_boxes, gt_classes = load_ground_truth(image_path, width, height)
+        np.add.at(gt_counts, gt_classes[gt_classes < num_classes], 1)
+
+        start = time.time()
+        boxes, scores, class_ids = detector.predict([image], conf=EVAL_CONFIDENCE, iou=EVAL_IOU)[0]
+        latencies.append(time.time() - start)
+
+        for cls in np.unique(class_ids):
+            pred_mask = class_ids == cls
+            cls_boxes, cls_scores = boxes[pred_mask], scores[pred_mask]
+            order = cls_scores.argsort()[::-1]
+            cls_boxes, cls_scores = cls_boxes[order], cls_scores[order]
+
+            cls_gt = gt_boxes[gt_classes == cls]
+            matched = np.zeros(len(cls_gt), dtype=bool)
+            ious = box_iou(cls_boxes, cls_gt) if len(cls_gt) else np.zeros((len(cls_boxes), 0))
+
+            # Greedy matching, highest score first
+            for i, score in enumerate(cls_scores):
+                is_tp = False
+                if ious.shape[1]:
+                    candidates = np.where((ious[i] >= MATCH_IOU) & ~matched)[0]
+                    if len(candidates):
+                        best = candidates[ious[i, candidates].argmax()]
+                        matched[best] = True
+                        is_tp = True
+                if int(cls) < num_classes:
+                    predictions[int(cls)].append((float(score), is_tp))
+
+    per_class = {}
+    for cls in range(num_classes):
+        if gt_counts[cls] == 0:
+            continue
+        entries = sorted(predictions[cls], key=lambda e: e[0], reverse=True)
+        tp = np.array([e[1] for e in entries], dtype=float)
+        if len(tp) == 0:
+            per_class[cls] = 0.0
+            continue
+        tp_cum = np.cumsum(tp)
+        fp_cum = np.cumsum(1 - tp)
+        recall = tp_cum / gt_counts[cls]
+        precision = tp_cum / (tp_cum + fp_cum)
+        per_class[cls] = compute_ap(recall, precision)
+
+    return {
+        'map50': float(np.mean(list(per_class.values()))) if per_class else 0.0,
+        'per_class_ap50': per_class,
+        'gt_counts': gt_counts,
+        'mean_latency_ms': float(np.mean(latencies) * 1000) if latencies else 0.0
+    }
+
+
+def write_accuracy_report():
+    """Compare FP32 and INT8 models and write the accuracy-delta report"""
+    print("\n" + "="*70)
+    print("📊 ACCURACY DELTA: FP32 vs INT8")
+    print("="*70)
+
+    images = list_val_images(EVAL_MAX_IMAGES)
+    if not images:
+        print(f"❌ No validation images found in {VAL_DIR / 'images'}")
+        return False
+
+    class_names = load_class_names()
+    print(f"📁 Validation images: {len(images)}")
+
+    print("🔄 Evaluating FP32 model...")
+    fp32 = evaluate(FP32_MODEL_PATH, images, len(class_names))
+    print("🔄 Evaluating INT8 model...")
+    int8 = evaluate(INT8_MODEL_PATH, images, len(class_names))
+
+    per_class = []
+    for cls, fp32_ap in fp32['per_class_ap50'].items():
+        int8_ap = int8['per_class_ap50'].get(cls, 0.0)
+        per_class.append({
+            'class_id': cls,
+            'class': class_names[cls],
+            'instances': int(fp32['gt_counts'][cls]),
+            'fp32_ap50': round(fp32_ap, 4),
+            'int8_ap50': round(int8_ap, 4),
+            'delta': round(int8_ap - fp32_ap, 4)
+        })
+
+    report = {
+        'fp32_model': str(FP32_MODEL_PATH.name),
+        'int8_model': str(INT8_MODEL_PATH.name),
+        'calibration_source': CALIBRATION_SOURCE,
+        'validation_images': len(images),
+        'map50': {
+            'fp32': round(fp32['map50'], 4),
+            'int8': round(int8['map50'], 4),
+            'delta': round(int8['map50'] - fp32['map50'], 4)
+        },
+        'latency_ms': {
+            'fp32': round(fp32['mean_latency_ms'], 2),
+            'int8': round(int8['mean_latency_ms'], 2)
+        },
+        'model_size_mb': {
+            'fp32': round(FP32_MODEL_PATH.stat().st_size / (1024 * 1024), 2),
+            'int8': round(INT8_MODEL_PATH.stat().st_size / (1024 * 1024), 2)
+        },
+        'per_class': per_class
+    }
+
+    OUTPUT_DIR.mkdir(exist_ok=True)
+    with open(OUTPUT_DIR / 'quantization_report.json', 'w') as f:
+        json.dump(report, f, indent=2)
+
+    lines = [
+        "# INT8 Quantization Report",
+        "",
+        f"- Calibration source: `{CALIBRATION_SOURCE}`",
+        f"- Validation images: {len(images)}",
+        "",
+        "| Metric | FP32 | INT8 | Delta |",
+        "|--------|------|------|-------|",
+        f"| mAP50 | {report['map50']['fp32']:.4f} | {report['map50']['int8']:.4f} | {report['map50']['delta']:+.4f} |",
+        f"| Latency (ms) | {report['latency_ms']['fp32']:.2f} | {report['latency_ms']['int8']:.2f} | |",
+        f"| Size (MB) | {report['model_size_mb']['fp32']:.2f} | {report['model_size_mb']['int8']:.2f} | |",
+        "",
+        "## Per-Class AP50",
+        "",
+        "| Class | Instances | FP32 | INT8 | Delta |",
+        "|-------|-----------|------|------|-------|",
+    ]
+    for row in sorted(per_class, key=lambda r: r['delta']):
+        lines.append(f"| {row['class']} | {row['instances']} | {row['fp32_ap50']:.4f} | {row['int8_ap50']:.4f} | {row['delta']:+.4f} |")
+
+    with open(OUTPUT_DIR / 'QUANTIZATION_REPORT.md', 'w', encoding='utf-8') as f:
+        f.write("\n".join(lines) + "\n")
+
+    print(f"\nmAP50: FP32 {report['map50']['fp32']:.4f} | INT8 {report['map50']['int8']:.4f} | Δ {report['map50']['delta']:+.4f}")
+    print(f"Latency: FP32 {report['latency_ms']['fp32']:.1f} ms | INT8 {report['latency_ms']['int8']:.1f} ms")
+    print(f"✅ Saved: {OUTPUT_DIR / 'quantization_report.json'}")
+    print(f"✅ Saved: {OUTPUT_DIR / 'QUANTIZATION_REPORT.md'}")
+    return True
+
+
+if __name__ == "__main__":
+    if quantize_model():
+        write_accuracy_report()
+        print("\n🎉 Done! Serve the INT8 model with INFERENCE_BACKEND=onnx-int8")
+    else:
+        print("\n⚠️  Quantization failed. Check error messages above.")
@@ -0,0 +1,180 @@
+"""
+AgriScan - History Write-Behind Queue Test
+Checks HistoryWriter's overflow, durability, late-diagnosis and shutdown
+behaviour against a throwaway database
+
+Runs in-process (no model or server needed).
+
+Usage:
+    python test_history_writer.py
+"""
+
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).parent
+sys.path.insert(0, str(BASE_DIR / 'api'))
+
+from config import config
+
+TMP_DIR = Path(tempfile.mkdtemp(prefix='agriscan-history-test-'))
+config.DATABASE_PATH = TMP_DIR / 'agriscan.db'
+config.BLOB_STORE_DIR = TMP_DIR / 'blobs'
+config.DIAGNOSIS_CACHE_PREWARM = False
+
+from services.db_service import DatabaseService
+from services.history_writer import HistoryWriter
+
+DETECTIONS = [{
+    'class_id': 3,
+    'class_name': 'Tomato leaf late blight',
+    'confidence': 0.91,
+    'bounding_box': {'x': 0.5, 'y': 0.5, 'width': 0.2, 'height': 0.3}
+}]
+
+
+class StalledDatabase(DatabaseService):
+    """DatabaseService whose background commits wait until release() (inline writes do not)"""
+
+    def __init__(self):
+        super().__init__()
+        self.gate = threading.Event()
+        self.worker_started = threading.Event()
+
+    def save_detections(self, records, durable=False):
+        if threading.current_thread().name == 'history-writer':
+            self.worker_started.set()
+            self.gate.wait()
+        return super().save_detections(records, durable=durable)
+
+    def release(self):
+        self.gate.set()
+
+
+def committed(detection_id):
+    """Read a detection through a separate connection (only committed rows are visible)"""
+    conn = sqlite3.connect(config.DATABASE_PATH)
+    try:
+        row = conn.execute('SELECT diagnosis FROM detections WHERE id = ?', (detection_id,)).fetchone()
+        return row is not None, row[0] if row else None
+    finally:
+        conn.close()
+
+
+def check(passed, message):
+    print(f"  {'✅' if passed else '❌'} {message}")
+    return passed
+
+
+def header(title):
+    print("\n" + "="*60)
+    print(f"TEST: {title}")
+    print("="*60)
+
+
+def test_full_queue_writes_inline():
+    """With the worker stalled and the queue full, save() writes the record itself"""
+    header("Full queue falls back to an inline write")
+
+    database = StalledDatabase()
+    writer = HistoryWriter(database=database, max_queue=1, batch_size=1, flush_interval_ms=0,
+                           enqueue_timeout=0.05)
+    writer.save('full-1', 'user-1', DETECTIONS)  # Taken by the worker, stalled in its commit
+    database.worker_started.wait(2)
+    writer.save('full-2', 'user-1', DETECTIONS)  # Fills the queue
+
+    start = time.time()
+    writer.save('full-3', 'user-1', DETECTIONS)  # No room: written inline
+    elapsed = time.time() - start
+    inline_visible = committed('full-3')[0]
+    queued_visible = committed('full-2')[0]
+
+    database.release()
+    flushed = writer.flush(timeout=5)
+
+    return all([
+        check(inline_visible, "overflowing record committed before save() returned"),
+        check(not queued_visible, "queued record still waiting for the worker"),
+        check(elapsed < 1, f"save() gave up on the queue quickly ({elapsed * 1000:.0f} ms)"),
+        check(writer.get_stats()['inline_writes'] == 1, "one inline write counted"),
+        check(flushed and committed('full-1')[0] and committed('full-2')[0], "queued records committed after release"),
+    ])
+
+
+def test_durable_write_visible_on_return():
+    """In durable mode save() returns only after its record is committed"""
+    header("Durable write is visible once save() returns")
+
+    writer = HistoryWriter(database=DatabaseService(), flush_interval_ms=20, durable=True)
+    results = [writer.save(f'durable-{i}', 'user-2', DETECTIONS) and committed(f'durable-{i}')[0]
+               for i in range(3)]
+    stats = writer.get_stats()
+    writer.close()
+
+    return all([
+        check(all(results), f"every record committed on return ({results})"),
+        check(stats['inline_writes'] == 0, "written by the background worker, not inline"),
+    ])
+
+
+def test_late_diagnosis_merged():
+    """A diagnosis for a queued or in-flight record lands in that record"""
+    header("Late diagnosis is merged into its record")
+
+    database = StalledDatabase()
+    writer = HistoryWriter(database=database, batch_size=1, flush_interval_ms=0)
+    writer.save('late-1', 'user-3', DETECTIONS)  # In flight (worker stalled in its commit)
+    database.worker_started.wait(2)
+    writer.save('late-2', 'user-3', DETECTIONS)  # Still queued
+
+    writer.update_diagnosis('late-2', {'disease': 'queued'})
+    writer.update_diagnosis('late-1', {'disease': 'in flight'})
+    database.release()
+    writer.flush(timeout=5)
+    stats = writer.get_stats()
+    writer.close()
+
+    queued = database.get_detection('late-2')['diagnosis']
+    in_flight = database.get_detection('late-1')['diagnosis']
+    return all([
+        check(queued == {'disease': 'queued'}, f"queued record saved with its diagnosis ({queued})"),
+        check(in_flight == {'disease': 'in flight'}, f"in-flight record updated after its commit ({in_flight})"),
+        check(stats['diagnoses_written'] == 1, "queued diagnosis saved with the record, not as an update"),
+        check(stats['inline_diagnoses'] == 0, "no direct diagnosis writes needed"),
+    ])
+
+
+def test_close_flushes_pending():
+    """close() commits records still waiting for their batch"""
+    header("close() flushes pending records")
+
+    writer = HistoryWriter(database=DatabaseService(), batch_size=100, flush_interval_ms=10000)
+    for i in range(5):
+        writer.save(f'close-{i}', 'user-4', DETECTIONS)
+    pending = sum(committed(f'close-{i}')[0] for i in range(5))
+
+    start = time.time()
+    writer.close(timeout=5)
+    elapsed = time.time() - start
+    saved = sum(committed(f'close-{i}')[0] for i in range(5))
+
+    return all([
+        check(pending == 0, "records still pending before close()"),
+        check(saved == 5, f"all records committed by close() ({saved}/5)"),
+        check(elapsed < 5, f"close() did not wait for the flush interval ({elapsed * 1000:.0f} ms)"),
+    ])
+
+
+if __name__ == "__main__":
+    results = [
+        test_full_queue_writes_inline(),
+        test_durable_write_visible_on_return(),
+        test_late_diagnosis_merged(),
+        test_close_flushes_pending(),
+    ]
+    print(f"\n{sum(results)}/{len(results)} tests passed")
+    sys.exit(0 if all(results) else 1)
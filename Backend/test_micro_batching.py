@@ -0,0 +1,177 @@
+"""
+AgriScan - Micro-Batching Scheduler Test
+Fires concurrent detect calls at MicroBatchScheduler and checks that they
+share forward passes, that each caller gets its own result and tracking
+update, and that the batch size (N) and wait (T) limits hold
+
+Runs in-process with a stand-in model service (no model or server needed).
+The scheduler is off by default; enable it with MICRO_BATCHING_ENABLED=True.
+
+Usage:
+    python test_micro_batching.py
+"""
+
+import math
+import sys
+import threading
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).parent
+sys.path.insert(0, str(BASE_DIR / 'api'))
+
+from services.batch_scheduler import MicroBatchScheduler
+
+FORWARD_PASS_SECONDS = 0.05
+
+
+class FakeModelService:
+    """Stand-in for YOLOModelService that records every detect_many and track call"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.batches = []  # Images per detect_many call
+        self.tracked = {}  # session_id -> detections it was tracked with
+
+    def detect_many(self, images, confidence_threshold=None, iou_threshold=None, max_batch_size=None):
+        with self.lock:
+            self.batches.append(list(images))
+        time.sleep(FORWARD_PASS_SECONDS)
+        return [{
+            'success': True,
+            'detections': [{'class_name': image, 'confidence': confidence_threshold}],
+            'image_size': {'width': 640, 'height': 480},
+            'timing': {'total': FORWARD_PASS_SECONDS}
+        } for image in images]
+
+    def track(self, detections, image_size, session_id):
+        with self.lock:
+            self.tracked[session_id] = detections
+        return {'class_name': detections[0]['class_name'], 'session_id': session_id}, []
+
+
+def run_concurrently(scheduler, service, count, confidence=lambda index: 0.5):
+    """Submit count requests from count threads at once; returns each caller's result"""
+    results = [None] * count
+    barrier = threading.Barrier(count)
+
+    def caller(index):
+        barrier.wait()
+        results[index] = scheduler.detect(
+            f'image-{index}',
+            confidence_threshold=confidence(index),
+            service=service,
+            session_id=f'session-{index}'
+        )
+
+    threads = [threading.Thread(target=caller, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def own_results(service, results):
+    """Whether every caller got its own detections and tracking update"""
+    for index, result in enumerate(results):
+        image, session = f'image-{index}', f'session-{index}'
+        if result['detections'][0]['class_name'] != image:
+            return False
+        if result['primary_detection'] != {'class_name': image, 'session_id': session}:
+            return False
+        if service.tracked.get(session) != result['detections']:
+            return False
+    return True
+
+
+def check(passed, message):
+    print(f"  {'✅' if passed else '❌'} {message}")
+    return passed
+
+
+def header(title):
+    print("\n" + "="*60)
+    print(f"TEST: {title}")
+    print("="*60)
+
+
+def test_concurrent_callers_share_a_batch():
+    """N concurrent callers become one forward pass with N images"""
+    header("Concurrent callers are grouped into one batch")
+
+    service = FakeModelService()
+    scheduler = MicroBatchScheduler(service, max_batch_size=8, max_wait_ms=500)
+    start = time.time()
+    results = run_concurrently(scheduler, service, 8)
+    elapsed = time.time() - start
+    sizes = [len(batch) for batch in service.batches]
+
+    return all([
+        check(sizes == [8], f"one detect_many call for 8 callers (batch sizes: {sizes})"),
+        check(own_results(service, results), "each caller got its own result and tracking update"),
+        check(elapsed < 0.5, f"a full batch did not wait for T ({elapsed * 1000:.0f} ms)"),
+    ])
+
+
+def test_batch_size_limit():
+    """More callers than N are split into batches of at most N"""
+    header("Batch size limit (N)")
+
+    service = FakeModelService()
+    scheduler = MicroBatchScheduler(service, max_batch_size=8, max_wait_ms=200)
+    results = run_concurrently(scheduler, service, 20)
+    sizes = [len(batch) for batch in service.batches]
+
+    return all([
+        check(max(sizes) <= 8, f"no batch larger than N=8 (batch sizes: {sizes})"),
+        check(sum(sizes) == 20 and len(sizes) == math.ceil(20 / 8), "20 requests in the fewest batches"),
+        check(own_results(service, results), "each caller got its own result and tracking update"),
+        check(scheduler.get_stats()['total_requests'] == 20, "stats count every request"),
+    ])
+
+
+def test_wait_limit():
+    """A lone request is dispatched once T expires, not held for a full batch"""
+    header("Wait limit (T)")
+
+    service = FakeModelService()
+    scheduler = MicroBatchScheduler(service, max_batch_size=8, max_wait_ms=100)
+    start = time.time()
+    result = scheduler.detect('image-0', service=service, session_id='session-0')
+    elapsed = time.time() - start - FORWARD_PASS_SECONDS
+    queue_wait = result['timing']['queue_wait']
+
+    return all([
+        check([len(batch) for batch in service.batches] == [1], "dispatched alone"),
+        check(0.09 <= elapsed < 0.3, f"waited about T=100 ms ({elapsed * 1000:.0f} ms)"),
+        check(0.09 <= queue_wait < 0.3, f"queue_wait reported ({queue_wait * 1000:.0f} ms)"),
+    ])
+
+
+def test_thresholds_split_batches():
+    """Requests with different confidence thresholds never share a forward pass"""
+    header("Different thresholds use separate forward passes")
+
+    service = FakeModelService()
+    scheduler = MicroBatchScheduler(service, max_batch_size=8, max_wait_ms=500)
+    results = run_concurrently(scheduler, service, 8, confidence=lambda index: 0.3 if index % 2 else 0.6)
+    thresholds = [{result['detections'][0]['confidence'] for result in results[i::2]} for i in (0, 1)]
+    sizes = sorted(len(batch) for batch in service.batches)
+
+    return all([
+        check(sizes == [4, 4], f"two forward passes of 4 (batch sizes: {sizes})"),
+        check(thresholds == [{0.6}, {0.3}], "each caller ran at its own threshold"),
+        check(own_results(service, results), "each caller got its own result and tracking update"),
+    ])
+
+
+if __name__ == "__main__":
+    results = [
+        test_concurrent_callers_share_a_batch(),
+        test_batch_size_limit(),
+        test_wait_limit(),
+        test_thresholds_split_batches(),
+    ]
+    print(f"\n{sum(results)}/{len(results)} tests passed")
+    sys.exit(0 if all(results) else 1)
@@ -0,0 +1,111 @@
+"""
+AgriScan - LLM Model Resolver Test
+Runs ModelResolver against StubLLMClient and checks probe caching, TTL
+re-probing and the circuit breaker
+
+Runs offline (no API key or network needed).
+
+Usage:
+    python test_model_resolver.py
+"""
+
+import sys
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).parent
+sys.path.insert(0, str(BASE_DIR / 'api'))
+
+from services.llm_models import ModelResolver, StubLLMClient, PROBE_PROMPT
+
+CANDIDATES = ['gemini-primary', 'gemini-fallback']
+
+
+def probes(stub, model_name=None):
+    """Probe calls the stub received (for one model, or all)"""
+    return [name for name, prompt in stub.calls
+            if prompt == PROBE_PROMPT and (model_name is None or name == model_name)]
+
+
+def check(passed, message):
+    print(f"  {'✅' if passed else '❌'} {message}")
+    return passed
+
+
+def test_probe_once_and_reuse():
+    """The first candidate is probed once and reused for every call"""
+    print("\n" + "="*60)
+    print("TEST: Resolved model is reused")
+    print("="*60)
+
+    stub = StubLLMClient(response='answer')
+    resolver = ModelResolver(stub, candidates=CANDIDATES, ttl=60)
+    answers = [resolver.generate(f'prompt {i}') for i in range(5)]
+
+    return all([
+        check(answers == ['answer'] * 5, "every call answered"),
+        check(probes(stub) == ['gemini-primary'], f"one probe for 5 calls (probes: {probes(stub)})"),
+        check(resolver.get_stats()['model'] == 'gemini-primary', "preferred model resolved"),
+    ])
+
+
+def test_reprobe_after_ttl():
+    """Once the TTL expires the candidates are probed again"""
+    print("\n" + "="*60)
+    print("TEST: Re-probe after TTL")
+    print("="*60)
+
+    stub = StubLLMClient()
+    resolver = ModelResolver(stub, candidates=CANDIDATES, ttl=0.2)
+    resolver.generate('before')
+    resolver.generate('before again')
+    before = len(probes(stub))
+    time.sleep(0.3)
+    resolver.generate('after')
+
+    return all([
+        check(before == 1, f"one probe within the TTL (got {before})"),
+        check(len(probes(stub)) == 2, f"probed again after the TTL (got {len(probes(stub))})"),
+        check(resolver.get_stats()['resolutions'] == 2, "two resolutions"),
+    ])
+
+
+def test_circuit_breaker_demotes():
+    """Repeated real failures demote the model and the next candidate takes over"""
+    print("\n" + "="*60)
+    print("TEST: Circuit breaker demotes a failing model")
+    print("="*60)
+
+    stub = StubLLMClient(response='answer')
+    resolver = ModelResolver(stub, candidates=CANDIDATES, ttl=60, failure_threshold=2, cooldown=60)
+    resolver.generate('healthy')
+
+    # The preferred model starts failing its real calls
+    stub.unavailable.add('gemini-primary')
+    failures = 0
+    for _ in range(2):
+        try:
+            resolver.generate('failing')
+        except RuntimeError:
+            failures += 1
+
+    answer = resolver.generate('after demotion')
+    stats = resolver.get_stats()
+    last_model = stub.calls[-1][0]
+
+    return all([
+        check(failures == 2, f"real calls failed (got {failures})"),
+        check(stats['demoted'] == ['gemini-primary'], f"primary demoted (demoted: {stats['demoted']})"),
+        check(answer == 'answer' and last_model == 'gemini-fallback', f"next call served by {last_model}"),
+        check(probes(stub, 'gemini-primary') == ['gemini-primary'], "demoted model not probed again"),
+    ])
+
+
+if __name__ == "__main__":
+    results = [
+        test_probe_once_and_reuse(),
+        test_reprobe_after_ttl(),
+        test_circuit_breaker_demotes(),
+    ]
+    print(f"\n{sum(results)}/{len(results)} tests passed")
+    sys.exit(0 if all(results) else 1)
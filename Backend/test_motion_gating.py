@@ -0,0 +1,100 @@
+"""
+AgriScan - Motion Gating Stability Test
+Feeds a still camera stream through continuous_step and checks that frames
+skipped by the motion gate still count toward primary detection stability
+
+Runs in-process with a stand-in detector (no model or server needed).
+
+Usage:
+    python test_motion_gating.py
+"""
+
+import sys
+import tempfile
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+BASE_DIR = Path(__file__).parent
+sys.path.insert(0, str(BASE_DIR / 'api'))
+
+from config import config
+
+# Only the continuous-mode path is exercised, against a throwaway database
+TMP_DIR = Path(tempfile.mkdtemp(prefix='agriscan-motion-test-'))
+config.DATABASE_PATH = TMP_DIR / 'agriscan.db'
+config.BLOB_STORE_DIR = TMP_DIR / 'blobs'
+config.DIAGNOSIS_CACHE_PREWARM = False
+config.MICRO_BATCHING_ENABLED = False
+
+import app as api
+
+MIN_STABILITY = 5
+FRAMES = 12
+
+DETECTION = {
+    'class_id': 3,
+    'class_name': 'Tomato leaf late blight',
+    'confidence': 0.91,
+    'bounding_box': {'x': 0.5, 'y': 0.5, 'width': 0.25, 'height': 0.25,
+                     'x1': 120.0, 'y1': 90.0, 'x2': 200.0, 'y2': 150.0}
+}
+
+
+def still_frame():
+    """The same JPEG every time, like a camera held still over a leaf"""
+    frame = np.full((240, 320, 3), 90, dtype=np.uint8)
+    cv2.rectangle(frame, (120, 90), (200, 150), (40, 160, 40), -1)
+    return cv2.imencode('.jpg', frame)[1].tobytes()
+
+
+def test_still_stream_becomes_stable():
+    """A still stream is stable after min_stability frames, skipped or not"""
+    print("\n" + "="*60)
+    print("TEST: Still stream stabilizes with motion gating on")
+    print("="*60)
+
+    service = api.model_registry.default
+    inferred = []
+
+    def fake_detection(service, image_data, confidence_threshold=None, track_primary=True, session_id=None):
+        # Stand-in for the model: always sees the same lesion
+        inferred.append(image_data)
+        detections = [dict(DETECTION)]
+        primary_detection, tracks = service.track(detections, (320, 240), session_id)
+        return {
+            'success': True,
+            'detections': detections,
+            'primary_detection': primary_detection,
+            'tracks': tracks,
+            'image_size': {'width': 320, 'height': 240},
+            'timing': {'total': 0.0}
+        }
+
+    api.run_detection = fake_detection
+    service.reset_tracking('motion-test')
+
+    frame = still_frame()
+    params = {'motion_gating': True, 'min_stability': MIN_STABILITY}
+    stable_at = None
+    for index in range(1, FRAMES + 1):
+        response = api.continuous_step(service, frame, 'motion-test', params)
+        hits = response['primary_detection']['tracking_stats']['track_hits']
+        print(f"  frame {index:2d}: skipped={response['inference_skipped']!s:<5} "
+              f"track_hits={hits:2d} stable={response['is_stable']}")
+        if response['is_stable'] and stable_at is None:
+            stable_at = index
+
+    skipped = FRAMES - len(inferred)
+    if stable_at is not None and stable_at <= MIN_STABILITY and skipped > 0:
+        print(f"\n✅ Stable at frame {stable_at} with {skipped} of {FRAMES} frames skipped")
+        return True
+
+    print(f"\n❌ Expected stability within {MIN_STABILITY} frames, got {stable_at} "
+          f"({skipped} of {FRAMES} frames skipped)")
+    return False
+
+
+if __name__ == "__main__":
+    sys.exit(0 if test_still_stream_becomes_stable() else 1)
@@ -4,14 +4,19 @@
 """
 
 import cv2
+import sys
 import time
 from pathlib import Path
 from ultralytics import YOLO
 import numpy as np
-from collections import defaultdict, Counter
+from collections import defaultdict, deque
 
 # Paths
 BASE_DIR = Path(__file__).parent
+sys.path.insert(0, str(BASE_DIR / 'api'))
+
+from utils.sliding_window import SlidingWindowCounter
+
 MODEL_PATH = BASE_DIR / "models" / "agriscan_combined" / "weights" / "best.pt"
 LABELS_PATH = BASE_DIR / "api" / "labels.txt"
 
@@ -169,15 +174,14 @@ def test_webcam_detection():
     avg_fps = 0.0  # Initialize avg_fps
     
     # Temporal smoothing for bounding boxes - keep detections for longer
-    detection_history = []  # Store last N frames of detections
     history_size = 15  # Keep detections for 15 frames (~0.5 seconds at 30fps)
+    detection_history = deque(maxlen=history_size)  # Store last N frames of detections
     
-    # Primary detection tracking
-    class_occurrence_counter = Counter()  # Count occurrences of each class
+    # Primary detection tracking (same sliding window as the API server)
     primary_detection_class = None  # The most frequently detected class
     primary_detection_bbox = None  # Bounding box of primary detection
     tracking_window_size = 45  # Look at last 45 frames (~1.5 seconds) to determine primary
-    class_history = []  # Store class detections for each frame
+    class_window = SlidingWindowCounter(tracking_window_size)  # Running class counts
     
     print("\n🚀 Starting real-time detection...")
     print("  (Bounding boxes will appear in RED, GREEN, BLUE, etc.)")
@@ -224,20 +228,13 @@ def test_webcam_detection():
                         })
                         current_frame_classes.append(class_id)
             
-            # Update class history for primary detection tracking
-            class_history.append(current_frame_classes)
-            if len(class_history) > tracking_window_size:
-                class_history.pop(0)
-            
-            # Update class occurrence counter
-            class_occurrence_counter.clear()
-            for frame_classes in class_history:
-                for cls_id in frame_classes:
-                    class_occurrence_counter[cls_id] += 1
+            # Update class window for primary detection tracking (evicts the oldest frame)
+            class_window.add(current_frame_classes)
             
             # Determine primary detection (most frequent class)
-            if class_occurrence_counter:
-                primary_detection_class = class_occurrence_counter.most_common(1)[0][0]
+            most_common = class_window.most_common()
+            if most_common:
+                primary_detection_class = most_common[0]
                 
                 # Find the bounding box of primary detection in current frame
                 primary_detection_bbox = None
@@ -249,13 +246,9 @@ def test_webcam_detection():
                 primary_detection_class = None
                 primary_detection_bbox = None
             
-            # Add current detections to history
+            # Add current detections to history (deque drops frames older than history_size)
             detection_history.append(current_detections)
             
-            # Keep only last N frames
-            if len(detection_history) > history_size:
-                detection_history.pop(0)
-            
             # Merge all detections from history with age-based opacity
             all_detections = []
             for frame_idx, frame_detections in enumerate(detection_history):
@@ -420,7 +413,7 @@ def test_webcam_detection():
             # Primary detection info
             if primary_detection_class is not None:
                 primary_class_name = class_names[primary_detection_class] if primary_detection_class < len(class_names) else f"Class_{primary_detection_class}"
-                occurrence_count = class_occurrence_counter[primary_detection_class]
+                occurrence_count = class_window.counts[primary_detection_class]
                 cv2.putText(
                     annotated_frame,
                     f"Primary: {primary_class_name}",
@@ -12,14 +12,18 @@
 import os
 from datetime import datetime
 from pathlib import Path
+import sys
 import threading
 from queue import Queue
-import google.generativeai as genai
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
 load_dotenv(Path(__file__).parent / '.env')
 
+# Shared Gemini model resolution from the API
+sys.path.insert(0, str(Path(__file__).parent / 'api'))
+from services.llm_models import GeminiClient, ModelResolver
+
 # ============================================================================
 # Configuration
 # ============================================================================
@@ -54,44 +58,15 @@
 else:
     print(f"✅ Gemini API key loaded from .env file")
 
-genai.configure(api_key=GEMINI_API_KEY)
-
-# Try multiple models in order of preference (current available models)
-primary_models = [
-    'models/gemini-2.5-flash',
-    'models/gemini-2.0-flash',
-    'models/gemini-flash-latest',
-    'models/gemini-2.5-pro'
-]
-
-gemini_model = None
-last_error = None
+# The working model is probed on the first diagnosis (in the background
+# thread) and reused afterwards, so startup makes no Gemini calls
+gemini_model = ModelResolver(GeminiClient(GEMINI_API_KEY)) if GEMINI_API_KEY else None
 
 print("\n" + "="*80)
 print("🚀 AgriScan - Live Webcam Detection System")
 print("="*80)
 print(f"📊 Backend API: {API_BASE_URL}")
-print(f"🤖 Gemini API: Testing models...")
-
-# Test each model with a simple prompt
-for model_name in primary_models:
-    try:
-        test_model = genai.GenerativeModel(model_name)
-        test_response = test_model.generate_content('Return token OK').text
-        if test_response:
-            gemini_model = test_model
-            print(f"✅ Using Gemini model: {model_name}")
-            break
-    except Exception as e:
-        last_error = e
-        print(f"⚠️  {model_name} unavailable: {str(e)[:100]}")
-        continue
-
-if not gemini_model:
-    print(f"❌ All Gemini models failed")
-    print("⚠️  Continuing without Gemini diagnosis...")
-    gemini_model = None
-
+print(f"🤖 Gemini API: {'model resolved on first diagnosis' if gemini_model else 'unavailable'}")
 print(f"📹 Webcam: Initializing...")
 print("="*80 + "\n")
 
@@ -143,7 +118,7 @@ def get_gemini_diagnosis_async(disease_name, result_queue):
         if not gemini_model:
             result_queue.put({
                 'disease': disease_name,
-                'diagnosis': "⚠️  Gemini diagnosis unavailable (model initialization failed)",
+                'diagnosis': "⚠️  Gemini diagnosis unavailable (no GEMINI_API_KEY)",
                 'success': False
             })
             return
@@ -159,11 +134,11 @@ def get_gemini_diagnosis_async(disease_name, result_queue):
 
 Keep it practical and farmer-friendly. Format as clear bullet points."""
 
-        response = gemini_model.generate_content(prompt)
+        diagnosis_text = gemini_model.generate(prompt)
         
         result_queue.put({
             'disease': disease_name,
-            'diagnosis': response.text,
+            'diagnosis': diagnosis_text,
             'success': True
         })
         